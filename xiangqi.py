@@ -1,9 +1,19 @@
-import pygame
 import sys
-from xiangqi_rules import XiangqiRules
+import time
+from xiangqi_game import XiangqiGame
+
+# Pygame is only imported and initialized once a XiangqiGUI is created,
+# so importing this module for XiangqiGame stays headless
+pygame = None
+
+
+def init_pygame():
+    global pygame
+    if pygame is None:
+        import pygame
+        pygame.init()
+    return pygame
 
-# Initialize Pygame
-pygame.init()
 
 # Constants
 BOARD_WIDTH = 9  # 9 columns (files)
@@ -22,71 +32,16 @@ BROWN = (210, 180, 140)  # Lighter brown for board
 BLUE = (100, 149, 237)  # Cornflower blue for river
 GOLD = (212, 175, 55)  # Gold for palace
 GRAY = (128, 128, 128)  # For menu
+NAVY = (0, 0, 128)  # For analysis hints
 
-
-# Xiangqi Game Class
-class XiangqiGame:
-    def __init__(self):
-        self.board = self.initialize_board()
-        self.current_turn = "red"
-        self.selected_piece = None
-        self.valid_moves = []
-        self.rules = XiangqiRules()
-
-    def initialize_board(self):
-        board = [[None for _ in range(9)] for _ in range(10)]
-        # Place red pieces (bottom half)
-        board[9][0] = ("rook", "red")
-        board[9][1] = ("horse", "red")
-        board[9][2] = ("elephant", "red")
-        board[9][3] = ("advisor", "red")
-        board[9][4] = ("general", "red")
-        board[9][5] = ("advisor", "red")
-        board[9][6] = ("elephant", "red")
-        board[9][7] = ("horse", "red")
-        board[9][8] = ("rook", "red")
-        board[7][1] = ("cannon", "red")
-        board[7][7] = ("cannon", "red")
-        for col in [0, 2, 4, 6, 8]:
-            board[6][col] = ("soldier", "red")
-
-        # Place black pieces (top half)
-        board[0][0] = ("rook", "black")
-        board[0][1] = ("horse", "black")
-        board[0][2] = ("elephant", "black")
-        board[0][3] = ("advisor", "black")
-        board[0][4] = ("general", "black")
-        board[0][5] = ("advisor", "black")
-        board[0][6] = ("elephant", "black")
-        board[0][7] = ("horse", "black")
-        board[0][8] = ("rook", "black")
-        board[2][1] = ("cannon", "black")
-        board[2][7] = ("cannon", "black")
-        for col in [0, 2, 4, 6, 8]:
-            board[3][col] = ("soldier", "black")
-        return board
-
-    def is_valid_move(self, piece_type, color, start, end):
-        return XiangqiRules.is_valid_move(self.board, piece_type, color, start, end)
-
-    def get_valid_moves(self, piece_type, color, start):
-        return XiangqiRules.get_valid_moves(self.board, piece_type, color, start)
-
-    def make_move(self, start, end):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        # Move the piece
-        self.board[end_row][end_col] = self.board[start_row][start_col]
-        self.board[start_row][start_col] = None
-
-        # Switch turns
-        self.current_turn = "black" if self.current_turn == "red" else "red"
+# Square contents (piece, selected, highlighted, hinted) of an empty square
+EMPTY_SQUARE_STATE = (None, False, False, False)
 
 
 # GUI Class
 class XiangqiGUI:
-    def __init__(self, game):
+    def __init__(self, game, analysis=False):
+        init_pygame()
         self.game = game
         self.screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.display.set_caption("Xiangqi (Chinese Chess)")
@@ -137,11 +92,73 @@ class XiangqiGUI:
             self.chinese_font = self.font  # Fallback to default font
             self.use_chinese = False  # Disable Chinese if font not available
 
+        # Cached rendering: the static board layer and piece sprites keyed by (piece_type, color, use_chinese)
+        self.static_board = None
+        self.static_key = None
+        self.full_redraw = True
+        self.glyph_cache = {}
+        self.menu_state = None
+        self.square_states = {}
+        self.language_button_rect = (0, 0, 0, 0)
+
+        # Event loop state and frame timing counters
+        self.needs_redraw = True
+        self.started_at = time.perf_counter()
+        self.frame_count = 0
+        self.wakeup_count = 0
+        self.total_render_time = 0.0
+        self.last_render_time = 0.0
+        self.max_render_time = 0.0
+
+        # Background analysis, toggled with the A key; new iterations wake the loop with an event.
+        # Imported here so the headless module does not load the engine
+        from xiangqi_analysis import Analysis
+        self.analysis_event = pygame.event.custom_type()
+        self.analysis = Analysis(notify=lambda: pygame.event.post(pygame.event.Event(self.analysis_event)))
+        self.analysis_enabled = False
+        if analysis:
+            self.toggle_analysis()
+
+    def toggle_analysis(self):
+        self.analysis_enabled = not self.analysis_enabled
+        if self.analysis_enabled:
+            self.analysis.start(self.game)
+        else:
+            self.analysis.stop()
+        self.needs_redraw = True
+
+    def analysis_text(self):
+        """Depth, score and nodes per second of the latest analysis, for the menu bar"""
+        if not self.analysis_enabled:
+            return None
+        latest = self.analysis.latest
+        if latest is None:
+            return "analysing..."
+        return f"depth {latest['depth']}  {latest['score']:+d}  {latest['nps'] // 1000}k nps"
+
     def draw_menu_bar(self):
-        """Draw the menu bar at the top of the screen"""
+        """Draw the parts of the menu bar that change between frames"""
+        # Restore the menu background left of the language button
+        turn_rect = pygame.Rect(0, 0, self.language_button_rect[0] - 1, 40)
+        self.screen.blit(self.static_board, turn_rect, turn_rect)
+
+        # Draw turn indicator
+        turn_text = self.font.render(f"Turn: {self.game.current_turn.capitalize()}", True,
+                                     RED if self.game.current_turn == "red" else BLACK)
+        self.screen.blit(turn_text, (10, 5))
+
+        # Draw the analysis depth and speed
+        analysis_text = self.analysis_text()
+        if analysis_text:
+            self.screen.blit(self.menu_font.render(analysis_text, True, NAVY), (160, 12))
+
+        return turn_rect
+
+    def draw_static_menu_bar(self, surface):
+        """Draw the menu bar background and language button"""
         # Draw menu background
-        pygame.draw.rect(self.screen, GRAY, (0, 0, WINDOW_WIDTH, 40))
-        pygame.draw.line(self.screen, BLACK, (0, 40), (WINDOW_WIDTH, 40), 2)
+        pygame.draw.rect(surface, GRAY, (0, 0, WINDOW_WIDTH, 40))
+        pygame.draw.line(surface, BLACK, (0, 40), (WINDOW_WIDTH, 40), 2)
 
         # Draw language toggle button
         button_width = 120
@@ -151,28 +168,25 @@ class XiangqiGUI:
 
         # Button background
         button_color = WHITE
-        pygame.draw.rect(self.screen, button_color, (button_x, button_y, button_width, button_height))
-        pygame.draw.rect(self.screen, BLACK, (button_x, button_y, button_width, button_height), 2)
+        pygame.draw.rect(surface, button_color, (button_x, button_y, button_width, button_height))
+        pygame.draw.rect(surface, BLACK, (button_x, button_y, button_width, button_height), 2)
 
         # Button text
         button_text = "中文" if self.use_chinese else "English"
         text_surface = self.menu_font.render(button_text, True, BLACK)
         text_rect = text_surface.get_rect(center=(button_x + button_width // 2, button_y + button_height // 2))
-        self.screen.blit(text_surface, text_rect)
-
-        # Draw turn indicator
-        turn_text = self.font.render(f"Turn: {self.game.current_turn.capitalize()}", True,
-                                     RED if self.game.current_turn == "red" else BLACK)
-        self.screen.blit(turn_text, (10, 5))
+        surface.blit(text_surface, text_rect)
 
         return (button_x, button_y, button_width, button_height)  # Return button bounds for click detection
 
-    def draw_board(self):
-        # Clear screen
-        self.screen.fill(BROWN)
+    def render_static_board(self):
+        """Pre-render everything that doesn't change between moves: menu background, river, grid,
+        palaces and position markers"""
+        surface = pygame.Surface(self.screen.get_size())
+        surface.fill(BROWN)
 
         # Draw menu bar and get button bounds
-        self.language_button_rect = self.draw_menu_bar()
+        self.language_button_rect = self.draw_static_menu_bar(surface)
 
         # Offset the board drawing by menu height
         board_offset_y = 40
@@ -180,27 +194,27 @@ class XiangqiGUI:
         # Draw the river between rows 4 and 5
         river_y = 4 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
         river_rect = pygame.Rect(0, river_y, WINDOW_WIDTH, SQUARE_SIZE)
-        pygame.draw.rect(self.screen, BLUE, river_rect)
+        pygame.draw.rect(surface, BLUE, river_rect)
 
         # Draw "楚河" and "漢界" in the river
         if self.use_chinese:
             try:
                 chu_text = self.chinese_font.render("楚河", True, WHITE)
                 han_text = self.chinese_font.render("漢界", True, WHITE)
-                self.screen.blit(chu_text, (WINDOW_WIDTH // 4 - 30, river_y + SQUARE_SIZE // 2 - 15))
-                self.screen.blit(han_text, (3 * WINDOW_WIDTH // 4 - 30, river_y + SQUARE_SIZE // 2 - 15))
+                surface.blit(chu_text, (WINDOW_WIDTH // 4 - 30, river_y + SQUARE_SIZE // 2 - 15))
+                surface.blit(han_text, (3 * WINDOW_WIDTH // 4 - 30, river_y + SQUARE_SIZE // 2 - 15))
             except:
                 river_text = self.font.render("River", True, WHITE)
-                self.screen.blit(river_text, (WINDOW_WIDTH // 2 - 30, river_y + SQUARE_SIZE // 2 - 15))
+                surface.blit(river_text, (WINDOW_WIDTH // 2 - 30, river_y + SQUARE_SIZE // 2 - 15))
         else:
             river_text = self.menu_font.render("RIVER", True, WHITE)
-            self.screen.blit(river_text, (WINDOW_WIDTH // 2 - 25, river_y + SQUARE_SIZE // 2 - 10))
+            surface.blit(river_text, (WINDOW_WIDTH // 2 - 25, river_y + SQUARE_SIZE // 2 - 10))
 
         # Draw grid lines
         # Horizontal lines
         for row in range(BOARD_HEIGHT):
             y = row * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
-            pygame.draw.line(self.screen, BLACK, (SQUARE_SIZE // 2, y),
+            pygame.draw.line(surface, BLACK, (SQUARE_SIZE // 2, y),
                                       (WINDOW_WIDTH - SQUARE_SIZE // 2, y), 2)
         
         # Vertical lines
@@ -209,21 +223,21 @@ class XiangqiGUI:
             x = col * SQUARE_SIZE + SQUARE_SIZE // 2
             top_y = SQUARE_SIZE // 2 + board_offset_y
             mid_y = 4 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
-            pygame.draw.line(self.screen, BLACK, (x, top_y), (x, mid_y), 2)
+            pygame.draw.line(surface, BLACK, (x, top_y), (x, mid_y), 2)
             
         # Bottom half (5-9)
         for col in range(BOARD_WIDTH):
             x = col * SQUARE_SIZE + SQUARE_SIZE // 2
             mid_y = 5 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
             bot_y = 9 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
-            pygame.draw.line(self.screen, BLACK, (x, mid_y), (x, bot_y), 2)
+            pygame.draw.line(surface, BLACK, (x, mid_y), (x, bot_y), 2)
             
         # Side lines crossing river
         for col in [0, 8]:
              x = col * SQUARE_SIZE + SQUARE_SIZE // 2
              y4 = 4 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
              y5 = 5 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
-             pygame.draw.line(self.screen, BLACK, (x, y4), (x, y5), 2)
+             pygame.draw.line(surface, BLACK, (x, y4), (x, y5), 2)
 
         # Draw palaces (3x3 areas in the center of each side)
         palace_x = 3 * SQUARE_SIZE + SQUARE_SIZE // 2
@@ -234,49 +248,94 @@ class XiangqiGUI:
         palace_height = 2 * SQUARE_SIZE
 
         # Draw palace diagonals for black
-        pygame.draw.line(self.screen, GOLD, (palace_x, palace_y_top),
+        pygame.draw.line(surface, GOLD, (palace_x, palace_y_top),
                          (palace_x + palace_width, palace_y_top + palace_height), 2)
-        pygame.draw.line(self.screen, GOLD, (palace_x + palace_width, palace_y_top),
+        pygame.draw.line(surface, GOLD, (palace_x + palace_width, palace_y_top),
                          (palace_x, palace_y_top + palace_height), 2)
 
         # Red palace (bottom)
         palace_y_bottom = 7 * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y  # Rows 7,8,9 (index 7 to 9)
 
         # Draw palace diagonals for red
-        pygame.draw.line(self.screen, GOLD, (palace_x, palace_y_bottom),
+        pygame.draw.line(surface, GOLD, (palace_x, palace_y_bottom),
                          (palace_x + palace_width, palace_y_bottom + palace_height), 2)
-        pygame.draw.line(self.screen, GOLD, (palace_x + palace_width, palace_y_bottom),
+        pygame.draw.line(surface, GOLD, (palace_x + palace_width, palace_y_bottom),
                          (palace_x, palace_y_bottom + palace_height), 2)
 
         # Draw position markers
-        self.draw_position_markers(board_offset_y)
+        self.draw_position_markers(board_offset_y, surface)
+
+        return surface
+
+    def draw_board(self):
+        # Rebuild the static layer only when the language or window size changes
+        static_key = (self.use_chinese, self.screen.get_size())
+        full_redraw = self.full_redraw or static_key != self.static_key
+        if full_redraw:
+            if static_key != self.static_key:
+                self.static_board = self.render_static_board()
+                self.static_key = static_key
+            self.full_redraw = False
+            self.screen.blit(self.static_board, (0, 0))
+            self.menu_state = None
+            self.square_states = {(row, col): EMPTY_SQUARE_STATE
+                                  for row in range(BOARD_HEIGHT) for col in range(BOARD_WIDTH)}
+
+        dirty_rects = []
+
+        # Redraw the turn indicator and analysis line when they change
+        menu_state = (self.game.current_turn, self.analysis_text())
+        if menu_state != self.menu_state:
+            dirty_rects.append(self.draw_menu_bar())
+            self.menu_state = menu_state
 
-        # Draw pieces
+        # Offset the board drawing by menu height
+        board_offset_y = 40
+
+        # Redraw only the squares whose piece or highlight changed
+        valid_moves = set(self.game.valid_moves)
+        hint = (self.analysis.best_move() or ()) if self.analysis_enabled else ()
         for row in range(BOARD_HEIGHT):
+            board_row = self.game.board[row]
             for col in range(BOARD_WIDTH):
-                piece = self.game.board[row][col]
-                if piece:
-                    piece_type, color = piece
-                    self.draw_piece(piece_type, color, row, col, board_offset_y)
+                state = (board_row[col], (row, col) == self.game.selected_piece, (row, col) in valid_moves,
+                         (row, col) in hint)
+                if state != self.square_states[(row, col)]:
+                    self.square_states[(row, col)] = state
+                    dirty_rects.append(self.draw_square(row, col, state, board_offset_y))
+
+        if full_redraw:
+            pygame.display.flip()
+        elif dirty_rects:
+            pygame.display.update(dirty_rects)
+
+    def draw_square(self, row, col, state, offset_y):
+        piece, selected, highlighted, hinted = state
+        square_rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE + offset_y, SQUARE_SIZE, SQUARE_SIZE)
+        self.screen.blit(self.static_board, square_rect, square_rect)
+
+        # Draw the piece
+        if piece:
+            piece_type, color = piece
+            self.draw_piece(piece_type, color, row, col, offset_y)
+
+        # Mark both squares of the analysis best move
+        if hinted:
+            pygame.draw.rect(self.screen, NAVY, square_rect.inflate(-8, -8), 2)
 
         # Highlight selected piece
-        if self.game.selected_piece:
-            row, col = self.game.selected_piece
-            x = col * SQUARE_SIZE
-            y = row * SQUARE_SIZE + board_offset_y
-            pygame.draw.rect(self.screen, YELLOW, (x, y, SQUARE_SIZE, SQUARE_SIZE), 3)
+        if selected:
+            pygame.draw.rect(self.screen, YELLOW, square_rect, 3)
 
         # Highlight valid moves
-        for move in self.game.valid_moves:
-            row, col = move
-            x = col * SQUARE_SIZE + SQUARE_SIZE // 2
-            y = row * SQUARE_SIZE + SQUARE_SIZE // 2 + board_offset_y
-            pygame.draw.circle(self.screen, GREEN, (x, y), SQUARE_SIZE // 4, 3)
+        if highlighted:
+            pygame.draw.circle(self.screen, GREEN, square_rect.center, SQUARE_SIZE // 4, 3)
 
-        pygame.display.flip()
+        return square_rect
 
-    def draw_position_markers(self, offset_y):
+    def draw_position_markers(self, offset_y, surface=None):
         """Draw small corner markers at key positions"""
+        surface = surface or self.screen
         # Positions that need markers
         marker_positions = [
             # Cannon positions
@@ -316,23 +375,32 @@ class XiangqiGUI:
                 start_y = y + dy * marker_offset
 
                 # Horizontal part
-                pygame.draw.line(self.screen, BLACK,
+                pygame.draw.line(surface, BLACK,
                                  (start_x, start_y),
                                  (start_x - dx * marker_size, start_y), 2)
                 # Vertical part
-                pygame.draw.line(self.screen, BLACK,
+                pygame.draw.line(surface, BLACK,
                                  (start_x, start_y),
                                  (start_x, start_y - dy * marker_size), 2)
 
     def draw_piece(self, piece_type, color, row, col, offset_y):
-        x = col * SQUARE_SIZE + SQUARE_SIZE // 2
-        y = row * SQUARE_SIZE + SQUARE_SIZE // 2 + offset_y
+        self.screen.blit(self.piece_sprite(piece_type, color), (col * SQUARE_SIZE, row * SQUARE_SIZE + offset_y))
+
+    def piece_sprite(self, piece_type, color):
+        """Return the rendered piece, drawing it the first time it is needed"""
+        key = (piece_type, color, self.use_chinese)
+        sprite = self.glyph_cache.get(key)
+        if sprite is not None:
+            return sprite
+
+        sprite = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        center = (SQUARE_SIZE // 2, SQUARE_SIZE // 2)
         radius = SQUARE_SIZE // 2 - 5
 
         # Draw piece background
         bg_color = WHITE
-        pygame.draw.circle(self.screen, bg_color, (x, y), radius)
-        pygame.draw.circle(self.screen, RED if color == "red" else BLACK, (x, y), radius, 2)
+        pygame.draw.circle(sprite, bg_color, center, radius)
+        pygame.draw.circle(sprite, RED if color == "red" else BLACK, center, radius, 2)
 
         # Choose character set based on toggle
         if self.use_chinese:
@@ -345,47 +413,111 @@ class XiangqiGUI:
         # Draw the character
         piece_text = font_to_use.render(piece_icons[(piece_type, color)], True,
                                         RED if color == "red" else BLACK)
-        text_rect = piece_text.get_rect(center=(x, y))
-        self.screen.blit(piece_text, text_rect)
+        text_rect = piece_text.get_rect(center=center)
+        sprite.blit(piece_text, text_rect)
+
+        self.glyph_cache[key] = sprite
+        return sprite
+
+    def handle_event(self, event):
+        if event.type == pygame.QUIT:
+            self.analysis.close()
+            pygame.quit()
+            sys.exit()
+        elif event.type == self.analysis_event:
+            self.needs_redraw = True
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+            self.toggle_analysis()
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED):
+            # The window contents were lost, so the next frame repaints everything
+            self.full_redraw = True
+            self.needs_redraw = True
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            x, y = event.pos
+            self.needs_redraw = True
+
+            # Check if language button was clicked
+            button_x, button_y, button_w, button_h = self.language_button_rect
+            if button_x <= x <= button_x + button_w and button_y <= y <= button_y + button_h:
+                self.use_chinese = not self.use_chinese
+            else:
+                # Handle board clicks
+                board_y = y - 40  # Account for menu bar
+                
+                col = int(round((x - SQUARE_SIZE // 2) / SQUARE_SIZE))
+                row = int(round((board_y - SQUARE_SIZE // 2) / SQUARE_SIZE))
+
+                if 0 <= row < BOARD_HEIGHT and 0 <= col < BOARD_WIDTH:
+                    if self.game.selected_piece:
+                        start_row, start_col = self.game.selected_piece
+                        piece = self.game.board[start_row][start_col]
+                        if piece and self.game.is_valid_move(piece[0], piece[1], (start_row, start_col),
+                                                             (row, col)):
+                            self.game.make_move((start_row, start_col), (row, col))
+                            if self.analysis_enabled:
+                                self.analysis.start(self.game)
+                        self.game.selected_piece = None
+                        self.game.valid_moves = []
+                    else:
+                        piece = self.game.board[row][col]
+                        if piece and piece[1] == self.game.current_turn:
+                            self.game.selected_piece = (row, col)
+                            self.game.valid_moves = self.game.get_valid_moves(piece[0], piece[1], (row, col))
+
+    def render_frame(self):
+        """Draw a frame and record how long it took"""
+        start_time = time.perf_counter()
+        self.draw_board()
+        render_time = time.perf_counter() - start_time
+        self.needs_redraw = False
+
+        self.frame_count += 1
+        self.total_render_time += render_time
+        self.last_render_time = render_time
+        self.max_render_time = max(self.max_render_time, render_time)
+
+    def frame_stats(self):
+        """Frame and render-time counters since the GUI started"""
+        uptime = time.perf_counter() - self.started_at
+        return {
+            "uptime": uptime,
+            "frames": self.frame_count,
+            "wakeups": self.wakeup_count,
+            "fps": self.frame_count / uptime if uptime > 0 else 0.0,
+            "render_time_total": self.total_render_time,
+            "render_time_avg": self.total_render_time / self.frame_count if self.frame_count else 0.0,
+            "render_time_last": self.last_render_time,
+            "render_time_max": self.max_render_time,
+            # Share of wall time spent rendering, close to zero while idle
+            "busy_fraction": self.total_render_time / uptime if uptime > 0 else 0.0,
+        }
+
+    def run(self, event_driven=True, fps=30, idle_timeout_ms=1000):
+        """Run the GUI loop.
 
-    def run(self):
+        In event-driven mode the loop sleeps in pygame.event.wait and only renders when a click,
+        move, toggle or window event asked for a redraw. Otherwise it polls and draws at fps.
+        """
         clock = pygame.time.Clock()
+        if event_driven:
+            # Mouse motion never changes the picture, so don't wake up for it
+            pygame.event.set_blocked(pygame.MOUSEMOTION)
+
         while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    x, y = pygame.mouse.get_pos()
-
-                    # Check if language button was clicked
-                    button_x, button_y, button_w, button_h = self.language_button_rect
-                    if button_x <= x <= button_x + button_w and button_y <= y <= button_y + button_h:
-                        self.use_chinese = not self.use_chinese
-                    else:
-                        # Handle board clicks
-                        board_y = y - 40  # Account for menu bar
-                        
-                        col = int(round((x - SQUARE_SIZE // 2) / SQUARE_SIZE))
-                        row = int(round((board_y - SQUARE_SIZE // 2) / SQUARE_SIZE))
-
-                        if 0 <= row < BOARD_HEIGHT and 0 <= col < BOARD_WIDTH:
-                            if self.game.selected_piece:
-                                start_row, start_col = self.game.selected_piece
-                                piece = self.game.board[start_row][start_col]
-                                if piece and self.game.is_valid_move(piece[0], piece[1], (start_row, start_col),
-                                                                     (row, col)):
-                                    self.game.make_move((start_row, start_col), (row, col))
-                                self.game.selected_piece = None
-                                self.game.valid_moves = []
-                            else:
-                                piece = self.game.board[row][col]
-                                if piece and piece[1] == self.game.current_turn:
-                                    self.game.selected_piece = (row, col)
-                                    self.game.valid_moves = self.game.get_valid_moves(piece[0], piece[1], (row, col))
-
-            self.draw_board()
-            clock.tick(30)
+            if event_driven:
+                event = pygame.event.wait(idle_timeout_ms)
+                events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+            else:
+                events = pygame.event.get()
+            self.wakeup_count += 1
+
+            for event in events:
+                self.handle_event(event)
+
+            if self.needs_redraw or not event_driven:
+                self.render_frame()
+            if not event_driven:
+                clock.tick(fps)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+# Background analysis: an engine searching snapshots of a game in a worker process
+#
+# start(game) sends the game's first position and moves to the worker, which stops the search of the previous
+# position and begins iterative deepening on the new one. Each completed depth comes back through a
+# result queue; a receiver thread keeps the latest iteration for the current position and calls
+# notify(), so a GUI loop can sleep until there is something new to draw. Nothing here blocks the
+# caller, and pygame is never imported.
+import multiprocessing
+import queue
+import threading
+
+from xiangqi_engine import Engine
+from xiangqi_game import XiangqiGame
+
+
+def _drain(jobs, job):
+    # Only the newest position is worth analysing
+    while True:
+        try:
+            job = jobs.get_nowait()
+        except queue.Empty:
+            return job
+        if job is None:
+            return None
+
+
+def _analyse(engine, game, generation, results, max_depth):
+    engine.search(game, depth=max_depth, info=lambda iteration: results.put((generation, iteration)))
+
+
+def _analysis_worker(jobs, results, tt_size_mb, max_depth):
+    engine = Engine(tt_size_mb)
+    search_thread = None
+    while True:
+        job = jobs.get()
+        if job is not None:
+            job = _drain(jobs, job)
+        if search_thread:
+            engine.stop()
+            search_thread.join()
+        if job is None:
+            return
+        generation, board, current_turn, moves = job
+        if board is None:
+            continue
+        # Replayed from the first position so the search sees the game's repetitions
+        game = XiangqiGame()
+        game.set_position(board, current_turn)
+        for move in moves:
+            game.push(move)
+        engine.stop_requested = False
+        search_thread = threading.Thread(target=_analyse, args=(engine, game, generation, results, max_depth),
+                                         daemon=True)
+        search_thread.start()
+
+
+class Analysis:
+    """Engine analysis of a game's current position, running off the caller's thread.
+
+    With use_process the search runs in its own process, so it never competes with the caller for the
+    GIL; otherwise it runs on a thread. latest holds the deepest iteration (depth, score, pv, nodes,
+    time, nps) of the position last passed to start(), or None.
+    """
+
+    def __init__(self, tt_size_mb=16, max_depth=None, notify=None, use_process=True):
+        self.tt_size_mb = tt_size_mb
+        self.max_depth = max_depth
+        self.notify = notify
+        self.use_process = use_process
+        self.generation = 0
+        self.latest = None
+        self.worker = None
+
+    def _start_worker(self):
+        if self.use_process:
+            # Spawned rather than forked, so the worker inherits no GUI state
+            context = multiprocessing.get_context("spawn")
+            self.jobs = context.Queue()
+            self.results = context.Queue()
+            self.worker = context.Process(target=_analysis_worker,
+                                          args=(self.jobs, self.results, self.tt_size_mb, self.max_depth),
+                                          daemon=True)
+        else:
+            self.jobs = queue.Queue()
+            self.results = queue.Queue()
+            self.worker = threading.Thread(target=_analysis_worker,
+                                           args=(self.jobs, self.results, self.tt_size_mb, self.max_depth),
+                                           daemon=True)
+        self.worker.start()
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def _receive(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            generation, iteration = message
+            # Iterations of positions that have since changed are dropped
+            if generation == self.generation:
+                self.latest = iteration
+                if self.notify:
+                    self.notify()
+
+    def start(self, game):
+        """Cancel any running analysis and start on a snapshot of the game's position"""
+        if self.worker is None:
+            self._start_worker()
+        self.generation += 1
+        self.latest = None
+        self.jobs.put((self.generation,) + game.first_position())
+
+    def stop(self):
+        """Cancel the running analysis; latest is cleared"""
+        self.generation += 1
+        self.latest = None
+        if self.worker is not None:
+            # A job without a board stops the search and leaves the worker waiting
+            self.jobs.put((self.generation, None, None, None))
+
+    def best_move(self):
+        """First move of the latest principal variation, or None"""
+        latest = self.latest
+        return latest["pv"][0] if latest and latest["pv"] else None
+
+    def close(self):
+        if self.worker is None:
+            return
+        self.generation += 1
+        self.jobs.put(None)
+        self.worker.join(1)
+        if self.use_process and self.worker.is_alive():
+            self.worker.terminate()
+        self.results.put(None)
+        # Wait for the receiver to see it, so it is not still reading when the queue is torn down
+        self.receiver.join(1)
+        self.worker = None
@@ -0,0 +1,243 @@
+# Parallel validation and statistics over game-record archives
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from xiangqi_game import XiangqiGame
+from xiangqi_notation import RESULTS, game_from_fen, parse_move, read_pgn_tokens, to_iccs
+from xiangqi_rules import XiangqiRules
+
+# Plain game-record files are split into byte ranges of about this size
+DEFAULT_SHARD_BYTES = 16 * 1024 * 1024
+
+# How many illegal games a shard reports in detail; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class ArchiveStats:
+    def __init__(self):
+        self.games = 0
+        self.moves = 0
+        self.illegal_games = 0
+        self.results = Counter()
+        self.lengths = Counter()
+        self.captures = Counter()
+        self.openings = Counter()
+        self.errors = []
+
+    def merge(self, other):
+        self.games += other.games
+        self.moves += other.moves
+        self.illegal_games += other.illegal_games
+        self.results.update(other.results)
+        self.lengths.update(other.lengths)
+        self.captures.update(other.captures)
+        self.openings.update(other.openings)
+        self.errors.extend(other.errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def add_error(self, path, offset, ply, move, message):
+        self.illegal_games += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"file": path, "offset": offset, "ply": ply, "move": move, "error": message})
+
+    def summary(self, top_openings=10):
+        total_plies = sum(length * count for length, count in self.lengths.items())
+        valid_games = sum(self.lengths.values())
+        return {
+            "games": self.games,
+            "moves": self.moves,
+            "illegal_games": self.illegal_games,
+            "results": dict(self.results),
+            "average_length": total_plies / valid_games if valid_games else 0.0,
+            "lengths": {str(length): count for length, count in sorted(self.lengths.items())},
+            "captures": dict(self.captures.most_common()),
+            "openings": dict(self.openings.most_common(top_openings)),
+            "errors": self.errors,
+        }
+
+
+def _replay(stats, fen, result, tokens, opening_plies, path, offset):
+    # Play the game through XiangqiGame, checking each move with XiangqiRules
+    stats.games += 1
+    try:
+        game = game_from_fen(fen) if fen else XiangqiGame()
+    except ValueError as error:
+        stats.add_error(path, offset, 0, None, str(error))
+        return
+
+    opening = []
+    captures = []
+    for ply, token in enumerate(tokens, 1):
+        try:
+            start, end = parse_move(game.board, game.current_turn, token)
+        except ValueError as error:
+            stats.add_error(path, offset, ply, token, str(error))
+            return
+        piece = game.board[start[0]][start[1]]
+        if not piece or piece[1] != game.current_turn or \
+                not XiangqiRules.is_legal_move(game.board, game.current_turn, start, end):
+            stats.add_error(path, offset, ply, token, "illegal move")
+            return
+        captured = game.board[end[0]][end[1]]
+        if captured:
+            captures.append(captured[0])
+        if ply <= opening_plies:
+            opening.append(to_iccs((start, end)))
+        game.make_move(start, end)
+
+    stats.moves += len(tokens)
+    stats.results[result] += 1
+    stats.lengths[len(tokens)] += 1
+    stats.captures.update(captures)
+    if opening:
+        stats.openings[" ".join(opening)] += 1
+
+
+def _replay_line(stats, line, opening_plies, path, offset):
+    line = line.rstrip("\r\n")
+    if not line.strip() or line.startswith("#"):
+        return
+    fields = line.split("\t")
+    if len(fields) != 3 or fields[1] not in RESULTS:
+        stats.games += 1
+        stats.add_error(path, offset, 0, None, "malformed game record")
+        return
+    fen, result, movetext = fields
+    _replay(stats, fen, result, movetext.split(), opening_plies, path, offset)
+
+
+def _replay_raw_line(stats, raw, opening_plies, path, offset):
+    try:
+        line = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        # A corrupt line is one bad game, not a reason to abort the shard
+        stats.games += 1
+        stats.add_error(path, offset, 0, None, "game record is not valid UTF-8")
+        return
+    _replay_line(stats, line, opening_plies, path, offset)
+
+
+def _line_shard(path, start, end, opening_plies):
+    """Replay the game-record lines that begin in the byte range [start, end)"""
+    stats = ArchiveStats()
+    with open(path, "rb") as f:
+        if start:
+            # The line straddling the start belongs to the previous shard
+            f.seek(start - 1)
+            f.readline()
+        while True:
+            offset = f.tell()
+            if offset >= end:
+                break
+            raw = f.readline()
+            if not raw:
+                break
+            _replay_raw_line(stats, raw, opening_plies, path, offset)
+    return stats
+
+
+def _gzip_shard(path, opening_plies):
+    # Compressed files can't be seeked into, so each is a single shard (offsets are line numbers)
+    stats = ArchiveStats()
+    with gzip.open(path, "rb") as f:
+        for line_number, raw in enumerate(f, 1):
+            _replay_raw_line(stats, raw, opening_plies, path, line_number)
+    return stats
+
+
+def _pgn_shard(path, opening_plies):
+    # PGN games span several lines, so each file is a single shard (offsets are game numbers)
+    stats = ArchiveStats()
+    for index, (tags, tokens, result) in enumerate(read_pgn_tokens(path), 1):
+        _replay(stats, tags.get("FEN"), result, tokens, opening_plies, path, index)
+    return stats
+
+
+def plan_shards(paths, shard_bytes=DEFAULT_SHARD_BYTES):
+    """Split the input files into (kind, path, start, end) shards"""
+    shards = []
+    for path in paths:
+        if path.endswith(".pgn"):
+            shards.append(("pgn", path, 0, 0))
+        elif path.endswith(".gz"):
+            shards.append(("gzip", path, 0, 0))
+        else:
+            size = os.path.getsize(path)
+            for start in range(0, max(size, 1), shard_bytes):
+                shards.append(("lines", path, start, min(start + shard_bytes, size)))
+    return shards
+
+
+def _run_shard(shard, opening_plies):
+    kind, path, start, end = shard
+    if kind == "pgn":
+        return _pgn_shard(path, opening_plies)
+    if kind == "gzip":
+        return _gzip_shard(path, opening_plies)
+    return _line_shard(path, start, end, opening_plies)
+
+
+def validate_archives(paths, workers=None, shard_bytes=DEFAULT_SHARD_BYTES, opening_plies=6, progress=None):
+    """Replay every game in the archives across a process pool and return merged ArchiveStats"""
+    shards = plan_shards(paths, shard_bytes)
+    stats = ArchiveStats()
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_run_shard, shard, opening_plies) for shard in shards]
+        for done, future in enumerate(as_completed(futures), 1):
+            stats.merge(future.result())
+            if progress:
+                progress(done, len(shards), stats)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate game-record archives and collect statistics")
+    parser.add_argument("paths", nargs="+", help="game-record files (.txt, .gz) or PGN files (.pgn)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--shard-mb", type=float, default=DEFAULT_SHARD_BYTES / (1024 * 1024),
+                        help="shard size for plain game-record files in MB (default: 16)")
+    parser.add_argument("--opening-plies", type=int, default=6, help="plies that identify an opening (default: 6)")
+    parser.add_argument("--json", metavar="FILE", help="write the full statistics and illegal games to FILE")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+
+    def progress(done, total, stats):
+        elapsed = time.perf_counter() - start_time
+        print(f"\r{done}/{total} shards  {stats.games} games  {stats.games / elapsed:,.0f} games/s",
+              end="", file=sys.stderr, flush=True)
+
+    stats = validate_archives(args.paths, args.workers, int(args.shard_mb * 1024 * 1024), args.opening_plies,
+                              progress)
+    elapsed = time.perf_counter() - start_time
+    print(file=sys.stderr)
+
+    summary = stats.summary()
+    print(f"games: {stats.games}  moves: {stats.moves}  illegal games: {stats.illegal_games}")
+    print(f"time: {elapsed:.1f}s  {stats.games / elapsed:,.0f} games/s  {stats.moves / elapsed:,.0f} moves/s "
+          f"with {args.workers} workers")
+    print(f"results: {summary['results']}")
+    print(f"average length: {summary['average_length']:.1f} plies")
+    print(f"captures: {summary['captures']}")
+    print("top openings:")
+    for opening, count in summary["openings"].items():
+        print(f"  {count:>8}  {opening}")
+    for error in stats.errors[:20]:
+        print(f"illegal: {error['file']} @{error['offset']} ply {error['ply']} {error['move']}: {error['error']}")
+
+    if args.json:
+        summary["seconds"] = elapsed
+        summary["games_per_second"] = stats.games / elapsed if elapsed else 0.0
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    return 1 if stats.illegal_games else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
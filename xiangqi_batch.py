@@ -0,0 +1,484 @@
+# Batched environment stepping many games at once with NumPy
+#
+# N boards live in one int8 array of shape (N, 10, 9) holding FlatBoard piece codes.
+# Moves use a fixed action encoding: every (start, end) pair some piece can make on an
+# empty board, 2322 in all. Move generation, legality (including the flying general)
+# and stepping work on the whole batch with array operations.
+#
+# Each piece's candidate moves come from one packed table entry, and a single lookup of the
+# occupancy bits of a rank or file decides whether a rook or cannon path, horse leg or elephant
+# eye is clear. Only moves that could expose the general are played out on board copies and
+# checked for attacks: general moves, moves out of check, and moves to or from the few squares
+# on a line between the general and an enemy rook, cannon or general close enough to matter or
+# on an enemy horse's leg, about one in twenty-five pseudo-legal moves. The legal moves stay a
+# list grouped by game, so sampling and the done flags never scan the (N, 2322) masks.
+import argparse
+import time
+
+import numpy as np
+
+from xiangqi_board import (BLACK_FLAG, BOARD_COLS, BOARD_ROWS, BOARD_SQUARES, CANNON, CODE_PIECES, GENERAL, HORSE,
+                           PIECE_CODES, ROOK, SOLDIER, TYPE_MASK)
+from xiangqi_game import XiangqiGame
+from xiangqi_rules import (ADVISOR_MOVES, ELEPHANT_MOVES, FLAT_RAYS, GENERAL_MOVES, HORSE_ATTACKS, HORSE_MOVES,
+                           RAYS, SOLDIER_ATTACKS, SOLDIER_MOVES, SQUARE_COORDS)
+
+# Index of an always-empty padding square appended to every board
+PAD = BOARD_SQUARES
+STRIDE = BOARD_SQUARES + 1
+
+
+def _square(coord):
+    return coord[0] * BOARD_COLS + coord[1]
+
+
+def _build_actions():
+    pairs = set()
+    for square in range(BOARD_SQUARES):
+        for ray in RAYS[square]:
+            pairs.update((square, _square(end)) for end in ray)
+        pairs.update((square, _square(end)) for end, _ in HORSE_MOVES[square])
+        for color in ("red", "black"):
+            pairs.update((square, _square(end)) for end, _ in ELEPHANT_MOVES[color][square])
+            pairs.update((square, _square(end)) for end in ADVISOR_MOVES[color][square])
+    return sorted(pairs)
+
+
+ACTIONS = _build_actions()
+NUM_ACTIONS = len(ACTIONS)
+ACTION_INDEX = {pair: index for index, pair in enumerate(ACTIONS)}
+# Start and end square per action, plus a padding action NUM_ACTIONS on the padding square
+ACTION_FROM = np.array([start for start, _ in ACTIONS] + [PAD], dtype=np.intp)
+ACTION_TO = np.array([end for _, end in ACTIONS] + [PAD], dtype=np.intp)
+
+
+def encode_move(move):
+    """(start, end) coordinates -> action index"""
+    return ACTION_INDEX[(_square(move[0]), _square(move[1]))]
+
+
+def decode_action(action):
+    start, end = ACTIONS[action]
+    return (SQUARE_COORDS[start], SQUARE_COORDS[end])
+
+
+# Occupancy is also kept as one bitmask per rank (bit = column) and per file (bit = row), with a
+# last always-empty line for moves that need no squares empty
+EMPTY_LINE = BOARD_ROWS + BOARD_COLS
+LINE_COUNT = EMPTY_LINE + 1
+
+# Each candidate move of a piece code from a square is one int64 holding the action, its end and
+# start squares, the line and bits of the squares that must be empty for it (the squares a rook or
+# cannon passes, a horse leg or an elephant eye) and flags; the bits are the top field
+ACTION_MASK = (1 << 12) - 1
+SQUARE_MASK = (1 << 7) - 1
+LINE_MASK = (1 << 5) - 1
+END_SHIFT = 12
+START_SHIFT = 19
+LINE_SHIFT = 26
+BLACK_MOVE = 1 << 31
+CANNON_MOVE = 1 << 32
+GENERAL_MOVE = 1 << 33
+# A general moving along a file further than one step: only legal as the flying general's capture
+FLYING_MOVE = 1 << 34
+PATH_SHIFT = 35
+
+
+def _path(start, ray, distance):
+    # Line and bits of the squares strictly between start and ray[distance]
+    if start[1] == ray[0][1]:
+        return BOARD_ROWS + start[1], sum(1 << row for row, _ in ray[:distance])
+    return start[0], sum(1 << col for _, col in ray[:distance])
+
+
+def _square_bit(coord):
+    # A single square as the line and bit of its rank
+    return coord[0], 1 << coord[1]
+
+
+def _build_candidates():
+    candidates = []
+    starts = np.zeros(16 * BOARD_SQUARES, dtype=np.intp)
+    counts = np.zeros(16 * BOARD_SQUARES, dtype=np.intp)
+    for code, piece in enumerate(CODE_PIECES):
+        if piece is None:
+            continue
+        piece_type, color = piece
+        flags = BLACK_MOVE if color == "black" else 0
+        for square in range(BOARD_SQUARES):
+            start = SQUARE_COORDS[square]
+            moves = []
+            if piece_type in ("rook", "cannon", "general"):
+                for ray in RAYS[square]:
+                    for distance, end in enumerate(ray):
+                        line, bits = _path(start, ray, distance)
+                        if piece_type == "rook":
+                            moves.append((end, line, bits, 0))
+                        elif piece_type == "cannon":
+                            moves.append((end, line, bits, CANNON_MOVE))
+                        elif end in GENERAL_MOVES[color][square]:
+                            moves.append((end, EMPTY_LINE, 0, GENERAL_MOVE))
+                        elif start[1] == end[1]:
+                            moves.append((end, line, bits, GENERAL_MOVE | FLYING_MOVE))
+            elif piece_type == "horse":
+                moves = [(end, *_square_bit(leg), 0) for end, leg in HORSE_MOVES[square]]
+            elif piece_type == "elephant":
+                moves = [(end, *_square_bit(eye), 0) for end, eye in ELEPHANT_MOVES[color][square]]
+            else:
+                table = ADVISOR_MOVES if piece_type == "advisor" else SOLDIER_MOVES
+                moves = [(end, EMPTY_LINE, 0, 0) for end in table[color][square]]
+            key = code * BOARD_SQUARES + square
+            starts[key] = len(candidates)
+            counts[key] = len(moves)
+            for end, line, bits, move_flags in moves:
+                candidates.append(ACTION_INDEX[(square, _square(end))] | _square(end) << END_SHIFT
+                                  | square << START_SHIFT | line << LINE_SHIFT | flags | move_flags
+                                  | bits << PATH_SHIFT)
+    return np.array(candidates, dtype=np.int64), starts, counts
+
+
+CANDIDATES, CANDIDATE_STARTS, CANDIDATE_COUNTS = _build_candidates()
+
+RAY_SLOTS = BOARD_ROWS
+# Attack rays are stored 16 slots wide, so the occupancy of a ray reads as two 64-bit words, and
+# multiplying a word of eight 0/1 bytes by BYTES_TO_BITS gathers them into its top byte (byte i at bit 56 + i)
+RAY_WIDTH = 16
+BYTES_TO_BITS = np.uint64(0x0102040810204080)
+# Lowest set bit of a ray occupancy mask; empty masks point at the ray's last, always empty slot
+LOWEST_BIT = np.array([(bits & -bits).bit_length() - 1 if bits else RAY_SLOTS - 1
+                       for bits in range(1 << RAY_SLOTS)], dtype=np.intp)
+
+
+def _build_attack_tables():
+    # Rays, horse origins/legs and soldier origins per square, padded with PAD (one extra row for PAD
+    # itself, and every ray ends in at least one PAD)
+    rays = np.full((BOARD_SQUARES + 1, 4, RAY_WIDTH), PAD, dtype=np.intp)
+    horse_origins = np.full((BOARD_SQUARES + 1, 8), PAD, dtype=np.intp)
+    horse_legs = np.full((BOARD_SQUARES + 1, 8), PAD, dtype=np.intp)
+    soldier_origins = np.full((2, BOARD_SQUARES + 1, 3), PAD, dtype=np.intp)
+    for square in range(BOARD_SQUARES):
+        for direction, ray in enumerate(FLAT_RAYS[square]):
+            rays[square, direction, :len(ray)] = ray
+        for slot, (origin, leg) in enumerate(HORSE_ATTACKS[square]):
+            horse_origins[square, slot] = _square(origin)
+            horse_legs[square, slot] = _square(leg)
+        for color_index, color in enumerate(("red", "black")):
+            for slot, origin in enumerate(SOLDIER_ATTACKS[color][square]):
+                soldier_origins[color_index, square, slot] = _square(origin)
+    return rays, horse_origins, horse_legs, soldier_origins
+
+
+ATTACK_RAYS, HORSE_ORIGINS, HORSE_LEGS, SOLDIER_ORIGINS = _build_attack_tables()
+
+
+def _start_cells():
+    board = XiangqiGame().board
+    return np.array([PIECE_CODES[piece] if piece else 0 for row in board for piece in row], dtype=np.int8)
+
+
+START_CELLS = _start_cells()
+
+
+def _line_occupancy(cells):
+    # As float32 the products run through BLAS; the sums stay below 1024, so they are exact
+    occupied = (cells != 0).astype(np.float32).reshape(len(cells), BOARD_ROWS, BOARD_COLS)
+    lines = np.zeros((len(cells), LINE_COUNT), dtype=np.int64)
+    lines[:, :BOARD_ROWS] = occupied @ (1 << np.arange(BOARD_COLS)).astype(np.float32)
+    lines[:, BOARD_ROWS:EMPTY_LINE] = (1 << np.arange(BOARD_ROWS)).astype(np.float32) @ occupied
+    return lines
+
+
+def _ray_bits(ray_pieces):
+    """Occupancy of rays (..., RAY_WIDTH) as bitmasks, slot i at bit i"""
+    words = ((ray_pieces != 0).view("<u8") * BYTES_TO_BITS) >> np.uint64(56)
+    return (words[..., 0] | (words[..., 1] << np.uint64(8))).astype(np.intp)
+
+
+def _general_threats(padded, squares, enemy_flag, enemy_index):
+    """For each padded board, whether the general on squares[k] is in check, and the danger squares
+    whose change could expose it: along each ray, those up to the farthest enemy rook or general
+    with at most one piece before it, or cannon with none or two, and the legs of enemy horses
+    aiming at it. One move changes the pieces between by at most one, so nothing further along
+    can become an attack."""
+    base = np.arange(0, padded.size, STRIDE)[:, None]
+    rays = base[:, :, None] + ATTACK_RAYS[squares]
+    ray_pieces = np.take(padded, rays)
+    bits = _ray_bits(ray_pieces)
+    second_bits = bits & (bits - 1)
+    ray_starts = np.arange(0, ray_pieces.size, RAY_WIDTH).reshape(bits.shape)
+    slots = [LOWEST_BIT[bits], LOWEST_BIT[second_bits], LOWEST_BIT[second_bits & (second_bits - 1)]]
+    first, second, third = (np.take(ray_pieces, ray_starts + slot) for slot in slots)
+    enemy = enemy_flag[:, None]
+    rook, cannon, general = ROOK | enemy, CANNON | enemy, GENERAL | enemy
+
+    checks = (first == rook) | (second == cannon)
+    checks[:, :2] |= first[:, :2] == general
+    near = (first == rook) | (first == cannon)
+    near[:, :2] |= first[:, :2] == general
+    behind_one = second == rook
+    behind_one[:, :2] |= second[:, :2] == general
+    reach = np.where(third == cannon, slots[2], np.where(behind_one, slots[1], np.where(near, slots[0], -1)))
+    danger = np.zeros(padded.size, dtype=bool)
+    danger[rays[np.arange(RAY_WIDTH) <= reach[:, :, None]]] = True
+
+    horses = np.take(padded, base + HORSE_ORIGINS[squares]) == (HORSE | enemy)
+    legs = base + HORSE_LEGS[squares]
+    danger[legs[horses]] = True
+    horses &= np.take(padded, legs) == 0
+    soldiers = np.take(padded, base + SOLDIER_ORIGINS[enemy_index, squares]) == (SOLDIER | enemy)
+    in_check = checks.view(np.uint32)[:, 0] != 0
+    in_check |= horses.view(np.uint64)[:, 0] != 0
+    in_check |= soldiers[:, 0] | soldiers[:, 1] | soldiers[:, 2]
+    return in_check, danger.reshape(padded.shape)
+
+
+def _attacked(padded, squares, enemy_flag, enemy_index):
+    """For each padded board, whether squares[k] is attacked by the enemy pieces"""
+    base = np.arange(0, padded.size, STRIDE)[:, None]
+
+    # Rooks, cannons and the flying general: first and second piece along each ray
+    ray_pieces = np.take(padded, base[:, :, None] + ATTACK_RAYS[squares])
+    bits = _ray_bits(ray_pieces)
+    ray_starts = np.arange(0, ray_pieces.size, RAY_WIDTH).reshape(bits.shape)
+    first = np.take(ray_pieces, ray_starts + LOWEST_BIT[bits])
+    second = np.take(ray_pieces, ray_starts + LOWEST_BIT[bits & (bits - 1)])
+    enemy = enemy_flag[:, None]
+    # Per board, the four rays' results read as one 32-bit word and the eight horses' as one 64-bit word
+    rays = (first == (ROOK | enemy)) | (second == (CANNON | enemy))
+    rays[:, :2] |= first[:, :2] == (GENERAL | enemy)
+    attacked = rays.view(np.uint32)[:, 0] != 0
+
+    # Horses whose leg is free
+    horses = np.take(padded, base + HORSE_ORIGINS[squares]) == (HORSE | enemy)
+    horses &= np.take(padded, base + HORSE_LEGS[squares]) == 0
+    attacked |= horses.view(np.uint64)[:, 0] != 0
+
+    # Soldiers
+    soldiers = np.take(padded, base + SOLDIER_ORIGINS[enemy_index, squares]) == (SOLDIER | enemy)
+    attacked |= soldiers[:, 0] | soldiers[:, 1] | soldiers[:, 2]
+    return attacked
+
+
+def legal_moves(cells, sides):
+    """Legal moves of flat boards (N, 90) with sides to move (N,), 0 = red, as (games, actions):
+    one entry per move, grouped by game in increasing order"""
+    count = len(cells)
+    padded = np.zeros((count, STRIDE), dtype=np.int8)
+    padded[:, :BOARD_SQUARES] = cells
+
+    # Candidate moves of every piece belonging to the side to move, from the packed tables
+    own_flags = (sides * BLACK_FLAG).astype(np.int8)
+    own = (cells != 0) & ((cells & BLACK_FLAG) == own_flags[:, None])
+    pieces = np.flatnonzero(own)
+    piece_games = pieces // BOARD_SQUARES
+    keys = np.take(cells, pieces).astype(np.intp) * BOARD_SQUARES + pieces - piece_games * BOARD_SQUARES
+    counts = CANDIDATE_COUNTS[keys]
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    games = np.repeat(piece_games, counts)
+    candidates = CANDIDATES[np.repeat(CANDIDATE_STARTS[keys] - ends + counts, counts) + np.arange(total)]
+
+    # Pseudo-legal: target not our own, and the squares the move needs empty are empty, except for
+    # cannon captures (exactly one screen) and the flying general (only onto the enemy general)
+    targets = np.take(padded, games * STRIDE + ((candidates >> END_SHIFT) & SQUARE_MASK))
+    lines = _line_occupancy(cells).ravel()
+    blocked = np.take(lines, games * LINE_COUNT + ((candidates >> LINE_SHIFT) & LINE_MASK)) & (candidates >> PATH_SHIFT)
+    empty = targets == 0
+    enemy = ~empty & (((targets & BLACK_FLAG) != 0) != ((candidates & BLACK_MOVE) != 0))
+    clear = blocked == 0
+    pseudo = np.where((candidates & CANNON_MOVE) != 0,
+                      (clear & empty) | (~clear & ((blocked & (blocked - 1)) == 0) & enemy),
+                      clear & (empty | enemy))
+    pseudo &= ((candidates & FLYING_MOVE) == 0) | (enemy & ((targets & TYPE_MASK) == GENERAL))
+    kept = np.flatnonzero(pseudo)
+    games, candidates = games[kept], candidates[kept]
+    if not len(games):
+        return games, candidates
+
+    # Only general moves, moves touching the danger squares and moves out of check can leave the
+    # general attacked: play those on copies and drop the ones that do
+    general_codes = GENERAL | own_flags
+    has_general = cells == general_codes[:, None]
+    general_squares = np.where(has_general.any(axis=1), has_general.argmax(axis=1), PAD)
+    enemy_indices = 1 - sides.astype(np.intp)
+    enemy_flags = (enemy_indices * BLACK_FLAG).astype(np.int8)
+    in_check, danger = _general_threats(padded, general_squares, enemy_flags, enemy_indices)
+    danger = danger.ravel()
+
+    starts = (candidates >> START_SHIFT) & SQUARE_MASK
+    ends = (candidates >> END_SHIFT) & SQUARE_MASK
+    moving_general = (candidates & GENERAL_MOVE) != 0
+    base = games * STRIDE
+    own_general = general_squares[games]
+    verify = in_check[games] | moving_general | np.take(danger, base + starts) | np.take(danger, base + ends)
+    verify &= own_general != PAD
+    checked = np.flatnonzero(verify)
+    verified_games, starts, ends = games[checked], starts[checked], ends[checked]
+
+    after = padded[verified_games]
+    rows = np.arange(len(checked))
+    after[rows, ends] = after[rows, starts]
+    after[rows, starts] = 0
+    squares = np.where(moving_general[checked], ends, own_general[checked])
+    legal = np.ones(len(games), dtype=bool)
+    legal[checked] = ~_attacked(after, squares, enemy_flags[verified_games], enemy_indices[verified_games])
+    kept = np.flatnonzero(legal)
+    return games[kept], candidates[kept] & ACTION_MASK
+
+
+def moves_to_mask(count, games, actions):
+    """(games, actions) as a legal-move mask of shape (count, NUM_ACTIONS)"""
+    mask = np.zeros(count * NUM_ACTIONS, dtype=bool)
+    mask[games * NUM_ACTIONS + actions] = True
+    return mask.reshape(count, NUM_ACTIONS)
+
+
+def legal_action_mask(cells, sides):
+    """Legal-move mask of shape (N, NUM_ACTIONS) for flat boards (N, 90) and sides to move (N,), 0 = red"""
+    return moves_to_mask(len(cells), *legal_moves(cells, sides))
+
+
+class BatchEnv:
+    """N games stepped together.
+
+    boards is an int8 array (N, 10, 9) of piece codes, sides is 0 for red to move and 1 for
+    black. step() takes one action per game and returns (boards, rewards, dones, masks):
+    rewards are from the point of view of the side that just moved (1 when the opponent
+    is left without a legal move), and finished games are reset when auto_reset is set
+    (otherwise reset them before the next step). The legal moves are also kept as a list
+    grouped by game, which sample_actions() and the done flags read instead of the masks.
+    """
+
+    def __init__(self, num_envs, max_plies=300, auto_reset=True):
+        self.num_envs = num_envs
+        self.max_plies = max_plies
+        self.auto_reset = auto_reset
+        self.boards = np.empty((num_envs, BOARD_ROWS, BOARD_COLS), dtype=np.int8)
+        self.sides = np.zeros(num_envs, dtype=np.int8)
+        self.plies = np.zeros(num_envs, dtype=np.int32)
+        self.masks = np.zeros((num_envs, NUM_ACTIONS), dtype=bool)
+        self._start_actions = legal_moves(START_CELLS[None, :], np.zeros(1, dtype=np.int8))[1]
+        self._set_moves(np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.int64))
+        self.reset()
+
+    @property
+    def cells(self):
+        return self.boards.reshape(self.num_envs, BOARD_SQUARES)
+
+    def _set_moves(self, games, actions):
+        # Each game's moves are one contiguous run of the list
+        self.move_games = games
+        self.move_actions = actions
+        self.move_counts = np.bincount(games, minlength=self.num_envs)
+        self.move_starts = np.zeros(self.num_envs, dtype=np.intp)
+        runs = np.flatnonzero(np.diff(games, prepend=-1))
+        self.move_starts[games[runs]] = runs
+
+    def reset(self, indices=None):
+        """Reset all games, or those given by index or boolean mask, to the start position"""
+        chosen = np.zeros(self.num_envs, dtype=bool)
+        chosen[slice(None) if indices is None else indices] = True
+        self.cells[chosen] = START_CELLS
+        self.sides[chosen] = 0
+        self.plies[chosen] = 0
+        # The reset games' start moves go at the end of the move list
+        kept = np.flatnonzero(~chosen[self.move_games])
+        reset_games = np.flatnonzero(chosen)
+        self._set_moves(np.concatenate([self.move_games[kept], np.repeat(reset_games, len(self._start_actions))]),
+                        np.concatenate([self.move_actions[kept], np.tile(self._start_actions, len(reset_games))]))
+        self.masks = moves_to_mask(self.num_envs, self.move_games, self.move_actions)
+        return self.boards, self.masks
+
+    def load_games(self, games):
+        """Copy XiangqiGame positions into the batch"""
+        for index, game in enumerate(games):
+            self.cells[index] = [PIECE_CODES[piece] if piece else 0 for row in game.board for piece in row]
+            self.sides[index] = 1 if game.current_turn == "black" else 0
+            self.plies[index] = len(game.history)
+        self._set_moves(*legal_moves(self.cells, self.sides))
+        self.masks = moves_to_mask(self.num_envs, self.move_games, self.move_actions)
+
+    def to_game(self, index):
+        """The position of one game as a XiangqiGame"""
+        game = XiangqiGame()
+        cells = self.cells[index]
+        board = [[CODE_PIECES[cells[row * BOARD_COLS + col]] for col in range(BOARD_COLS)]
+                 for row in range(BOARD_ROWS)]
+        game.set_position(board, "black" if self.sides[index] else "red")
+        return game
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.intp)
+        rows = np.arange(self.num_envs)
+        if not self.masks[rows, actions].all():
+            illegal = np.nonzero(~self.masks[rows, actions])[0]
+            raise ValueError(f"Illegal actions in games {illegal[:10].tolist()}")
+
+        cells = self.cells
+        starts, ends = ACTION_FROM[actions], ACTION_TO[actions]
+        cells[rows, ends] = cells[rows, starts]
+        cells[rows, starts] = 0
+        self.sides ^= 1
+        self.plies += 1
+
+        self._set_moves(*legal_moves(cells, self.sides))
+        # In Xiangqi a side without a legal move has lost, checkmated or not
+        no_moves = self.move_counts == 0
+        rewards = no_moves.astype(np.float32)
+        dones = no_moves | (self.plies >= self.max_plies)
+        if self.auto_reset and dones.any():
+            self.reset(dones)
+        else:
+            self.masks = moves_to_mask(self.num_envs, self.move_games, self.move_actions)
+        return self.boards, rewards, dones, self.masks
+
+    def sample_actions(self, rng):
+        """Uniformly random legal action per game"""
+        counts = self.move_counts
+        if not len(self.move_actions):
+            return np.zeros(self.num_envs, dtype=np.intp)
+        picks = self.move_starts + (rng.random(self.num_envs) * counts).astype(np.intp)
+        return np.where(counts, self.move_actions[np.minimum(picks, len(self.move_actions) - 1)], 0)
+
+
+def _benchmark_loop(num_games, steps, seed):
+    # Baseline: one XiangqiGame object per game, stepped in a Python loop
+    rng = np.random.default_rng(seed)
+    games = [XiangqiGame() for _ in range(num_games)]
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        for index, game in enumerate(games):
+            moves = game.legal_moves()
+            if not moves or len(game.history) >= 300:
+                games[index] = game = XiangqiGame()
+                moves = game.legal_moves()
+            game.push(moves[rng.integers(len(moves))])
+    return num_games * steps / (time.perf_counter() - start_time)
+
+
+def _benchmark_batch(num_envs, steps, seed):
+    rng = np.random.default_rng(seed)
+    env = BatchEnv(num_envs)
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        env.step(env.sample_actions(rng))
+    return num_envs * steps / (time.perf_counter() - start_time)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark batched stepping against XiangqiGame loops")
+    parser.add_argument("--envs", type=int, default=1024, help="games in the batch (default: 1024)")
+    parser.add_argument("--steps", type=int, default=100, help="steps to run (default: 100)")
+    parser.add_argument("--loop-games", type=int, default=64, help="games for the Python loop baseline")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    loop_rate = _benchmark_loop(args.loop_games, args.steps, args.seed)
+    batch_rate = _benchmark_batch(args.envs, args.steps, args.seed)
+    print(f"XiangqiGame loop: {loop_rate:>10,.0f} game steps/s ({args.loop_games} games)")
+    print(f"BatchEnv:         {batch_rate:>10,.0f} game steps/s ({args.envs} games)")
+    print(f"speedup:          {batch_rate / loop_rate:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Compact flat board representation
+#
+# A FlatBoard keeps the 90 squares in a bytearray (square = row * 9 + col) holding
+# small integer piece codes: the low three bits are the piece type and bit 3 marks
+# black pieces, so every code fits in a nibble and 0 means empty. Per-colour piece
+# lists let callers walk a side's pieces without scanning the board.
+
+BOARD_ROWS = 10
+BOARD_COLS = 9
+BOARD_SQUARES = BOARD_ROWS * BOARD_COLS
+
+PIECE_TYPES = ("general", "advisor", "elephant", "horse", "rook", "cannon", "soldier")
+COLORS = ("red", "black")
+
+EMPTY = 0
+BLACK_FLAG = 8
+TYPE_MASK = 7
+
+# (piece_type, color) -> code, and code -> the shared (piece_type, color) tuple
+PIECE_CODES = {}
+CODE_PIECES = [None] * 16
+for _index, _piece_type in enumerate(PIECE_TYPES):
+    for _color in COLORS:
+        _code = (_index + 1) | (BLACK_FLAG if _color == "black" else 0)
+        PIECE_CODES[(_piece_type, _color)] = _code
+        CODE_PIECES[_code] = (_piece_type, _color)
+CODE_PIECES = tuple(CODE_PIECES)
+del _index, _piece_type, _color, _code
+
+# Type codes (without the colour flag)
+GENERAL, ADVISOR, ELEPHANT, HORSE, ROOK, CANNON, SOLDIER = range(1, 8)
+
+
+def color_flag(color):
+    return BLACK_FLAG if color == "black" else 0
+
+
+def code_color(code):
+    return "black" if code & BLACK_FLAG else "red"
+
+
+class FlatBoard:
+    __slots__ = ("cells", "pieces")
+
+    def __init__(self, cells=None):
+        self.cells = bytearray(cells) if cells is not None else bytearray(BOARD_SQUARES)
+        if len(self.cells) != BOARD_SQUARES:
+            raise ValueError(f"Expected {BOARD_SQUARES} cells, got {len(self.cells)}")
+        # Squares occupied by each colour
+        self.pieces = {"red": [], "black": []}
+        for square, code in enumerate(self.cells):
+            if code:
+                self.pieces[code_color(code)].append(square)
+
+    @classmethod
+    def from_nested(cls, board):
+        """Build a flat board from the nested list-of-lists form used by XiangqiGame"""
+        cells = bytearray(BOARD_SQUARES)
+        for row in range(BOARD_ROWS):
+            board_row = board[row]
+            for col in range(BOARD_COLS):
+                piece = board_row[col]
+                if piece:
+                    cells[row * BOARD_COLS + col] = PIECE_CODES[piece]
+        return cls(cells)
+
+    def to_nested(self):
+        """Convert back to the nested list-of-lists form used by XiangqiGame"""
+        cells = self.cells
+        return [[CODE_PIECES[cells[row * BOARD_COLS + col]] for col in range(BOARD_COLS)]
+                for row in range(BOARD_ROWS)]
+
+    def copy(self):
+        return FlatBoard(self.cells)
+
+    def __bytes__(self):
+        # 90 bytes per position, suitable for storing large numbers of positions
+        return bytes(self.cells)
+
+    def __eq__(self, other):
+        if isinstance(other, FlatBoard):
+            return self.cells == other.cells
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(bytes(self.cells))
+
+    def __getitem__(self, row):
+        # Compatibility view so board[row][col] works like the nested form
+        if not 0 <= row < BOARD_ROWS:
+            raise IndexError("board row out of range")
+        return _BoardRow(self, row * BOARD_COLS)
+
+    def __len__(self):
+        return BOARD_ROWS
+
+    def __iter__(self):
+        for row in range(BOARD_ROWS):
+            yield _BoardRow(self, row * BOARD_COLS)
+
+    def piece_at(self, square):
+        return CODE_PIECES[self.cells[square]]
+
+    def place(self, square, code):
+        """Put a piece code (or EMPTY) on a square and return the code it replaced"""
+        old = self.cells[square]
+        if old:
+            self.pieces[code_color(old)].remove(square)
+        if code:
+            self.pieces[code_color(code)].append(square)
+        self.cells[square] = code
+        return old
+
+    def move(self, start_square, end_square):
+        """Move the piece on start_square to end_square and return the captured code"""
+        cells = self.cells
+        code = cells[start_square]
+        captured = cells[end_square]
+        pieces = self.pieces
+        if captured:
+            pieces[code_color(captured)].remove(end_square)
+        color_pieces = pieces[code_color(code)]
+        color_pieces[color_pieces.index(start_square)] = end_square
+        cells[end_square] = code
+        cells[start_square] = EMPTY
+        return captured
+
+
+class _BoardRow:
+    __slots__ = ("board", "base")
+
+    def __init__(self, board, base):
+        self.board = board
+        self.base = base
+
+    def __getitem__(self, col):
+        if not 0 <= col < BOARD_COLS:
+            raise IndexError("board column out of range")
+        return CODE_PIECES[self.board.cells[self.base + col]]
+
+    def __setitem__(self, col, piece):
+        if not 0 <= col < BOARD_COLS:
+            raise IndexError("board column out of range")
+        self.board.place(self.base + col, PIECE_CODES[piece] if piece else EMPTY)
+
+    def __len__(self):
+        return BOARD_COLS
+
+    def __iter__(self):
+        cells = self.board.cells
+        for square in range(self.base, self.base + BOARD_COLS):
+            yield CODE_PIECES[cells[square]]
@@ -0,0 +1,199 @@
+# Opening books built from game records, stored as sorted fixed-size entries and probed through mmap
+#
+# A book file is a 16-byte header followed by 16-byte entries sorted by position key:
+#
+#     key     8 bytes  XiangqiGame.hash_key of the position
+#     move    2 bytes  pack_move() of a move played from it
+#     weight  2 bytes  2 * wins + draws for the side that played it, scaled per position to fit
+#     games   4 bytes  games in which it was played
+#
+# Nothing is parsed at load time: a lookup is a binary search over the mapped file, and the pages
+# are shared by every process that opens the same book.
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from xiangqi_hash import pack_move, unpack_move
+from xiangqi_notation import game_from_fen, read_records, to_iccs
+from xiangqi_rules import XiangqiRules
+
+MAGIC = b"XQBOOK\x00\x01"
+HEADER = struct.Struct("<8sII")
+ENTRY = struct.Struct("<QHHI")
+KEY = struct.Struct("<Q")
+
+# Plies of each game added to the book
+DEFAULT_MAX_PLY = 30
+# Moves played in fewer games than this are left out
+DEFAULT_MIN_GAMES = 2
+MAX_WEIGHT = 0xFFFF
+
+# Points for the side to move, doubled: win, draw, loss; unfinished games count as draws
+_POINTS = {("1-0", "red"): 2, ("0-1", "black"): 2, ("1-0", "black"): 0, ("0-1", "red"): 0}
+
+
+class BookBuilder:
+    """Aggregates move statistics per position from game records"""
+
+    def __init__(self, max_ply=DEFAULT_MAX_PLY):
+        self.max_ply = max_ply
+        # position key -> {packed move: [games, doubled points]}
+        self.positions = {}
+        self.games = 0
+
+    def add_game(self, record):
+        """Replay a GameRecord through XiangqiGame, counting its first max_ply moves"""
+        game = game_from_fen(record.fen)
+        for move in record.moves[:self.max_ply]:
+            stats = self.positions.setdefault(game.hash_key, {}).setdefault(pack_move(move), [0, 0])
+            stats[0] += 1
+            stats[1] += _POINTS.get((record.result, game.current_turn), 1)
+            game.push(move)
+        self.games += 1
+
+    def entries(self, min_games=DEFAULT_MIN_GAMES):
+        """Sorted (key, packed move, weight, games) tuples, best-weighted move first per position"""
+        entries = []
+        for key in sorted(self.positions):
+            moves = [(packed, points, games) for packed, (games, points) in self.positions[key].items()
+                     if games >= min_games and points]
+            if not moves:
+                continue
+            # Scale so the most-played position still fits the 16-bit weight
+            largest = max(points for _, points, _ in moves)
+            scale = min(1.0, MAX_WEIGHT / largest)
+            moves.sort(key=lambda move: -move[1])
+            for packed, points, games in moves:
+                entries.append((key, packed, max(1, int(points * scale)), games))
+        return entries
+
+    def write(self, path, min_games=DEFAULT_MIN_GAMES):
+        """Write the book file; returns the number of entries"""
+        entries = self.entries(min_games)
+        buffer = bytearray(HEADER.size + ENTRY.size * len(entries))
+        HEADER.pack_into(buffer, 0, MAGIC, ENTRY.size, len(entries))
+        offset = HEADER.size
+        for entry in entries:
+            ENTRY.pack_into(buffer, offset, *entry)
+            offset += ENTRY.size
+        # Written under a temporary name so readers never map a half-written book
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(buffer)
+        os.replace(temporary, path)
+        return len(entries)
+
+
+class OpeningBook:
+    """Read-only opening book mapped into memory"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError("Not an opening book: file is too short")
+            magic, entry_size, count = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("Not an opening book: bad magic")
+            if entry_size != ENTRY.size:
+                raise ValueError(f"Unsupported entry size {entry_size}")
+            if os.path.getsize(path) < HEADER.size + count * ENTRY.size:
+                raise ValueError("Opening book is truncated")
+            self.count = count
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if count else b""
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def _first_entry(self, key):
+        # Leftmost entry whose key is >= key
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, HEADER.size + middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def probe(self, key):
+        """(move, weight, games) for every book move of the position with this key"""
+        data = self.data
+        found = []
+        for index in range(self._first_entry(key), self.count):
+            entry_key, packed, weight, games = ENTRY.unpack_from(data, HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((unpack_move(packed), weight, games))
+        return found
+
+    def moves(self, game):
+        """Book moves legal in the game's position; hash collisions are filtered out"""
+        return [(move, weight, games) for move, weight, games in self.probe(game.hash_key)
+                if XiangqiRules.is_legal_move(game.board, game.current_turn, *move)]
+
+    def choose(self, game, rng=None, best=False, exclude=()):
+        """A book move picked with probability proportional to its weight (or the heaviest), or None.
+
+        Moves in exclude are never picked.
+        """
+        moves = [entry for entry in self.moves(game) if entry[0] not in exclude]
+        if not moves:
+            return None
+        if best:
+            return moves[0][0]
+        return (rng or random).choices([move for move, _, _ in moves], [weight for _, weight, _ in moves])[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and probe opening books")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from game-record or PGN files")
+    build.add_argument("book")
+    build.add_argument("games", nargs="+")
+    build.add_argument("--max-ply", type=int, default=DEFAULT_MAX_PLY,
+                       help=f"plies of each game to include (default: {DEFAULT_MAX_PLY})")
+    build.add_argument("--min-games", type=int, default=DEFAULT_MIN_GAMES,
+                       help=f"games a move needs to be included (default: {DEFAULT_MIN_GAMES})")
+    probe = commands.add_parser("probe", help="list the book moves of a position and time lookups")
+    probe.add_argument("book")
+    probe.add_argument("--fen", help="position to probe (default: the start position)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start_time = time.perf_counter()
+        builder = BookBuilder(args.max_ply)
+        for path in args.games:
+            for record in read_records(path):
+                builder.add_game(record)
+        entries = builder.write(args.book, args.min_games)
+        print(f"{builder.games} games, {len(builder.positions)} positions, {entries} entries "
+              f"({os.path.getsize(args.book):,} bytes) in {time.perf_counter() - start_time:.1f}s")
+        return 0
+
+    book = OpeningBook(args.book)
+    game = game_from_fen(args.fen)
+    total = sum(weight for _, weight, _ in book.moves(game)) or 1
+    for move, weight, games in book.moves(game):
+        print(f"{to_iccs(move)}  {100 * weight / total:5.1f}%  {games} games")
+    lookups = 100000
+    start_time = time.perf_counter()
+    for _ in range(lookups):
+        book.probe(game.hash_key)
+    elapsed = time.perf_counter() - start_time
+    print(f"{len(book)} entries, {1e6 * elapsed / lookups:.2f} us per probe")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+# Packed, memory-mapped position datasets for training pipelines
+#
+# A dataset file is a 16-byte header (magic, record size, record count) followed by fixed 48-byte records:
+#
+#     cells   45 bytes  FlatBoard piece codes of the 90 squares, two per byte (even square in the low nibble)
+#     flags    1 byte   bit 0 set when black is to move, bits 1-2 the game result (RESULT_CODES)
+#     move     2 bytes  move played from the position as pack_move(), 0 for none (little-endian)
+#
+# Writers append records in bulk and readers memory-map the file, so positions are never decoded
+# as a whole: cells, flags and moves are zero-copy NumPy views, and batches unpack only what they touch.
+# The writer updates the header count after each flush, so records past it were left by an interrupted
+# writer and are ignored; a file shorter than its count has been truncated and is refused.
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from xiangqi_board import BOARD_COLS, BOARD_ROWS, BOARD_SQUARES, CODE_PIECES, PIECE_CODES, FlatBoard
+from xiangqi_hash import pack_move, unpack_move
+from xiangqi_notation import game_from_fen, read_records
+
+MAGIC = b"XQPOS\x00\x01\x00"
+HEADER = struct.Struct("<8sIQ")
+# Offset of the record count within the header
+COUNT_OFFSET = 12
+RECORD_DTYPE = np.dtype([("cells", np.uint8, (BOARD_SQUARES // 2,)), ("flags", np.uint8), ("move", "<u2")])
+
+# Game results from red's point of view
+RESULT_CODES = {"*": 0, "1-0": 1, "0-1": 2, "1/2-1/2": 3}
+CODE_RESULTS = {code: result for result, code in RESULT_CODES.items()}
+
+# Positions buffered by DatasetWriter.append before they are written out together
+DEFAULT_BUFFER_SIZE = 65536
+
+
+def board_codes(board):
+    """Piece codes of a nested board or FlatBoard as a (90,) uint8 array"""
+    if isinstance(board, FlatBoard):
+        return np.frombuffer(bytes(board), dtype=np.uint8)
+    return np.array([PIECE_CODES[piece] if piece else 0 for row in board for piece in row], dtype=np.uint8)
+
+
+def pack_cells(cells):
+    """(N, 90) piece codes -> (N, 45) bytes with two squares per byte"""
+    cells = np.asarray(cells, dtype=np.uint8).reshape(-1, BOARD_SQUARES)
+    return cells[:, 0::2] | (cells[:, 1::2] << 4)
+
+
+def unpack_cells(packed):
+    """(N, 45) packed bytes -> (N, 10, 9) int8 piece codes"""
+    packed = np.asarray(packed, dtype=np.uint8)
+    cells = np.empty((len(packed), BOARD_SQUARES), dtype=np.int8)
+    cells[:, 0::2] = packed & 0x0F
+    cells[:, 1::2] = packed >> 4
+    return cells.reshape(-1, BOARD_ROWS, BOARD_COLS)
+
+
+def encode_records(cells, sides, results=None, moves=None):
+    """Build a record array from (N, 90) piece codes, sides (1 = black to move), result codes and packed moves"""
+    records = np.zeros(len(cells), dtype=RECORD_DTYPE)
+    records["cells"] = pack_cells(cells)
+    flags = np.asarray(sides, dtype=np.uint8) & 1
+    if results is not None:
+        flags |= (np.asarray(results, dtype=np.uint8) & 3) << 1
+    records["flags"] = flags
+    if moves is not None:
+        records["move"] = moves
+    return records
+
+
+def _read_header(f, size):
+    """Record count of a dataset file of size bytes, checked against the records it holds"""
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError("Not a position dataset: file is too short")
+    magic, record_size, count = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("Not a position dataset: bad magic")
+    if record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"Unsupported record size {record_size}")
+    stored = (size - HEADER.size) // record_size
+    if count > stored:
+        raise ValueError(f"Truncated position dataset: header counts {count} records, file holds {stored}")
+    return count
+
+
+class DatasetWriter:
+    """Appends positions to a dataset file, creating it if needed.
+
+    Records an interrupted writer left past the header count are dropped.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        size = os.path.getsize(path)
+        if size:
+            records = _read_header(self.file, size)
+            self.file.truncate(HEADER.size + records * RECORD_DTYPE.itemsize)
+        else:
+            self.file.write(HEADER.pack(MAGIC, RECORD_DTYPE.itemsize, 0))
+            records = 0
+        self.file.seek(0, os.SEEK_END)
+        self.count = records
+        self.cells = []
+        self.flags = []
+        self.moves = []
+
+    def append(self, board, current_turn, result="*", move=None):
+        """Buffer one position; move is the move played from it, if any"""
+        self.cells.append(board_codes(board))
+        self.flags.append((current_turn == "black") | (RESULT_CODES[result] << 1))
+        self.moves.append(pack_move(move) if move else 0)
+        if len(self.cells) >= self.buffer_size:
+            self.flush()
+
+    def append_batch(self, cells, sides, results=None, moves=None):
+        """Write N positions at once; arguments as for encode_records"""
+        self.flush()
+        records = encode_records(cells, sides, results, moves)
+        records.tofile(self.file)
+        self.count += len(records)
+        self.flush()
+
+    def append_game(self, record):
+        """Append every position of a GameRecord, labelled with the move played and the result"""
+        game = game_from_fen(record.fen)
+        for move in record.moves:
+            self.append(game.board, game.current_turn, record.result, move)
+            game.push(move)
+        return len(record.moves)
+
+    def flush(self):
+        if self.cells:
+            records = np.zeros(len(self.cells), dtype=RECORD_DTYPE)
+            records["cells"] = pack_cells(np.stack(self.cells))
+            records["flags"] = self.flags
+            records["move"] = self.moves
+            records.tofile(self.file)
+            self.count += len(records)
+            self.cells = []
+            self.flags = []
+            self.moves = []
+        # Records first, then the count that covers them
+        self.file.flush()
+        self.file.seek(COUNT_OFFSET)
+        self.file.write(struct.pack("<Q", self.count))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PositionDataset:
+    """Read-only, memory-mapped view of a dataset file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            count = _read_header(f, os.fstat(f.fileno()).st_size)
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def cells(self):
+        """Packed squares, (N, 45) uint8, without copying"""
+        return self.records["cells"]
+
+    @property
+    def flags(self):
+        return self.records["flags"]
+
+    @property
+    def moves(self):
+        return self.records["move"]
+
+    def batch(self, indices):
+        """Unpack the records at indices (a slice, index array or boolean mask).
+
+        Returns (cells, sides, results, moves): (B, 10, 9) int8 piece codes, 1 where black is to
+        move, result codes and packed moves.
+        """
+        records = self.records[indices]
+        flags = records["flags"]
+        return unpack_cells(records["cells"]), flags & 1, (flags >> 1) & 3, records["move"].astype(np.uint16)
+
+    def random_batch(self, size, rng=None):
+        rng = rng or np.random.default_rng()
+        return self.batch(np.sort(rng.integers(0, len(self), size)))
+
+    def iter_batches(self, batch_size):
+        for start in range(0, len(self), batch_size):
+            yield self.batch(slice(start, start + batch_size))
+
+    def position(self, index):
+        """One record as (board, current_turn, result, move) with a nested board"""
+        cells, sides, results, moves = self.batch([index])
+        board = [[CODE_PIECES[code] for code in row] for row in cells[0].tolist()]
+        return board, "black" if sides[0] else "red", CODE_RESULTS[int(results[0])], unpack_move(int(moves[0]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect packed position datasets")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="append every position of game-record or PGN files to a dataset")
+    export.add_argument("dataset")
+    export.add_argument("games", nargs="+")
+    info = commands.add_parser("info", help="summarize a dataset and time random batch reads")
+    info.add_argument("dataset")
+    info.add_argument("--batch", type=int, default=4096, help="batch size for the read benchmark (default: 4096)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        start_time = time.perf_counter()
+        games = positions = 0
+        with DatasetWriter(args.dataset) as writer:
+            for path in args.games:
+                for record in read_records(path):
+                    positions += writer.append_game(record)
+                    games += 1
+        elapsed = time.perf_counter() - start_time
+        print(f"{games} games, {positions} positions in {elapsed:.1f}s "
+              f"({positions / elapsed if elapsed else 0:,.0f} positions/s), {writer.count} in {args.dataset}")
+        return 0
+
+    dataset = PositionDataset(args.dataset)
+    print(f"{len(dataset)} positions, {os.path.getsize(args.dataset):,} bytes "
+          f"({RECORD_DTYPE.itemsize} bytes per position)")
+    if not len(dataset):
+        return 0
+    results = np.bincount((dataset.flags >> 1) & 3, minlength=4)
+    print("results: " + "  ".join(f"{CODE_RESULTS[code]} {count}" for code, count in enumerate(results)))
+    rng = np.random.default_rng(0)
+    batches = 0
+    start_time = time.perf_counter()
+    while time.perf_counter() - start_time < 1.0:
+        dataset.random_batch(args.batch, rng)
+        batches += 1
+    elapsed = time.perf_counter() - start_time
+    print(f"random batches of {args.batch}: {batches * args.batch / elapsed:,.0f} positions/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
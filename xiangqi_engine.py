@@ -0,0 +1,342 @@
+# Alpha-beta search engine working on XiangqiGame positions
+import argparse
+import time
+
+from xiangqi_eval import PIECE_VALUES, evaluate
+from xiangqi_game import XiangqiGame
+from xiangqi_hash import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable, pack_move
+from xiangqi_repetition import adjudicate
+from xiangqi_rules import XiangqiRules
+
+# Values used to order captures (most valuable victim, least valuable attacker)
+ORDER_VALUES = dict(PIECE_VALUES, general=10000)
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000
+INFINITY = MATE_SCORE + 1
+# Losing by perpetual check or chase, just short of the mate scores so no ply adjustment applies
+REPETITION_LOSS = MATE_BOUND - 1
+MAX_PLY = 128
+
+# How often (in nodes) the time, node and stop limits are checked
+CHECK_INTERVAL = 1024
+
+
+def _score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchResult:
+    def __init__(self, best_move, score, depth, pv, nodes, seconds, iterations):
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.seconds = seconds
+        self.iterations = iterations
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+
+class Engine:
+    def __init__(self, tt_size_mb=16, lazy_eval=False, tablebase=None):
+        self.tt = TranspositionTable(tt_size_mb)
+        # Add mobility and king safety at leaves whose score is near the alpha-beta window
+        self.lazy_eval = lazy_eval
+        # Optional xiangqi_tablebase.Tablebase, probed once few enough pieces are left
+        self.tablebase = tablebase
+        self.stop_requested = False
+        self.pending_deadline = None
+        self.deadline = None
+        self.nodes = 0
+
+    def stop(self):
+        """Ask a running search to stop; safe to call from another thread.
+
+        The request stays in place until stop_requested is cleared, which callers running searches on
+        a thread do before starting it, so a stop made before the search gets going is not lost.
+        """
+        self.stop_requested = True
+
+    def set_deadline(self, deadline):
+        """Stop the search once time.perf_counter() reaches deadline; safe to call from another thread.
+
+        Like a stop request, the deadline stays pending until callers clear pending_deadline before
+        starting a search, so one set before the search thread gets going still applies.
+        """
+        self.pending_deadline = deadline
+        self.deadline = deadline
+
+    def clear(self):
+        """Forget everything learned from earlier searches"""
+        self.tt.clear()
+
+    def search(self, game, depth=None, time_limit=None, node_limit=None, info=None, root_moves=None):
+        """Search the game's position with iterative deepening.
+
+        Stops after depth plies, time_limit seconds or node_limit nodes, whichever comes first,
+        and calls info(iteration) with depth, score, pv, nodes, time and nps after each depth.
+        root_moves restricts the moves considered at the root; ValueError if none of them is legal.
+        """
+        if root_moves is not None:
+            legal = XiangqiRules.legal_moves(game.board, game.current_turn)
+            if not any(move in legal for move in root_moves):
+                raise ValueError("none of the root moves is legal in this position")
+        max_depth = min(depth or MAX_PLY - 1, MAX_PLY - 1)
+        self.nodes = 0
+        self.stopped = False
+        self.start_time = time.perf_counter()
+        self.deadline = self.start_time + time_limit if time_limit is not None else None
+        # Read after deadline is written, so a set_deadline racing with this line is not overwritten
+        pending = self.pending_deadline
+        if pending is not None and (self.deadline is None or pending < self.deadline):
+            self.deadline = pending
+        self.node_limit = node_limit
+        self.root_moves = set(root_moves) if root_moves is not None else None
+        self.completed_depth = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 8101
+        self.pv = [[] for _ in range(MAX_PLY + 2)]
+        # Pieces on the board, kept up to date through captures so tablebases are only probed when they can hit
+        self.piece_count = sum(1 for row in game.board for piece in row if piece)
+        self.tt.new_search()
+
+        best_move = None
+        best_score = 0
+        best_pv = []
+        iterations = []
+        for current_depth in range(1, max_depth + 1):
+            score = self._search(game, current_depth, -INFINITY, INFINITY, 0)
+            if self.stopped:
+                break
+
+            self.completed_depth = current_depth
+            best_score = score
+            best_pv = list(self.pv[0])
+            best_move = best_pv[0] if best_pv else None
+            elapsed = time.perf_counter() - self.start_time
+            iteration = {
+                "depth": current_depth,
+                "score": score,
+                "pv": best_pv,
+                "nodes": self.nodes,
+                "time": elapsed,
+                "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+            }
+            iterations.append(iteration)
+            if info:
+                info(iteration)
+
+            # No point searching deeper once a forced mate is found or there is nothing to choose
+            if abs(score) >= MATE_BOUND or best_move is None:
+                break
+
+        if best_move is None and self.stopped and self.pv[0]:
+            # Stopped during depth 1: the best root move searched completely so far
+            best_pv = list(self.pv[0])
+            best_move = best_pv[0]
+        elapsed = time.perf_counter() - self.start_time
+        return SearchResult(best_move, best_score, self.completed_depth, best_pv, self.nodes, elapsed,
+                            iterations)
+
+    def _check_limits(self):
+        if self.stop_requested:
+            self.stopped = True
+        # Time and node limits always let depth 1 finish so there is a move to play
+        elif self.completed_depth and ((self.deadline is not None and time.perf_counter() >= self.deadline)
+                                       or (self.node_limit is not None and self.nodes >= self.node_limit)):
+            self.stopped = True
+
+    def _order_moves(self, board, moves, tt_move, ply):
+        killers = self.killers[ply]
+        history = self.history
+
+        def order_key(move):
+            if move == tt_move:
+                return 1 << 30
+            (start_row, start_col), (end_row, end_col) = move
+            victim = board[end_row][end_col]
+            if victim:
+                # MVV-LVA
+                attacker = board[start_row][start_col]
+                return (1 << 24) + ORDER_VALUES[victim[0]] * 16 - ORDER_VALUES[attacker[0]] // 100
+            if move == killers[0]:
+                return (1 << 23) + 1
+            if move == killers[1]:
+                return 1 << 23
+            return history[pack_move(move)]
+
+        moves.sort(key=order_key, reverse=True)
+
+    def _search(self, game, depth, alpha, beta, ply):
+        # A position met again inside the search is scored by the repetition rules
+        if ply and game.is_repetition():
+            self.nodes += 1
+            self.pv[ply] = []
+            result = adjudicate(game, limit=2)
+            if result == "1-0":
+                return REPETITION_LOSS if game.current_turn == "red" else -REPETITION_LOSS
+            if result == "0-1":
+                return REPETITION_LOSS if game.current_turn == "black" else -REPETITION_LOSS
+            return 0
+
+        # Probed before the depth check so leaves get exact scores too
+        if ply and self.tablebase and self.piece_count <= self.tablebase.max_pieces:
+            probed = self.tablebase.probe(game.board, game.current_turn)
+            if probed is not None:
+                self.nodes += 1
+                self.pv[ply] = []
+                result, dtm = probed
+                # Tablebase mates are scored like mates found by the search
+                if result > 0:
+                    return MATE_SCORE - ply - dtm
+                if result < 0:
+                    return -MATE_SCORE + ply + dtm
+                return 0
+
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiescence(game, alpha, beta, ply)
+
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_limits()
+        if self.stopped:
+            return 0
+        self.pv[ply] = []
+
+        board = game.board
+        key = game.hash_key
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry:
+            tt_move, bound, tt_depth, tt_score = entry
+            if ply and tt_depth >= depth:
+                tt_score = _score_from_tt(tt_score, ply)
+                if (bound == EXACT or (bound == LOWER_BOUND and tt_score >= beta)
+                        or (bound == UPPER_BOUND and tt_score <= alpha)):
+                    return tt_score
+
+        moves = XiangqiRules.legal_moves(board, game.current_turn)
+        if not ply and self.root_moves is not None:
+            moves = [move for move in moves if move in self.root_moves]
+        if not moves:
+            # Checkmated or stalemated, both lose in Xiangqi
+            return -MATE_SCORE + ply
+        self._order_moves(board, moves, tt_move, ply)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in moves:
+            is_capture = board[move[1][0]][move[1][1]] is not None
+            self.piece_count -= is_capture
+            game.push(move)
+            if best_move is None:
+                score = -self._search(game, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Principal variation search: prove later moves are worse with a null window
+                score = -self._search(game, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self._search(game, depth - 1, -beta, -alpha, ply + 1)
+            game.pop()
+            self.piece_count += is_capture
+            if self.stopped:
+                return 0
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv[ply] = [move] + self.pv[ply + 1]
+                    if score >= beta:
+                        if not is_capture:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[pack_move(move)] += depth * depth
+                        break
+
+        if best_score >= beta:
+            bound = LOWER_BOUND
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER_BOUND
+        # A root searched over a subset of its moves says nothing about the full position
+        if ply or self.root_moves is None:
+            self.tt.store(key, best_move, bound, depth, _score_to_tt(best_score, ply))
+        return best_score
+
+    def _quiescence(self, game, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            self._check_limits()
+        if self.stopped:
+            return 0
+        self.pv[ply] = []
+
+        board = game.board
+        stand_pat = evaluate(game, alpha, beta) if self.lazy_eval else evaluate(game)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = XiangqiRules.legal_moves(board, game.current_turn, captures_only=True)
+        self._order_moves(board, captures, None, ply)
+        for move in captures:
+            game.push(move)
+            score = -self._quiescence(game, -beta, -alpha, ply + 1)
+            game.pop()
+            if self.stopped:
+                return 0
+            if score > alpha:
+                if score >= beta:
+                    return score
+                alpha = score
+        return alpha
+
+
+def format_iteration(iteration):
+    pv = " ".join(f"{start}-{end}" for start, end in iteration["pv"])
+    return (f"depth {iteration['depth']:>2}  score {iteration['score']:>6}  nodes {iteration['nodes']:>8}  "
+            f"time {iteration['time']:6.2f}s  nps {iteration['nps']:>6}  pv {pv}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the Xiangqi start position")
+    parser.add_argument("--depth", type=int, help="maximum depth")
+    parser.add_argument("--time", type=float, help="time budget in seconds")
+    parser.add_argument("--nodes", type=int, help="node budget")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB (default: 16)")
+    parser.add_argument("--lazy-eval", action="store_true", help="add mobility and king safety near the window")
+    args = parser.parse_args(argv)
+    if args.depth is None and args.time is None and args.nodes is None:
+        args.time = 5.0
+
+    engine = Engine(args.hash, args.lazy_eval)
+    result = engine.search(XiangqiGame(), depth=args.depth, time_limit=args.time, node_limit=args.nodes,
+                           info=lambda iteration: print(format_iteration(iteration)))
+    print(f"bestmove {result.best_move}  ({result.nodes} nodes, {result.nps} nps)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# Position evaluation: material and piece-square tables kept up to date by XiangqiGame.push/pop,
+# plus mobility and king-safety terms computed only when they can matter
+import argparse
+import random
+import time
+
+from xiangqi_board import BOARD_COLS, BOARD_ROWS
+from xiangqi_rules import PALACE_COLS, PALACE_ROWS, XiangqiRules, opponent
+
+# Material values in centipawns
+PIECE_VALUES = {
+    "general": 0,
+    "advisor": 200,
+    "elephant": 200,
+    "horse": 400,
+    "rook": 900,
+    "cannon": 450,
+    "soldier": 100,
+}
+CROSSED_SOLDIER_BONUS = 100
+
+# Positional bonuses for red pieces, indexed [row][col] with row 0 black's back rank; black uses
+# the same tables flipped top to bottom
+PIECE_SQUARE_BONUSES = {
+    "general": (
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, -20, -24, -20, 0, 0, 0),
+        (0, 0, 0, -8, -10, -8, 0, 0, 0),
+        (0, 0, 0, -2, 0, -2, 0, 0, 0),
+    ),
+    "advisor": (
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, -2, 0, -2, 0, 0, 0),
+        (0, 0, 0, 0, 6, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+    ),
+    "elephant": (
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, -4, 0, 0, 0, -4, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (-2, 0, 0, 0, 6, 0, 0, 0, -2),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+    ),
+    "horse": (
+        (4, 8, 16, 12, 4, 12, 16, 8, 4),
+        (4, 10, 28, 16, 8, 16, 28, 10, 4),
+        (12, 14, 16, 20, 18, 20, 16, 14, 12),
+        (8, 24, 18, 24, 20, 24, 18, 24, 8),
+        (6, 16, 14, 18, 16, 18, 14, 16, 6),
+        (4, 12, 16, 14, 12, 14, 16, 12, 4),
+        (2, 6, 8, 6, 10, 6, 8, 6, 2),
+        (4, 2, 8, 8, 4, 8, 8, 2, 4),
+        (0, 2, 4, 4, -2, 4, 4, 2, 0),
+        (0, -4, 0, 0, 0, 0, 0, -4, 0),
+    ),
+    "rook": (
+        (14, 14, 12, 18, 16, 18, 12, 14, 14),
+        (16, 20, 18, 24, 26, 24, 18, 20, 16),
+        (12, 12, 12, 18, 18, 18, 12, 12, 12),
+        (12, 18, 16, 22, 22, 22, 16, 18, 12),
+        (12, 14, 12, 18, 18, 18, 12, 14, 12),
+        (12, 16, 14, 20, 20, 20, 14, 16, 12),
+        (6, 10, 8, 14, 14, 14, 8, 10, 6),
+        (4, 8, 6, 14, 12, 14, 6, 8, 4),
+        (8, 4, 8, 16, 8, 16, 8, 4, 8),
+        (-2, 10, 6, 14, 12, 14, 6, 10, -2),
+    ),
+    "cannon": (
+        (6, 4, 0, -10, -12, -10, 0, 4, 6),
+        (2, 2, 0, -4, -14, -4, 0, 2, 2),
+        (2, 2, 0, -10, -8, -10, 0, 2, 2),
+        (0, 0, -2, 4, 10, 4, -2, 0, 0),
+        (0, 0, 0, 2, 8, 2, 0, 0, 0),
+        (-2, 0, 4, 2, 6, 2, 4, 0, -2),
+        (0, 0, 0, 2, 4, 2, 0, 0, 0),
+        (4, 0, 8, 6, 10, 6, 8, 0, 4),
+        (0, 2, 4, 6, 6, 6, 4, 2, 0),
+        (0, 0, 2, 6, 6, 6, 2, 0, 0),
+    ),
+    "soldier": (
+        (0, 3, 6, 9, 12, 9, 6, 3, 0),
+        (18, 36, 56, 80, 120, 80, 56, 36, 18),
+        (14, 26, 42, 60, 80, 60, 42, 26, 14),
+        (10, 20, 30, 34, 40, 34, 30, 20, 10),
+        (6, 12, 18, 18, 20, 18, 18, 12, 6),
+        (2, 0, 8, 0, 8, 0, 8, 0, 2),
+        (0, 0, -2, 0, 4, 0, -2, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+        (0, 0, 0, 0, 0, 0, 0, 0, 0),
+    ),
+}
+
+# Lazy terms, per move available to a horse, rook or cannon
+MOBILITY_WEIGHTS = {"horse": 4, "rook": 2, "cannon": 1}
+# Per advisor or elephant missing from the general's defence, and per attack on a palace square
+MISSING_DEFENDER_PENALTY = 20
+PALACE_ATTACK_PENALTY = 6
+# The lazy terms are clamped to this, so they are skipped when the score is further than this outside
+# the alpha-beta window
+LAZY_MARGIN = 150
+
+
+def _build_square_scores():
+    # (piece_type, color) -> score of that piece on each square (row * 9 + col), from red's point of view
+    scores = {}
+    for piece_type, bonuses in PIECE_SQUARE_BONUSES.items():
+        for color in ("red", "black"):
+            values = []
+            for row in range(BOARD_ROWS):
+                red_row = row if color == "red" else BOARD_ROWS - 1 - row
+                for col in range(BOARD_COLS):
+                    value = PIECE_VALUES[piece_type] + bonuses[red_row][col]
+                    if piece_type == "soldier" and red_row <= 4:
+                        value += CROSSED_SOLDIER_BONUS
+                    values.append(value if color == "red" else -value)
+            scores[(piece_type, color)] = tuple(values)
+    return scores
+
+
+SQUARE_SCORES = _build_square_scores()
+
+
+def score_board(board):
+    """Material and piece-square score from red's point of view, computed from scratch"""
+    score = 0
+    for row in range(BOARD_ROWS):
+        base = row * BOARD_COLS
+        for col, piece in enumerate(board[row]):
+            if piece:
+                score += SQUARE_SCORES[piece][base + col]
+    return score
+
+
+def mobility(board, color):
+    score = 0
+    for start, piece_type in XiangqiRules.pieces(board, color):
+        weight = MOBILITY_WEIGHTS.get(piece_type)
+        if weight:
+            score += weight * sum(1 for _ in XiangqiRules.generate_moves(board, piece_type, color, start))
+    return score
+
+
+def king_safety(board, color):
+    """Penalty (as a negative score) for missing defenders and enemy attacks on the palace"""
+    defenders = 0
+    for _, piece_type in XiangqiRules.pieces(board, color):
+        if piece_type in ("advisor", "elephant"):
+            defenders += 1
+    attacks = XiangqiRules.attack_map(board, opponent(color))
+    palace_attacks = sum(attacks[row][col] for row in PALACE_ROWS[color] for col in PALACE_COLS)
+    return -MISSING_DEFENDER_PENALTY * (4 - defenders) - PALACE_ATTACK_PENALTY * palace_attacks
+
+
+def lazy_terms(board, color):
+    """Mobility and king safety from color's point of view, clamped to LAZY_MARGIN"""
+    enemy = opponent(color)
+    score = mobility(board, color) - mobility(board, enemy) + king_safety(board, color) - king_safety(board, enemy)
+    return max(-LAZY_MARGIN, min(LAZY_MARGIN, score))
+
+
+def evaluate(game, alpha=None, beta=None):
+    """Score of the game's position for the side to move.
+
+    Uses the incrementally updated game.score. With an alpha-beta window, the lazy terms are
+    added when the score is close enough to the window for them to matter.
+    """
+    score = game.score if game.current_turn == "red" else -game.score
+    if alpha is None or score + LAZY_MARGIN <= alpha or score - LAZY_MARGIN >= beta:
+        return score
+    return score + lazy_terms(game.board, game.current_turn)
+
+
+def evaluate_board(board, color, full=False):
+    """From-scratch evaluation for color, with the lazy terms when full is set"""
+    score = score_board(board)
+    if color == "black":
+        score = -score
+    if full:
+        score += lazy_terms(board, color)
+    return score
+
+
+def check_consistency(games=100, plies=200, seed=0):
+    """Play random games with push and pop, checking game.score against a from-scratch score.
+
+    Returns the number of positions checked; raises AssertionError on the first mismatch.
+    """
+    from xiangqi_game import XiangqiGame
+
+    rng = random.Random(seed)
+    checked = 0
+    for _ in range(games):
+        game = XiangqiGame()
+        for _ in range(plies):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.push(rng.choice(moves))
+            # Occasionally take a move or two back to exercise pop
+            if rng.random() < 0.2:
+                for _ in range(rng.randint(1, min(2, len(game.history)))):
+                    game.pop()
+            assert game.score == score_board(game.board), f"score {game.score} != {score_board(game.board)}"
+            checked += 1
+        while game.history:
+            game.pop()
+            assert game.score == score_board(game.board)
+    return checked
+
+
+def benchmark(positions=2000, repeats=20, seed=0):
+    """Evaluations per second: incremental, from scratch, and from scratch with the lazy terms"""
+    from xiangqi_game import XiangqiGame
+
+    rng = random.Random(seed)
+    games = []
+    game = XiangqiGame()
+    while len(games) < positions:
+        moves = game.legal_moves()
+        if not moves or len(game.history) > 150:
+            game = XiangqiGame()
+            continue
+        game.push(rng.choice(moves))
+        snapshot = XiangqiGame()
+        snapshot.set_position([row[:] for row in game.board], game.current_turn)
+        games.append(snapshot)
+
+    rates = {}
+    for name, function, runs in (
+            ("incremental", lambda position: evaluate(position), repeats),
+            ("from scratch", lambda position: evaluate_board(position.board, position.current_turn), repeats),
+            ("from scratch + lazy terms",
+             lambda position: evaluate_board(position.board, position.current_turn, True), 1)):
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            for position in games:
+                function(position)
+        rates[name] = runs * len(games) / (time.perf_counter() - start_time)
+    return rates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and benchmark the incremental evaluation")
+    parser.add_argument("--games", type=int, default=100, help="random games for the consistency check")
+    parser.add_argument("--positions", type=int, default=2000, help="positions for the benchmark")
+    args = parser.parse_args(argv)
+
+    print(f"consistency: {check_consistency(args.games)} positions agree")
+    for name, rate in benchmark(args.positions).items():
+        print(f"{name:<26} {rate:>12,.0f} evaluations/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# Game model: board, turn and move history, with no GUI dependencies
+from xiangqi_board import BOARD_COLS
+from xiangqi_eval import SQUARE_SCORES, score_board
+from xiangqi_hash import ZOBRIST_BLACK_TO_MOVE, ZOBRIST_PIECES, zobrist_hash
+from xiangqi_rules import XiangqiRules
+
+
+# Xiangqi Game Class
+class XiangqiGame:
+    def __init__(self):
+        self.board = self.initialize_board()
+        self.current_turn = "red"
+        self.history = []
+        self.hash_key = self.compute_hash()
+        # Position key -> times it occurred in this game, for O(1) repetition lookups
+        self.position_counts = {self.hash_key: 1}
+        self.score = score_board(self.board)
+        self.selected_piece = None
+        self.valid_moves = []
+        self.rules = XiangqiRules()
+
+    def initialize_board(self):
+        board = [[None for _ in range(9)] for _ in range(10)]
+        # Place red pieces (bottom half)
+        board[9][0] = ("rook", "red")
+        board[9][1] = ("horse", "red")
+        board[9][2] = ("elephant", "red")
+        board[9][3] = ("advisor", "red")
+        board[9][4] = ("general", "red")
+        board[9][5] = ("advisor", "red")
+        board[9][6] = ("elephant", "red")
+        board[9][7] = ("horse", "red")
+        board[9][8] = ("rook", "red")
+        board[7][1] = ("cannon", "red")
+        board[7][7] = ("cannon", "red")
+        for col in [0, 2, 4, 6, 8]:
+            board[6][col] = ("soldier", "red")
+
+        # Place black pieces (top half)
+        board[0][0] = ("rook", "black")
+        board[0][1] = ("horse", "black")
+        board[0][2] = ("elephant", "black")
+        board[0][3] = ("advisor", "black")
+        board[0][4] = ("general", "black")
+        board[0][5] = ("advisor", "black")
+        board[0][6] = ("elephant", "black")
+        board[0][7] = ("horse", "black")
+        board[0][8] = ("rook", "black")
+        board[2][1] = ("cannon", "black")
+        board[2][7] = ("cannon", "black")
+        for col in [0, 2, 4, 6, 8]:
+            board[3][col] = ("soldier", "black")
+        return board
+
+    def set_position(self, board, current_turn):
+        """Replace the board and side to move, starting a fresh move history"""
+        self.board = board
+        self.current_turn = current_turn
+        self.history = []
+        self.hash_key = self.compute_hash()
+        self.position_counts = {self.hash_key: 1}
+        self.score = score_board(self.board)
+        self.selected_piece = None
+        self.valid_moves = []
+
+    def compute_hash(self):
+        """Hash the current board from scratch, e.g. after setting it up by hand"""
+        return zobrist_hash(self.board, self.current_turn)
+
+    def is_valid_move(self, piece_type, color, start, end):
+        return XiangqiRules.is_valid_move(self.board, piece_type, color, start, end)
+
+    def get_valid_moves(self, piece_type, color, start):
+        return XiangqiRules.get_valid_moves(self.board, piece_type, color, start)
+
+    def legal_moves(self):
+        return XiangqiRules.legal_moves(self.board, self.current_turn)
+
+    def is_in_check(self):
+        return XiangqiRules.is_in_check(self.board, self.current_turn)
+
+    def is_checkmate(self):
+        return XiangqiRules.is_checkmate(self.board, self.current_turn)
+
+    def is_stalemate(self):
+        return XiangqiRules.is_stalemate(self.board, self.current_turn)
+
+    def make_move(self, start, end):
+        self.push((start, end))
+
+    def push(self, move):
+        """Play a (start, end) move, keeping an undo record so pop() can take it back"""
+        start, end = move
+        start_row, start_col = start
+        end_row, end_col = end
+        moved = self.board[start_row][start_col]
+        captured = self.board[end_row][end_col]
+
+        # Undo record: the move, the captured piece, the turn, hash and score before the move
+        self.history.append((start, end, captured, self.current_turn, self.hash_key, self.score))
+
+        # Update the hash and score for the moved piece, any capture and the side to move
+        start_square = start_row * BOARD_COLS + start_col
+        end_square = end_row * BOARD_COLS + end_col
+        piece_keys = ZOBRIST_PIECES[moved]
+        hash_key = self.hash_key ^ piece_keys[start_square] ^ piece_keys[end_square]
+        scores = SQUARE_SCORES[moved]
+        score = self.score + scores[end_square] - scores[start_square]
+        if captured:
+            hash_key ^= ZOBRIST_PIECES[captured][end_square]
+            score -= SQUARE_SCORES[captured][end_square]
+        hash_key ^= ZOBRIST_BLACK_TO_MOVE
+        self.hash_key = hash_key
+        self.score = score
+        counts = self.position_counts
+        counts[hash_key] = counts.get(hash_key, 0) + 1
+
+        # Move the piece
+        self.board[end_row][end_col] = moved
+        self.board[start_row][start_col] = None
+
+        # Switch turns
+        self.current_turn = "black" if self.current_turn == "red" else "red"
+
+    def pop(self):
+        """Take back the last move and return it"""
+        start, end, captured, previous_turn, previous_hash, previous_score = self.history.pop()
+        counts = self.position_counts
+        count = counts[self.hash_key] - 1
+        if count:
+            counts[self.hash_key] = count
+        else:
+            del counts[self.hash_key]
+        self.board[start[0]][start[1]] = self.board[end[0]][end[1]]
+        self.board[end[0]][end[1]] = captured
+        self.current_turn = previous_turn
+        self.hash_key = previous_hash
+        self.score = previous_score
+        return (start, end)
+
+    def repetition_count(self):
+        """How many times the current position, side to move included, has occurred in this game"""
+        return self.position_counts[self.hash_key]
+
+    def is_repetition(self):
+        """Whether the current position occurred earlier in this game"""
+        return self.position_counts[self.hash_key] > 1
+
+    def move_history(self):
+        return [record[:2] for record in self.history]
+
+    def first_position(self):
+        """(board, current_turn, moves): a copy of the position before the first move, and the moves since"""
+        moves = self.move_history()
+        for _ in moves:
+            self.pop()
+        board = [list(row) for row in self.board]
+        current_turn = self.current_turn
+        for move in moves:
+            self.push(move)
+        return board, current_turn, moves
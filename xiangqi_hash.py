@@ -0,0 +1,102 @@
+# Zobrist position keys and a fixed-size transposition table
+import random
+from array import array
+
+from xiangqi_board import BOARD_COLS, BOARD_ROWS, BOARD_SQUARES, PIECE_CODES
+
+# Fixed seed so keys are identical across runs and worker processes
+_random = random.Random(0x58714B)
+
+# 64-bit key per (piece_type, color) and square, plus one for black to move
+ZOBRIST_PIECES = {piece: tuple(_random.getrandbits(64) for _ in range(BOARD_SQUARES))
+                  for piece in PIECE_CODES}
+ZOBRIST_BLACK_TO_MOVE = _random.getrandbits(64)
+
+
+def zobrist_hash(board, current_turn):
+    """Hash a board from scratch; games keep theirs up to date move by move"""
+    key = ZOBRIST_BLACK_TO_MOVE if current_turn == "black" else 0
+    for row in range(BOARD_ROWS):
+        for col in range(BOARD_COLS):
+            piece = board[row][col]
+            if piece:
+                key ^= ZOBRIST_PIECES[piece][row * BOARD_COLS + col]
+    return key
+
+
+def pack_move(move):
+    # (start, end) -> 1..8100, with 0 left for "no move"
+    (start_row, start_col), (end_row, end_col) = move
+    return (start_row * BOARD_COLS + start_col) * BOARD_SQUARES + end_row * BOARD_COLS + end_col + 1
+
+
+def unpack_move(packed):
+    if not packed:
+        return None
+    start, end = divmod(packed - 1, BOARD_SQUARES)
+    return (divmod(start, BOARD_COLS), divmod(end, BOARD_COLS))
+
+
+# Bound types stored with a score
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    # keys (8) + move (2) + score (4) + depth (1) + bound/age (1)
+    ENTRY_BYTES = 16
+
+    def __init__(self, size_mb=16):
+        # Round down to a power of two so the slot is key & mask
+        entries = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.age = 0
+
+        # Parallel preallocated arrays, one slot per entry
+        self.keys = array('Q', [0]) * self.size
+        self.moves = array('H', [0]) * self.size
+        self.scores = array('i', [0]) * self.size
+        self.depths = array('b', [0]) * self.size
+        self.flags = array('B', [0]) * self.size
+
+    def clear(self):
+        for table in (self.keys, self.moves, self.scores, self.depths, self.flags):
+            table[:] = array(table.typecode, [0]) * self.size
+        self.age = 0
+
+    def new_search(self):
+        """Start a new search generation so older entries are replaced first"""
+        self.age = (self.age + 1) & 63
+
+    def probe(self, key):
+        """Return (move, bound, depth, score) stored for a key, or None"""
+        slot = key & self.mask
+        if self.keys[slot] != key:
+            return None
+        return unpack_move(self.moves[slot]), self.flags[slot] & 3, self.depths[slot], self.scores[slot]
+
+    def store(self, key, move, bound, depth, score):
+        slot = key & self.mask
+        stored_key = self.keys[slot]
+        # Replace empty slots, the same position, entries from older searches, or shallower ones
+        if (stored_key and stored_key != key and self.flags[slot] >> 2 == self.age
+                and self.depths[slot] > depth):
+            return
+        if stored_key == key and move is None:
+            # Keep the best move we already know for this position
+            packed = self.moves[slot]
+        else:
+            packed = pack_move(move) if move else 0
+        self.keys[slot] = key
+        self.moves[slot] = packed
+        self.scores[slot] = score
+        self.depths[slot] = max(-128, min(127, depth))
+        self.flags[slot] = bound | (self.age << 2)
+
+    def hashfull(self):
+        """Permille of the first thousand slots used in the current search"""
+        sample = min(1000, self.size)
+        used = sum(1 for slot in range(sample) if self.keys[slot] and self.flags[slot] >> 2 == self.age)
+        return used * 1000 // sample
@@ -0,0 +1,329 @@
+# Opt-in instrumentation of the rules and game hot paths
+#
+# Instrumentation.enable() swaps timing wrappers in for XiangqiRules and XiangqiGame functions and
+# disable() puts the originals back, so nothing is checked or counted while it is off. It records
+# call counts, latency histograms, per-piece-type breakdowns and, for the line walkers, the squares
+# walked, and exports them as JSON or Prometheus text:
+#
+#     with Instrumentation() as instrumentation:
+#         engine.search(game, depth=4)
+#     print(instrumentation.metrics.to_prometheus())
+import argparse
+import bisect
+import json
+import sys
+import time
+
+from xiangqi_game import XiangqiGame
+from xiangqi_rules import XiangqiRules
+
+# Latency histogram bucket upper bounds in seconds; anything slower lands in +Inf
+LATENCY_BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 5e-3, 1e-2, 1e-1)
+_BUCKET_NS = tuple(int(bound * 1e9) for bound in LATENCY_BUCKETS)
+
+# XiangqiRules functions and the argument giving the piece type, if any
+RULES_FUNCTIONS = {
+    "is_valid_move": 1,
+    "get_valid_moves": 1,
+    "legal_moves": None,
+    "is_legal_move": None,
+    "is_in_check": None,
+    "has_legal_move": None,
+    "is_square_attacked": None,
+}
+# XiangqiRules line walkers, which also count the squares they look at
+PATH_FUNCTIONS = ("_is_path_clear", "_count_pieces_in_path")
+# XiangqiGame methods and the argument (after self) giving the piece type, if any
+GAME_METHODS = {
+    "get_valid_moves": 0,
+    "is_valid_move": 0,
+    "make_move": None,
+    "push": None,
+    "pop": None,
+    "legal_moves": None,
+}
+
+
+class FunctionStats:
+    __slots__ = ("calls", "total_ns", "buckets", "by_piece", "squares")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.buckets = [0] * (len(_BUCKET_NS) + 1)
+        self.by_piece = {}
+        self.squares = 0
+
+    def record(self, elapsed_ns, piece_type=None, squares=0):
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        self.buckets[bisect.bisect_left(_BUCKET_NS, elapsed_ns)] += 1
+        if piece_type is not None:
+            self.by_piece[piece_type] = self.by_piece.get(piece_type, 0) + 1
+        self.squares += squares
+
+    def percentile(self, fraction):
+        """Upper bound in seconds of the bucket holding the given fraction of calls"""
+        target = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else float("inf")
+        return 0.0
+
+
+class Metrics:
+    def __init__(self):
+        # "XiangqiRules.is_valid_move" -> FunctionStats
+        self.functions = {}
+
+    def stats(self, name):
+        stats = self.functions.get(name)
+        if stats is None:
+            stats = self.functions[name] = FunctionStats()
+        return stats
+
+    def reset(self):
+        for stats in self.functions.values():
+            stats.__init__()
+
+    def top(self, count=10):
+        """The count functions with the most total time, as (name, FunctionStats)"""
+        ranked = sorted(self.functions.items(), key=lambda item: item[1].total_ns, reverse=True)
+        return [(name, stats) for name, stats in ranked if stats.calls][:count]
+
+    def to_dict(self):
+        functions = {}
+        for name, stats in sorted(self.functions.items()):
+            if not stats.calls:
+                continue
+            entry = {
+                "calls": stats.calls,
+                "total_seconds": stats.total_ns / 1e9,
+                "mean_us": stats.total_ns / stats.calls / 1e3,
+                "p50_us": stats.percentile(0.5) * 1e6,
+                "p99_us": stats.percentile(0.99) * 1e6,
+                "histogram": {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets)},
+            }
+            if stats.by_piece:
+                entry["by_piece"] = dict(sorted(stats.by_piece.items()))
+            if stats.squares:
+                entry["squares_walked"] = stats.squares
+            functions[name] = entry
+        return {"functions": functions}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = ["# HELP xiangqi_calls_total Calls of instrumented functions.",
+                 "# TYPE xiangqi_calls_total counter"]
+        for name, stats in sorted(self.functions.items()):
+            if stats.by_piece:
+                for piece_type, count in sorted(stats.by_piece.items()):
+                    lines.append(f'xiangqi_calls_total{{function="{name}",piece="{piece_type}"}} {count}')
+            elif stats.calls:
+                lines.append(f'xiangqi_calls_total{{function="{name}"}} {stats.calls}')
+
+        lines += ["# HELP xiangqi_latency_seconds Latency of instrumented functions.",
+                  "# TYPE xiangqi_latency_seconds histogram"]
+        for name, stats in sorted(self.functions.items()):
+            if not stats.calls:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                cumulative += count
+                lines.append(f'xiangqi_latency_seconds_bucket{{function="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'xiangqi_latency_seconds_sum{{function="{name}"}} {stats.total_ns / 1e9:.9f}')
+            lines.append(f'xiangqi_latency_seconds_count{{function="{name}"}} {stats.calls}')
+
+        lines += ["# HELP xiangqi_path_squares_total Squares walked by the line checks.",
+                  "# TYPE xiangqi_path_squares_total counter"]
+        for name, stats in sorted(self.functions.items()):
+            if stats.squares:
+                lines.append(f'xiangqi_path_squares_total{{function="{name}"}} {stats.squares}')
+        return "\n".join(lines) + "\n"
+
+
+def _timed(function, stats, piece_argument=None):
+    clock = time.perf_counter_ns
+
+    def wrapper(*args, **kwargs):
+        start_time = clock()
+        result = function(*args, **kwargs)
+        stats.record(clock() - start_time, args[piece_argument] if piece_argument is not None else None)
+        return result
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _squares_to_blocker(board, start, end):
+    # Squares _is_path_clear looked at before it found a piece in the way
+    (start_row, start_col), (end_row, end_col) = start, end
+    row_step = (end_row > start_row) - (end_row < start_row)
+    col_step = (end_col > start_col) - (end_col < start_col)
+    row, col = start_row + row_step, start_col + col_step
+    walked = 1
+    while not board[row][col]:
+        row += row_step
+        col += col_step
+        walked += 1
+    return walked
+
+
+def _timed_path(function, stats, stops_early):
+    clock = time.perf_counter_ns
+
+    def wrapper(board, start, end):
+        start_time = clock()
+        result = function(board, start, end)
+        elapsed = clock() - start_time
+        if stops_early and not result:
+            squares = _squares_to_blocker(board, start, end)
+        else:
+            squares = max(abs(end[0] - start[0]), abs(end[1] - start[1])) - 1
+        stats.record(elapsed, None, squares)
+        return result
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+class Instrumentation:
+    """Swaps instrumented versions of the rules and game hot paths in and out"""
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics or Metrics()
+        # (owner class, attribute name, original class attribute)
+        self.originals = []
+
+    @property
+    def enabled(self):
+        return bool(self.originals)
+
+    def enable(self):
+        if self.originals:
+            return self
+        metrics = self.metrics
+        for name, piece_argument in RULES_FUNCTIONS.items():
+            function = XiangqiRules.__dict__[name].__func__
+            self._swap(XiangqiRules, name, staticmethod(
+                _timed(function, metrics.stats(f"XiangqiRules.{name}"), piece_argument)))
+        for name in PATH_FUNCTIONS:
+            function = XiangqiRules.__dict__[name].__func__
+            self._swap(XiangqiRules, name, staticmethod(
+                _timed_path(function, metrics.stats(f"XiangqiRules.{name}"), name == "_is_path_clear")))
+        for name, piece_argument in GAME_METHODS.items():
+            function = XiangqiGame.__dict__[name]
+            # Methods see self as the first argument
+            self._swap(XiangqiGame, name, _timed(function, metrics.stats(f"XiangqiGame.{name}"),
+                                                 None if piece_argument is None else piece_argument + 1))
+        return self
+
+    def _swap(self, owner, name, replacement):
+        self.originals.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, replacement)
+
+    def disable(self):
+        """Put the original functions back"""
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+
+def _replay(paths, limit=None):
+    # Replay game records the way the GUI plays them: select, list the moves, validate, move.
+    # Records are read unvalidated so reading them doesn't show up in the counts.
+    from xiangqi_notation import game_from_fen, read_records, to_iccs
+
+    games = moves = 0
+    for path in paths:
+        for record in read_records(path, validate=False):
+            game = game_from_fen(record.fen)
+            for start, end in record.moves:
+                piece = game.board[start[0]][start[1]]
+                if not piece or not game.is_valid_move(piece[0], piece[1], start, end):
+                    raise ValueError(f"Illegal move {to_iccs((start, end))} in game {games + 1} of {path}")
+                game.get_valid_moves(piece[0], piece[1], start)
+                game.make_move(start, end)
+                game.legal_moves()
+                moves += 1
+            games += 1
+            if limit and games >= limit:
+                return games, moves
+    return games, moves
+
+
+def print_report(metrics, count=15, out=None):
+    out = out or sys.stdout
+    print(f"{'function':<36} {'calls':>10} {'total ms':>10} {'mean us':>9} {'p99 us':>9}  detail", file=out)
+    for name, stats in metrics.top(count):
+        detail = []
+        if stats.by_piece:
+            detail.append(" ".join(f"{piece}={calls}" for piece, calls in
+                                   sorted(stats.by_piece.items(), key=lambda item: -item[1])))
+        if stats.squares:
+            detail.append(f"{stats.squares / stats.calls:.1f} squares/call")
+        print(f"{name:<36} {stats.calls:>10,} {stats.total_ns / 1e6:>10.1f} {stats.total_ns / stats.calls / 1e3:>9.2f} "
+              f"{stats.percentile(0.99) * 1e6:>9.1f}  {'; '.join(detail)}", file=out)
+    print("Times are inclusive: a function's total includes the instrumented functions it calls.", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the rules and game hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="replay game-record or PGN files")
+    replay.add_argument("games", nargs="+")
+    replay.add_argument("--limit", type=int, help="stop after this many games")
+    search = commands.add_parser("search", help="run an engine search from a position")
+    search.add_argument("--depth", type=int, default=3)
+    search.add_argument("--fen", help="position to search (default: the start position)")
+    perft = commands.add_parser("perft", help="count moves to a depth from a position")
+    perft.add_argument("--depth", type=int, default=3)
+    perft.add_argument("--fen", help="position to count from (default: the start position)")
+    for command in (replay, search, perft):
+        command.add_argument("--top", type=int, default=15, help="functions to list (default: 15)")
+        command.add_argument("--json", metavar="FILE", help="write the metrics as JSON")
+        command.add_argument("--prometheus", metavar="FILE", help="write the metrics in Prometheus text format")
+    args = parser.parse_args(argv)
+
+    from xiangqi_notation import game_from_fen
+
+    instrumentation = Instrumentation()
+    start_time = time.perf_counter()
+    with instrumentation:
+        if args.command == "replay":
+            games, moves = _replay(args.games, args.limit)
+            summary = f"replayed {games} games, {moves} moves"
+        elif args.command == "search":
+            from xiangqi_engine import Engine
+
+            result = Engine().search(game_from_fen(args.fen), depth=args.depth)
+            summary = f"searched depth {result.depth}, {result.nodes} nodes"
+        else:
+            from xiangqi_perft import perft as count_moves
+
+            summary = f"perft {args.depth}: {count_moves(game_from_fen(args.fen), args.depth)} positions"
+    print(f"{summary} in {time.perf_counter() - start_time:.2f}s (instrumented)")
+    print_report(instrumentation.metrics, args.top)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(instrumentation.metrics.to_json())
+    if args.prometheus:
+        with open(args.prometheus, "w") as f:
+            f.write(instrumentation.metrics.to_prometheus())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
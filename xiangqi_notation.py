@@ -0,0 +1,433 @@
+# Xiangqi FEN, ICCS/WXF move notation and streaming game-record I/O
+#
+# Game records are stored one game per line, so archives can be read, split and
+# written as streams:
+#
+#     <fen or empty for the start position> TAB <result> TAB <moves separated by spaces>
+#
+# Results are "1-0" (red wins), "0-1" (black wins), "1/2-1/2" or "*". Moves are
+# ICCS coordinates ("h2e2") or WXF notation ("C2.5"). Blank lines and lines
+# starting with "#" are skipped. Standard PGN files can be read with read_pgn_games.
+import gzip
+import os
+import re
+
+from xiangqi_game import XiangqiGame
+from xiangqi_rules import XiangqiRules, opponent
+
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR w - - 0 1"
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+FEN_PIECES = {
+    "k": "general", "a": "advisor", "b": "elephant", "e": "elephant",
+    "n": "horse", "h": "horse", "r": "rook", "c": "cannon", "p": "soldier",
+}
+PIECE_FEN = {"general": "k", "advisor": "a", "elephant": "b", "horse": "n", "rook": "r", "cannon": "c",
+             "soldier": "p"}
+PIECE_WXF = {"general": "K", "advisor": "A", "elephant": "E", "horse": "H", "rook": "R", "cannon": "C",
+             "soldier": "P"}
+
+# Pieces that move along lines, for which WXF gives a step count rather than a file
+STRAIGHT_PIECES = ("general", "rook", "cannon", "soldier")
+
+ICCS_MOVE = re.compile(r"^([a-i])([0-9])-?([a-i])([0-9])$")
+WXF_MOVE = re.compile(r"^(?:([+-])([KABEHNRCP])|([KABEHNRCP])([1-9+-]))([.=+-])([1-9])$")
+
+
+class IllegalMoveError(ValueError):
+    def __init__(self, message, ply=None, move=None):
+        super().__init__(message)
+        self.ply = ply
+        self.move = move
+
+
+def parse_fen(fen):
+    """Return (board, current_turn) for a FEN string"""
+    fields = fen.split()
+    if not fields:
+        raise ValueError("Empty FEN")
+    ranks = fields[0].split("/")
+    if len(ranks) != 10:
+        raise ValueError(f"FEN needs 10 ranks, got {len(ranks)}: {fen!r}")
+
+    board = []
+    for rank in ranks:
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row.extend([None] * int(char))
+            elif char.lower() in FEN_PIECES:
+                row.append((FEN_PIECES[char.lower()], "red" if char.isupper() else "black"))
+            else:
+                raise ValueError(f"Unknown FEN piece {char!r}: {fen!r}")
+        if len(row) != 9:
+            raise ValueError(f"FEN rank {rank!r} doesn't have 9 files: {fen!r}")
+        board.append(row)
+
+    side = fields[1].lower() if len(fields) > 1 else "w"
+    if side not in ("w", "r", "b"):
+        raise ValueError(f"Unknown side to move {fields[1]!r}: {fen!r}")
+    return board, "black" if side == "b" else "red"
+
+
+def to_fen(board, current_turn):
+    ranks = []
+    for row in range(10):
+        rank = ""
+        empty = 0
+        for col in range(9):
+            piece = board[row][col]
+            if piece:
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = PIECE_FEN[piece[0]]
+                rank += letter.upper() if piece[1] == "red" else letter
+            else:
+                empty += 1
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    return "/".join(ranks) + (" b" if current_turn == "black" else " w") + " - - 0 1"
+
+
+def game_from_fen(fen=None):
+    """Return a XiangqiGame set up at a FEN position (the start position if fen is empty)"""
+    game = XiangqiGame()
+    if fen and fen != START_FEN:
+        game.set_position(*parse_fen(fen))
+    return game
+
+
+def parse_iccs(text):
+    """'h2e2' -> ((7, 7), (7, 4)); files a-i from red's left, ranks 0-9 from red's side"""
+    match = ICCS_MOVE.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"Not an ICCS move: {text!r}")
+    start_file, start_rank, end_file, end_rank = match.groups()
+    return ((9 - int(start_rank), ord(start_file) - 97), (9 - int(end_rank), ord(end_file) - 97))
+
+
+def to_iccs(move):
+    (start_row, start_col), (end_row, end_col) = move
+    return f"{chr(97 + start_col)}{9 - start_row}{chr(97 + end_col)}{9 - end_row}"
+
+
+def _wxf_file(color, col):
+    # Each side numbers the files 1-9 from its own right
+    return 9 - col if color == "red" else col + 1
+
+
+def _wxf_col(color, file_number):
+    return 9 - file_number if color == "red" else file_number - 1
+
+
+def _forward(color):
+    return -1 if color == "red" else 1
+
+
+def parse_wxf(board, color, text):
+    """Resolve a WXF move such as 'C2.5', 'H8+7' or 'C+.5' on a board"""
+    match = WXF_MOVE.match(text.strip().upper())
+    if not match:
+        raise ValueError(f"Not a WXF move: {text!r}")
+    front_rear, letter, letter_after, file_or_position, operator, number = match.groups()
+    if letter_after:
+        letter = letter_after
+        if file_or_position in "+-":
+            front_rear = file_or_position
+    piece_type = FEN_PIECES[letter.lower()]
+    number = int(number)
+    forward = _forward(color)
+
+    # Find the moving piece: by file, or front/rear of two pieces sharing a file
+    squares = [(row, col) for row in range(10) for col in range(9) if board[row][col] == (piece_type, color)]
+    if front_rear:
+        by_file = {}
+        for square in squares:
+            by_file.setdefault(square[1], []).append(square)
+        candidates = []
+        for file_squares in by_file.values():
+            if len(file_squares) >= 2:
+                tandem = sorted(file_squares, key=lambda square: square[0] * forward)
+                candidates.append(tandem[-1] if front_rear == "+" else tandem[0])
+    else:
+        col = _wxf_col(color, int(file_or_position))
+        candidates = [square for square in squares if square[1] == col]
+
+    moves = []
+    for start_row, start_col in candidates:
+        if operator in ".=":
+            if piece_type not in STRAIGHT_PIECES:
+                continue
+            end = (start_row, _wxf_col(color, number))
+        elif piece_type in STRAIGHT_PIECES:
+            steps = number if operator == "+" else -number
+            end = (start_row + steps * forward, start_col)
+        else:
+            end_col = _wxf_col(color, number)
+            col_diff = abs(end_col - start_col)
+            if piece_type == "horse":
+                row_steps = {1: 2, 2: 1}.get(col_diff)
+            elif piece_type == "elephant":
+                row_steps = 2 if col_diff == 2 else None
+            else:
+                row_steps = 1 if col_diff == 1 else None
+            if row_steps is None:
+                continue
+            end = (start_row + (row_steps if operator == "+" else -row_steps) * forward, end_col)
+        if 0 <= end[0] < 10 and 0 <= end[1] < 9 and \
+                XiangqiRules.is_valid_move(board, piece_type, color, (start_row, start_col), end):
+            moves.append(((start_row, start_col), end))
+
+    if len(moves) != 1:
+        raise ValueError(f"WXF move {text!r} matches {len(moves)} moves")
+    return moves[0]
+
+
+def to_wxf(board, move):
+    (start_row, start_col), (end_row, end_col) = move
+    piece_type, color = board[start_row][start_col]
+    forward = _forward(color)
+
+    # Two of the same piece on a file are told apart as front (+) and rear (-). With more
+    # than two, or tandems on several files, the file number is kept and the move itself
+    # has to tell the pieces apart.
+    files = {}
+    for row in range(10):
+        for col in range(9):
+            if board[row][col] == (piece_type, color):
+                files.setdefault(col, []).append(row)
+    tandems = [rows for rows in files.values() if len(rows) >= 2]
+    if len(tandems) == 1 and len(files[start_col]) == 2:
+        other_row = files[start_col][0] if files[start_col][1] == start_row else files[start_col][1]
+        position = "-" if (other_row - start_row) * forward > 0 else "+"
+    else:
+        position = str(_wxf_file(color, start_col))
+
+    if start_row == end_row:
+        text = f"{PIECE_WXF[piece_type]}{position}.{_wxf_file(color, end_col)}"
+    else:
+        operator = "+" if (end_row - start_row) * forward > 0 else "-"
+        if piece_type in STRAIGHT_PIECES:
+            number = abs(end_row - start_row)
+        else:
+            number = _wxf_file(color, end_col)
+        text = f"{PIECE_WXF[piece_type]}{position}{operator}{number}"
+
+    # Three or more soldiers on a file can make a move impossible to write unambiguously
+    try:
+        resolved = parse_wxf(board, color, text)
+    except ValueError:
+        resolved = None
+    if resolved != move:
+        raise ValueError(f"Move {to_iccs(move)} can't be written unambiguously in WXF")
+    return text
+
+
+def parse_move(board, color, text):
+    """Parse an ICCS or WXF move"""
+    if ICCS_MOVE.match(text.strip().lower()):
+        return parse_iccs(text)
+    return parse_wxf(board, color, text)
+
+
+def _open_text(source, mode="r"):
+    # Paths (optionally gzip-compressed) are opened here, file objects are used as given
+    if isinstance(source, (str, os.PathLike)):
+        if os.fspath(source).endswith(".gz"):
+            return gzip.open(source, mode + "t", encoding="utf-8")
+        return open(source, mode, encoding="utf-8")
+    return None
+
+
+class GameRecord:
+    __slots__ = ("fen", "result", "moves", "tags", "line_number")
+
+    def __init__(self, fen=None, result="*", moves=None, tags=None, line_number=None):
+        self.fen = fen or START_FEN
+        self.result = result
+        self.moves = moves if moves is not None else []
+        self.tags = tags if tags is not None else {}
+        self.line_number = line_number
+
+    def replay(self):
+        """Yield the XiangqiGame after each move, checking every move with XiangqiRules"""
+        game = game_from_fen(self.fen)
+        for ply, move in enumerate(self.moves, 1):
+            start, end = move
+            if not XiangqiRules.is_legal_move(game.board, game.current_turn, start, end):
+                raise IllegalMoveError(f"Illegal move {to_iccs(move)} at ply {ply}", ply=ply, move=move)
+            game.push(move)
+            yield game
+
+
+def _validated_moves(fen, tokens):
+    # Resolve notation on the position it is played from, rejecting illegal moves
+    board, color = parse_fen(fen) if fen else parse_fen(START_FEN)
+    moves = []
+    for ply, token in enumerate(tokens, 1):
+        try:
+            start, end = parse_move(board, color, token)
+        except ValueError as error:
+            raise IllegalMoveError(f"Bad move {token!r} at ply {ply}: {error}", ply=ply) from None
+        if not XiangqiRules.is_legal_move(board, color, start, end):
+            raise IllegalMoveError(f"Illegal move {token!r} at ply {ply}", ply=ply, move=(start, end))
+        board[end[0]][end[1]] = board[start[0]][start[1]]
+        board[start[0]][start[1]] = None
+        color = opponent(color)
+        moves.append((start, end))
+    return moves
+
+
+def _plain_moves(tokens):
+    return [parse_iccs(token) for token in tokens]
+
+
+def parse_game_line(line, validate=True, line_number=None):
+    """Parse one game-record line into a GameRecord"""
+    fields = line.rstrip("\r\n").split("\t")
+    if len(fields) != 3:
+        raise ValueError(f"Game record needs 3 tab-separated fields, got {len(fields)}")
+    fen, result, movetext = fields
+    if result not in RESULTS:
+        raise ValueError(f"Unknown result {result!r}")
+    tokens = movetext.split()
+    if validate:
+        moves = _validated_moves(fen, tokens)
+    else:
+        # Without validation only ICCS can be resolved, WXF needs the position
+        moves = _plain_moves(tokens)
+    return GameRecord(fen or None, result, moves, line_number=line_number)
+
+
+def format_game_line(record, notation="iccs"):
+    if notation == "wxf":
+        game = game_from_fen(record.fen)
+        tokens = []
+        for move in record.moves:
+            tokens.append(to_wxf(game.board, move))
+            game.push(move)
+    else:
+        tokens = [to_iccs(move) for move in record.moves]
+    fen = "" if record.fen == START_FEN else record.fen
+    return f"{fen}\t{record.result}\t{' '.join(tokens)}\n"
+
+
+def _lines(source):
+    handle = _open_text(source)
+    if handle is None:
+        yield from source
+        return
+    with handle:
+        yield from handle
+
+
+def read_fens(source):
+    """Stream (board, current_turn) positions from a file or iterable with one FEN per line"""
+    for line in _lines(source):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield parse_fen(line)
+
+
+def write_fens(destination, positions):
+    """Write (board, current_turn) positions one FEN per line; returns the number written"""
+    handle = _open_text(destination, "w")
+    out = handle or destination
+    count = 0
+    try:
+        for board, current_turn in positions:
+            out.write(to_fen(board, current_turn) + "\n")
+            count += 1
+    finally:
+        if handle:
+            handle.close()
+    return count
+
+
+def read_games(source, validate=True):
+    """Stream GameRecords from a game-record file, file object or iterable of lines.
+
+    With validate=True every move is checked with XiangqiRules and an IllegalMoveError
+    (a ValueError) is raised for the first bad one; its line_number attribute is set.
+    """
+    for line_number, line in enumerate(_lines(source), 1):
+        if not line.strip() or line.startswith("#"):
+            continue
+        try:
+            yield parse_game_line(line, validate, line_number)
+        except ValueError as error:
+            error.line_number = line_number
+            raise
+
+
+def write_games(destination, records, notation="iccs"):
+    """Write GameRecords one per line; returns the number written"""
+    handle = _open_text(destination, "w")
+    out = handle or destination
+    count = 0
+    try:
+        for record in records:
+            out.write(format_game_line(record, notation))
+            count += 1
+    finally:
+        if handle:
+            handle.close()
+    return count
+
+
+PGN_TAG = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+PGN_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+PGN_MOVE_NUMBER = re.compile(r"^\d+\.+$")
+
+
+def read_pgn_tokens(source):
+    """Stream (tags, move tokens, result) from a Xiangqi PGN file without resolving the moves"""
+    tags = {}
+    movetext = []
+
+    def finish():
+        text = PGN_COMMENT.sub(" ", " ".join(movetext))
+        tokens = []
+        result = tags.get("Result", "*")
+        for token in text.split():
+            token = re.sub(r"^\d+\.+", "", token)
+            if not token or PGN_MOVE_NUMBER.match(token):
+                continue
+            if token in RESULTS:
+                result = token
+                continue
+            tokens.append(token)
+        if result not in RESULTS:
+            result = "*"
+        return dict(tags), tokens, result
+
+    for line in _lines(source):
+        line = line.strip()
+        tag = PGN_TAG.match(line)
+        if tag:
+            if movetext:
+                yield finish()
+                tags = {}
+                movetext = []
+            tags[tag.group(1)] = tag.group(2)
+        elif line:
+            movetext.append(line)
+    if movetext or tags:
+        yield finish()
+
+
+def read_pgn_games(source, validate=True):
+    """Stream GameRecords from a Xiangqi PGN file with ICCS or WXF movetext"""
+    for tags, tokens, result in read_pgn_tokens(source):
+        fen = tags.get("FEN")
+        moves = _validated_moves(fen, tokens) if validate else _plain_moves(tokens)
+        yield GameRecord(fen, result, moves, tags)
+
+
+def read_records(path, validate=True):
+    """Stream GameRecords from a PGN file (by its .pgn suffix) or a game-record file"""
+    if path.endswith(".pgn"):
+        return read_pgn_games(path, validate)
+    return read_games(path, validate)
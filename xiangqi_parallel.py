@@ -0,0 +1,143 @@
+# Multi-process search by splitting the root moves across a process pool
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from xiangqi_engine import MATE_BOUND, Engine, SearchResult
+from xiangqi_game import XiangqiGame
+from xiangqi_rules import XiangqiRules
+
+# Depth searched when no depth, time or node limit is given; the workers cannot be stopped otherwise
+DEFAULT_DEPTH = 4
+
+# Engine owned by each worker process, kept between searches so its transposition table is reused
+_worker_engine = None
+
+
+def _init_worker(tt_size_mb):
+    global _worker_engine
+    _worker_engine = Engine(tt_size_mb)
+
+
+def _search_root_moves(board, current_turn, moves, root_moves, depth, time_limit, node_limit):
+    # Replayed from the game's first position so the worker sees its repetitions too
+    game = XiangqiGame()
+    game.set_position(board, current_turn)
+    for move in moves:
+        game.push(move)
+    result = _worker_engine.search(game, depth=depth, time_limit=time_limit, node_limit=node_limit,
+                                   root_moves=root_moves)
+    return result.iterations, result.nodes
+
+
+def _iteration_at(iterations, depth):
+    # A worker stops deepening once it finds a mate, which then holds at every deeper depth
+    if len(iterations) >= depth:
+        return iterations[depth - 1]
+    if iterations and abs(iterations[-1]["score"]) >= MATE_BOUND:
+        return iterations[-1]
+    return None
+
+
+class ParallelSearch:
+    """Root splitting: each worker runs its own iterative deepening search over a share of the root
+    moves, and the best move is taken from the deepest iteration every worker completed.
+    """
+
+    def __init__(self, workers=None, tt_size_mb=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(tt_size_mb,))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, game, depth=None, time_limit=None, node_limit=None):
+        """Search to depth, time_limit or node_limit, whichever comes first, or DEFAULT_DEPTH without a limit"""
+        if depth is None and time_limit is None and node_limit is None:
+            depth = DEFAULT_DEPTH
+        start_time = time.perf_counter()
+        moves = XiangqiRules.legal_moves(game.board, game.current_turn)
+        if not moves:
+            return SearchResult(None, 0, 0, [], 0, 0.0, [])
+
+        # Captures first, then deal the moves out in turn so every worker gets a similar mix
+        moves.sort(key=lambda move: game.board[move[1][0]][move[1][1]] is None)
+        shares = [moves[index::self.workers] for index in range(self.workers)]
+        shares = [share for share in shares if share]
+        worker_node_limit = node_limit // len(shares) if node_limit else None
+
+        board, current_turn, played = game.first_position()
+        futures = [self.executor.submit(_search_root_moves, board, current_turn, played, share, depth, time_limit,
+                                        worker_node_limit)
+                   for share in shares]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start_time
+        nodes = sum(worker_nodes for _, worker_nodes in results)
+
+        # Combine the workers' iterations depth by depth
+        iterations = []
+        current_depth = 1
+        while True:
+            found = [_iteration_at(worker_iterations, current_depth) for worker_iterations, _ in results]
+            if None in found:
+                break
+            best = max(found, key=lambda iteration: iteration["score"])
+            iterations.append(dict(best, depth=current_depth,
+                                   nodes=sum(iteration["nodes"] for iteration in found)))
+            if all(len(worker_iterations) < current_depth for worker_iterations, _ in results):
+                break
+            current_depth += 1
+
+        if not iterations:
+            return SearchResult(moves[0], 0, 0, [moves[0]], nodes, elapsed, [])
+        best = iterations[-1]
+        return SearchResult(best["pv"][0], best["score"], len(iterations), best["pv"], nodes, elapsed,
+                            iterations)
+
+
+def speedup_curve(game, depth, worker_counts, tt_size_mb=16):
+    """Time a fixed-depth search for each worker count; returns a list of result records"""
+    records = []
+    baseline = None
+    for workers in worker_counts:
+        with ParallelSearch(workers, tt_size_mb) as search:
+            # Warm up the pool so process start-up isn't counted
+            search.search(game, depth=1)
+            result = search.search(game, depth=depth)
+        if baseline is None:
+            baseline = result.seconds
+        records.append({
+            "workers": workers,
+            "seconds": result.seconds,
+            "speedup": baseline / result.seconds if result.seconds else 0.0,
+            "nodes": result.nodes,
+            "nps": result.nps,
+            "best_move": result.best_move,
+            "score": result.score,
+        })
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel root-splitting search and speedup benchmark")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (default: 4)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="worker counts to benchmark (default: 1 2 4 8)")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size per worker in MB")
+    args = parser.parse_args(argv)
+
+    print(f"{'workers':>7} {'seconds':>9} {'speedup':>8} {'nodes':>10} {'nps':>9}  best move")
+    for record in speedup_curve(XiangqiGame(), args.depth, args.workers, args.hash):
+        print(f"{record['workers']:>7} {record['seconds']:>9.2f} {record['speedup']:>8.2f} "
+              f"{record['nodes']:>10} {record['nps']:>9}  {record['best_move']} ({record['score']})")
+
+
+if __name__ == "__main__":
+    main()
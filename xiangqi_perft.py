@@ -0,0 +1,136 @@
+# Perft: count leaf nodes of the legal move tree to check and benchmark move generation
+import argparse
+import json
+import sys
+import time
+
+from xiangqi_notation import START_FEN, game_from_fen, to_iccs
+from xiangqi_rules import XiangqiRules
+
+# Test positions as FEN
+TEST_POSITIONS = {
+    "start": START_FEN,
+    "central-cannon": "rnbakabr1/9/1c4nc1/p1p1p3p/6p2/9/P1P1P1P1P/1C2C1N2/9/RNBAKABR1 w - - 0 1",
+    "cannon-pins": "3k5/3a5/4c4/n8/2Pr5/C8/4N3p/3R5/4A4/4K4 w - - 0 1",
+    "facing-generals": "5k3/2n6/1P2a4/9/5b3/3N5/9/c4R3/9/5K3 b - - 0 1",
+    "in-check": "4k4/8r/9/4c4/9/4p4/R2n5/7C1/4K4/3A2B2 w - - 0 1",
+}
+
+# Reference leaf counts per position and depth; runs are checked against these.
+# The start position counts are the published Xiangqi perft numbers.
+REFERENCE_COUNTS = {
+    "start": {1: 44, 2: 1920, 3: 79666, 4: 3290240, 5: 133312995},
+    "central-cannon": {1: 38, 2: 1477, 3: 56986, 4: 2218283},
+    "cannon-pins": {1: 31, 2: 1007, 3: 33008, 4: 1035509},
+    "facing-generals": {1: 22, 2: 540, 3: 10850, 4: 262793},
+    "in-check": {1: 2, 2: 83, 3: 2563, 4: 96259},
+}
+
+
+def load_position(name):
+    """Return a XiangqiGame set up at one of the TEST_POSITIONS, or at a FEN"""
+    return game_from_fen(TEST_POSITIONS.get(name, name))
+
+
+def perft(game, depth):
+    if depth == 0:
+        return 1
+    moves = XiangqiRules.legal_moves(game.board, game.current_turn)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.push(move)
+        nodes += perft(game, depth - 1)
+        game.pop()
+    return nodes
+
+
+def divide(game, depth):
+    """Leaf counts below each root move"""
+    counts = {}
+    for move in XiangqiRules.legal_moves(game.board, game.current_turn):
+        game.push(move)
+        counts[move] = perft(game, depth - 1)
+        game.pop()
+    return counts
+
+
+def run_perft(name, depth):
+    """Run perft on a test position and return a result record"""
+    game = load_position(name)
+    start_time = time.perf_counter()
+    nodes = perft(game, depth)
+    elapsed = time.perf_counter() - start_time
+    expected = REFERENCE_COUNTS.get(name, {}).get(depth)
+    return {
+        "position": name,
+        "depth": depth,
+        "nodes": nodes,
+        "expected": expected,
+        "seconds": round(elapsed, 4),
+        "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Xiangqi perft counts and move generation benchmark")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth (default: 3)")
+    parser.add_argument("--position", action="append", choices=sorted(TEST_POSITIONS),
+                        help="position to run, may be repeated (default: all)")
+    parser.add_argument("--fen", action="append", default=[], help="extra position to run, may be repeated")
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    parser.add_argument("--json", metavar="FILE", help="write the results to FILE for comparing commits")
+    parser.add_argument("--compare", metavar="FILE", help="compare nodes per second against a saved --json run")
+    args = parser.parse_args(argv)
+
+    positions = (args.position or ([] if args.fen else list(TEST_POSITIONS))) + args.fen
+    results = []
+    failures = 0
+    for name in positions:
+        if args.divide:
+            game = load_position(name)
+            counts = divide(game, args.depth)
+            for move, count in sorted(counts.items()):
+                print(f"{to_iccs(move)}: {count}")
+            print(f"{name}: {len(counts)} moves, {sum(counts.values())} nodes at depth {args.depth}")
+            continue
+
+        for depth in range(1, args.depth + 1):
+            result = run_perft(name, depth)
+            results.append(result)
+            if result["expected"] is None:
+                status = "no reference"
+            elif result["expected"] == result["nodes"]:
+                status = "ok"
+            else:
+                status = f"MISMATCH (expected {result['expected']})"
+                failures += 1
+            print(f"{name[:16]:16} depth {depth}: {result['nodes']:>10} nodes "
+                  f"{result['seconds']:>9.3f}s {result['nps']:>9} nps  {status}")
+
+    if results:
+        total_nodes = sum(result["nodes"] for result in results)
+        total_seconds = sum(result["seconds"] for result in results)
+        print(f"total: {total_nodes} nodes in {total_seconds:.3f}s, "
+              f"{int(total_nodes / total_seconds) if total_seconds else 0} nps")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(record["position"], record["depth"]): record for record in json.load(f)}
+        for result in results:
+            previous = baseline.get((result["position"], result["depth"]))
+            if previous and previous["nps"]:
+                change = (result["nps"] / previous["nps"] - 1) * 100
+                print(f"{result['position'][:16]:16} depth {result['depth']}: "
+                      f"{previous['nps']} -> {result['nps']} nps ({change:+.1f}%)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# Repetition rules: finding the cycle behind a repeated position and judging perpetual check and chase
+#
+# XiangqiGame counts every position of the game, so whether the current one is a repetition is a dict
+# lookup. Only then is the cycle walked: the moves since the position last occurred are taken back and
+# replayed, and each side's moves are classified with the attack information from XiangqiRules:
+#
+#     check  every move of the side in the cycle gives check
+#     chase  every move gives check or newly attacks an enemy piece it could take
+#     idle   anything else
+#
+# Following the Asian rules in simplified form, a side that perpetually checks or chases while the
+# other does not loses, checking counting as worse than chasing; otherwise the repetition is a draw.
+import argparse
+import sys
+
+from xiangqi_eval import PIECE_VALUES
+from xiangqi_notation import game_from_fen, parse_iccs
+from xiangqi_rules import XiangqiRules, opponent
+
+CHECK = "check"
+CHASE = "chase"
+IDLE = "idle"
+SEVERITY = {IDLE: 0, CHASE: 1, CHECK: 2}
+
+# Occurrences of a position, the current one included, after which a game is adjudicated
+REPETITION_LIMIT = 3
+
+
+def find_cycle(game):
+    """Ply at which the current position last occurred, or None if it has not occurred before"""
+    if not game.is_repetition():
+        return None
+    history = game.history
+    key = game.hash_key
+    # Each undo record keeps the hash before its move; positions before a capture cannot come back
+    for ply in range(len(history) - 1, -1, -1):
+        record = history[ply]
+        if record[4] == key:
+            return ply
+        if record[2] is not None:
+            return None
+    return None
+
+
+def _chaseable(piece, square):
+    # Generals cannot be chased, and neither can soldiers that have not crossed the river
+    piece_type, color = piece
+    if piece_type == "general":
+        return False
+    if piece_type == "soldier":
+        return square[0] <= 4 if color == "red" else square[0] >= 5
+    return True
+
+
+def _targets(board, piece_type, color, square):
+    """Enemy pieces the piece on square could legally take and that count as chased"""
+    enemy = opponent(color)
+    targets = set()
+    for end in XiangqiRules.generate_moves(board, piece_type, color, square):
+        target = board[end[0]][end[1]]
+        if (target and _chaseable(target, end) and XiangqiRules.is_legal_move(board, color, square, end)
+                and (PIECE_VALUES[target[0]] > PIECE_VALUES[piece_type]
+                     or not XiangqiRules.is_square_attacked(board, end, enemy))):
+            targets.add(end)
+    return targets
+
+
+def _classify_move(game, move):
+    """Play a move, returning whether it checks and whether it chases"""
+    board = game.board
+    start, end = move
+    piece_type, color = board[start[0]][start[1]]
+    # Generals and soldiers may attack freely without it counting as a chase
+    chasing = piece_type not in ("general", "soldier")
+    before = _targets(board, piece_type, color, start) if chasing else ()
+    game.push(move)
+    check = XiangqiRules.is_in_check(board, game.current_turn)
+    chase = chasing and bool(_targets(board, piece_type, color, end) - set(before))
+    return check, chase
+
+
+def classify_cycle(game):
+    """{"red": kind, "black": kind} for the moves since the current position last occurred, or None"""
+    start = find_cycle(game)
+    if start is None:
+        return None
+    moves = [record[:2] for record in game.history[start:]]
+    for _ in moves:
+        game.pop()
+
+    checks = {"red": True, "black": True}
+    forcing = {"red": True, "black": True}
+    for move in moves:
+        color = game.current_turn
+        check, chase = _classify_move(game, move)
+        checks[color] = checks[color] and check
+        forcing[color] = forcing[color] and (check or chase)
+    return {color: CHECK if checks[color] else CHASE if forcing[color] else IDLE for color in checks}
+
+
+def adjudicate(game, limit=REPETITION_LIMIT):
+    """Result of a repetition once the position has occurred limit times: "1-0", "0-1", "1/2-1/2" or None"""
+    if game.repetition_count() < limit:
+        return None
+    kinds = classify_cycle(game)
+    if kinds is None:
+        return None
+    red, black = SEVERITY[kinds["red"]], SEVERITY[kinds["black"]]
+    if red == black:
+        return "1/2-1/2"
+    return "0-1" if red > black else "1-0"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify the repetition at the end of a move sequence")
+    parser.add_argument("moves", nargs="*", help="ICCS moves, e.g. h2e2 h9g7")
+    parser.add_argument("--fen", help="starting position (default: the start position)")
+    parser.add_argument("--limit", type=int, default=REPETITION_LIMIT,
+                        help=f"occurrences before adjudicating (default: {REPETITION_LIMIT})")
+    args = parser.parse_args(argv)
+
+    game = game_from_fen(args.fen)
+    for text in args.moves:
+        move = parse_iccs(text)
+        if not XiangqiRules.is_legal_move(game.board, game.current_turn, *move):
+            parser.error(f"illegal move {text}")
+        game.push(move)
+    print(f"occurrences: {game.repetition_count()}")
+    kinds = classify_cycle(game)
+    if kinds is None:
+        print("no repetition")
+        return 0
+    print(f"cycle: {len(game.history) - find_cycle(game)} plies, red {kinds['red']}, black {kinds['black']}")
+    print(f"result: {adjudicate(game, args.limit) or 'play on'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
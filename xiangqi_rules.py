@@ -1,6 +1,177 @@
+from xiangqi_board import (ADVISOR, BLACK_FLAG, BOARD_COLS, BOARD_ROWS, CANNON, CODE_PIECES, ELEPHANT, EMPTY, GENERAL,
+                           HORSE, PIECE_CODES, ROOK, SOLDIER, TYPE_MASK, FlatBoard, color_flag)
+
+# Board geometry
+PALACE_ROWS = {"black": (0, 1, 2), "red": (7, 8, 9)}
+PALACE_COLS = (3, 4, 5)
+
+# Orthogonal directions, the first two are the vertical ones (up, down)
+ORTHOGONAL = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _on_board(row, col):
+    return 0 <= row < BOARD_ROWS and 0 <= col < BOARD_COLS
+
+
+def _in_palace(color, row, col):
+    palace_rows = PALACE_ROWS["black"] if color == "black" else PALACE_ROWS["red"]
+    return row in palace_rows and col in PALACE_COLS
+
+
+def _build_rays():
+    # For every square, the squares reached walking in each orthogonal direction
+    rays = []
+    for row in range(BOARD_ROWS):
+        for col in range(BOARD_COLS):
+            square_rays = []
+            for d_row, d_col in ORTHOGONAL:
+                ray = []
+                r, c = row + d_row, col + d_col
+                while _on_board(r, c):
+                    ray.append((r, c))
+                    r, c = r + d_row, c + d_col
+                square_rays.append(tuple(ray))
+            rays.append(tuple(square_rays))
+    return tuple(rays)
+
+
+def _build_horse_moves():
+    # (target, leg) pairs: the horse is blocked when the leg square is occupied
+    moves = []
+    for row in range(BOARD_ROWS):
+        for col in range(BOARD_COLS):
+            square_moves = []
+            for d_row, d_col in ORTHOGONAL:
+                leg = (row + d_row, col + d_col)
+                for side in (-1, 1):
+                    if d_row:
+                        end = (row + 2 * d_row, col + side)
+                    else:
+                        end = (row + side, col + 2 * d_col)
+                    if _on_board(*end):
+                        square_moves.append((end, leg))
+            moves.append(tuple(square_moves))
+    return tuple(moves)
+
+
+def _build_elephant_moves(color):
+    # (target, eye) pairs: the elephant is blocked when the eye square is occupied
+    moves = []
+    for row in range(BOARD_ROWS):
+        for col in range(BOARD_COLS):
+            square_moves = []
+            for d_row, d_col in DIAGONAL:
+                end = (row + 2 * d_row, col + 2 * d_col)
+                if not _on_board(*end):
+                    continue
+                # Elephants can't cross the river
+                if (color == "black" and end[0] > 4) or (color == "red" and end[0] < 5):
+                    continue
+                square_moves.append((end, (row + d_row, col + d_col)))
+            moves.append(tuple(square_moves))
+    return tuple(moves)
+
+
+def _build_palace_moves(color, directions):
+    # One step in the given directions, landing inside the palace
+    moves = []
+    for row in range(BOARD_ROWS):
+        for col in range(BOARD_COLS):
+            moves.append(tuple((row + d_row, col + d_col) for d_row, d_col in directions
+                               if _in_palace(color, row + d_row, col + d_col)))
+    return tuple(moves)
+
+
+def _build_soldier_moves(color):
+    # Forward only before the river, forward and sideways after crossing it
+    forward = 1 if color == "black" else -1
+    moves = []
+    for row in range(BOARD_ROWS):
+        for col in range(BOARD_COLS):
+            crossed_river = (color == "black" and row >= 5) or (color == "red" and row <= 4)
+            steps = [(forward, 0)]
+            if crossed_river:
+                steps += [(0, -1), (0, 1)]
+            moves.append(tuple((row + d_row, col + d_col) for d_row, d_col in steps
+                               if _on_board(row + d_row, col + d_col)))
+    return tuple(moves)
+
+
+# Precomputed move tables, indexed by square (row * 9 + col)
+RAYS = _build_rays()
+HORSE_MOVES = _build_horse_moves()
+ELEPHANT_MOVES = {color: _build_elephant_moves(color) for color in ("red", "black")}
+ADVISOR_MOVES = {color: _build_palace_moves(color, DIAGONAL) for color in ("red", "black")}
+GENERAL_MOVES = {color: _build_palace_moves(color, ORTHOGONAL) for color in ("red", "black")}
+SOLDIER_MOVES = {color: _build_soldier_moves(color) for color in ("red", "black")}
+
+
+def _square(coord):
+    return coord[0] * BOARD_COLS + coord[1]
+
+
+def _to_squares(table):
+    # Same table with (row, col) coordinates replaced by flat square indices
+    if isinstance(table, tuple):
+        if len(table) == 2 and isinstance(table[0], int):
+            return _square(table)
+        return tuple(_to_squares(entry) for entry in table)
+    return {key: _to_squares(value) for key, value in table.items()}
+
+
+# Flat square -> (row, col), and the move tables in flat square form for FlatBoard
+SQUARE_COORDS = tuple((row, col) for row in range(BOARD_ROWS) for col in range(BOARD_COLS))
+FLAT_RAYS = _to_squares(RAYS)
+FLAT_HORSE_MOVES = _to_squares(HORSE_MOVES)
+FLAT_ELEPHANT_MOVES = _to_squares(ELEPHANT_MOVES)
+FLAT_ADVISOR_MOVES = _to_squares(ADVISOR_MOVES)
+FLAT_GENERAL_MOVES = _to_squares(GENERAL_MOVES)
+FLAT_SOLDIER_MOVES = _to_squares(SOLDIER_MOVES)
+
+
+def _invert(table):
+    # For every square, the origins whose moves in table reach it (with any leg/eye square)
+    inverted = [[] for _ in range(BOARD_ROWS * BOARD_COLS)]
+    for square, moves in enumerate(table):
+        origin = SQUARE_COORDS[square]
+        for move in moves:
+            if isinstance(move[0], tuple):
+                end, blocker = move
+                inverted[_square(end)].append((origin, blocker))
+            else:
+                inverted[_square(move)].append(origin)
+    return tuple(tuple(origins) for origins in inverted)
+
+
+# Reverse tables: which squares a stepping piece must stand on to attack a square
+HORSE_ATTACKS = _invert(HORSE_MOVES)
+ELEPHANT_ATTACKS = {color: _invert(ELEPHANT_MOVES[color]) for color in ("red", "black")}
+ADVISOR_ATTACKS = {color: _invert(ADVISOR_MOVES[color]) for color in ("red", "black")}
+GENERAL_ATTACKS = {color: _invert(GENERAL_MOVES[color]) for color in ("red", "black")}
+SOLDIER_ATTACKS = {color: _invert(SOLDIER_MOVES[color]) for color in ("red", "black")}
+FLAT_HORSE_ATTACKS = _to_squares(HORSE_ATTACKS)
+FLAT_ELEPHANT_ATTACKS = _to_squares(ELEPHANT_ATTACKS)
+FLAT_ADVISOR_ATTACKS = _to_squares(ADVISOR_ATTACKS)
+FLAT_GENERAL_ATTACKS = _to_squares(GENERAL_ATTACKS)
+FLAT_SOLDIER_ATTACKS = _to_squares(SOLDIER_ATTACKS)
+
+# Horse leg squares that can block an attack on a square: its four diagonal neighbours
+CHECK_LEGS = tuple(frozenset((row + d_row, col + d_col) for d_row, d_col in DIAGONAL
+                             if _on_board(row + d_row, col + d_col))
+                   for row, col in SQUARE_COORDS)
+
+
+def opponent(color):
+    return "black" if color == "red" else "red"
+
+
 class XiangqiRules:
     @staticmethod
     def is_valid_move(board, piece_type, color, start, end):
+        if isinstance(board, FlatBoard):
+            return XiangqiRules._is_valid_flat_move(board.cells, piece_type, color, start[0] * BOARD_COLS + start[1],
+                                                    end[0] * BOARD_COLS + end[1])
         start_row, start_col = start
         end_row, end_col = end
         row_diff = end_row - start_row
@@ -218,11 +389,438 @@ class XiangqiRules:
 
         return False
 
+    @staticmethod
+    def generate_moves(board, piece_type, color, start):
+        """Yield the target squares of a piece straight from the move tables"""
+        if isinstance(board, FlatBoard):
+            yield from XiangqiRules._generate_flat_moves(board.cells, piece_type, color, start)
+            return
+
+        start_row, start_col = start
+        square = start_row * BOARD_COLS + start_col
+
+        if piece_type == "rook":
+            for ray in RAYS[square]:
+                for end in ray:
+                    target = board[end[0]][end[1]]
+                    if target:
+                        if target[1] != color:
+                            yield end
+                        break
+                    yield end
+        elif piece_type == "cannon":
+            for ray in RAYS[square]:
+                screen_found = False
+                for end in ray:
+                    target = board[end[0]][end[1]]
+                    if not screen_found:
+                        if target:
+                            screen_found = True
+                        else:
+                            yield end
+                    elif target:
+                        # First piece behind the screen can be captured
+                        if target[1] != color:
+                            yield end
+                        break
+        elif piece_type == "horse":
+            for end, leg in HORSE_MOVES[square]:
+                if board[leg[0]][leg[1]] is None:
+                    target = board[end[0]][end[1]]
+                    if not target or target[1] != color:
+                        yield end
+        elif piece_type == "elephant":
+            for end, eye in ELEPHANT_MOVES[color][square]:
+                if board[eye[0]][eye[1]] is None:
+                    target = board[end[0]][end[1]]
+                    if not target or target[1] != color:
+                        yield end
+        elif piece_type in ("advisor", "general", "soldier"):
+            if piece_type == "advisor":
+                steps = ADVISOR_MOVES[color][square]
+            elif piece_type == "general":
+                steps = GENERAL_MOVES[color][square]
+            else:
+                steps = SOLDIER_MOVES[color][square]
+            for end in steps:
+                target = board[end[0]][end[1]]
+                if not target or target[1] != color:
+                    yield end
+
+            if piece_type == "general":
+                # Flying general: first piece up or down the file is the enemy general
+                for ray in RAYS[square][:2]:
+                    for end in ray:
+                        target = board[end[0]][end[1]]
+                        if target:
+                            if target[0] == "general" and target[1] != color and end not in steps:
+                                yield end
+                            break
+
+    @staticmethod
+    def pieces(board, color):
+        """Return (square, piece_type) for every piece of a colour"""
+        if isinstance(board, FlatBoard):
+            cells = board.cells
+            return [(SQUARE_COORDS[square], CODE_PIECES[cells[square]][0])
+                    for square in board.pieces[color]]
+        return [((row, col), piece[0]) for row in range(BOARD_ROWS) for col, piece in enumerate(board[row])
+                if piece and piece[1] == color]
+
+    @staticmethod
+    def find_general(board, color):
+        if isinstance(board, FlatBoard):
+            code = PIECE_CODES[("general", color)]
+            for square in board.pieces[color]:
+                if board.cells[square] == code:
+                    return SQUARE_COORDS[square]
+            return None
+
+        # The general never leaves its palace, so look there before scanning the board
+        for row in PALACE_ROWS[color]:
+            for col in PALACE_COLS:
+                piece = board[row][col]
+                if piece and piece[0] == "general" and piece[1] == color:
+                    return (row, col)
+        for square, piece_type in XiangqiRules.pieces(board, color):
+            if piece_type == "general":
+                return square
+        return None
+
+    @staticmethod
+    def iter_attackers(board, square, by_color):
+        """Yield the squares of by_color pieces attacking a square, looking outward from it"""
+        if isinstance(board, FlatBoard):
+            yield from XiangqiRules._iter_flat_attackers(board.cells, square[0] * BOARD_COLS + square[1], by_color)
+            return
+        row, col = square
+        index = row * BOARD_COLS + col
+        target = board[row][col]
+        target_is_general = bool(target) and target[0] == "general"
+
+        # Rooks and cannons along the lines, and the flying general along the file
+        for direction, ray in enumerate(RAYS[index]):
+            screen_found = False
+            for ray_row, ray_col in ray:
+                piece = board[ray_row][ray_col]
+                if not piece:
+                    continue
+                if screen_found:
+                    if piece[0] == "cannon" and piece[1] == by_color:
+                        yield (ray_row, ray_col)
+                    break
+                if piece[1] == by_color and (piece[0] == "rook" or
+                                             (piece[0] == "general" and target_is_general and direction < 2)):
+                    yield (ray_row, ray_col)
+                screen_found = True
+
+        for origin, leg in HORSE_ATTACKS[index]:
+            if board[leg[0]][leg[1]] is None and board[origin[0]][origin[1]] == ("horse", by_color):
+                yield origin
+        for origin in SOLDIER_ATTACKS[by_color][index]:
+            if board[origin[0]][origin[1]] == ("soldier", by_color):
+                yield origin
+        for origin in ADVISOR_ATTACKS[by_color][index]:
+            if board[origin[0]][origin[1]] == ("advisor", by_color):
+                yield origin
+        for origin, eye in ELEPHANT_ATTACKS[by_color][index]:
+            if board[eye[0]][eye[1]] is None and board[origin[0]][origin[1]] == ("elephant", by_color):
+                yield origin
+        for origin in GENERAL_ATTACKS[by_color][index]:
+            if board[origin[0]][origin[1]] == ("general", by_color):
+                yield origin
+
+    @staticmethod
+    def attackers(board, square, by_color):
+        return list(XiangqiRules.iter_attackers(board, square, by_color))
+
+    @staticmethod
+    def is_square_attacked(board, square, by_color):
+        for _ in XiangqiRules.iter_attackers(board, square, by_color):
+            return True
+        return False
+
+    @staticmethod
+    def attack_map(board, by_color):
+        """Count how many by_color pieces attack each square, as a 10x9 grid"""
+        counts = [[0] * BOARD_COLS for _ in range(BOARD_ROWS)]
+        for start, piece_type in XiangqiRules.pieces(board, by_color):
+            if piece_type == "cannon":
+                # Cannons only attack behind a screen, the squares they move to are not attacked
+                for ray in RAYS[start[0] * BOARD_COLS + start[1]]:
+                    screen_found = False
+                    for ray_row, ray_col in ray:
+                        piece = board[ray_row][ray_col]
+                        if screen_found:
+                            if not piece or piece[1] != by_color:
+                                counts[ray_row][ray_col] += 1
+                            if piece:
+                                break
+                        elif piece:
+                            screen_found = True
+                continue
+            for end in XiangqiRules.generate_moves(board, piece_type, by_color, start):
+                counts[end[0]][end[1]] += 1
+        return counts
+
+    @staticmethod
+    def is_in_check(board, color):
+        general = XiangqiRules.find_general(board, color)
+        if general is None:
+            return False
+        return XiangqiRules.is_square_attacked(board, general, opponent(color))
+
+    @staticmethod
+    def generate_legal_moves(board, color, captures_only=False):
+        """Yield (start, end) for every move that doesn't leave color's general attacked"""
+        enemy = opponent(color)
+        general = XiangqiRules.find_general(board, color)
+        if general is None:
+            for start, piece_type in XiangqiRules.pieces(board, color):
+                for end in XiangqiRules.generate_moves(board, piece_type, color, start):
+                    if not captures_only or board[end[0]][end[1]]:
+                        yield (start, end)
+            return
+
+        in_check = XiangqiRules.is_square_attacked(board, general, enemy)
+        general_row, general_col = general
+        legs = CHECK_LEGS[general_row * BOARD_COLS + general_col]
+        cells = board.cells if isinstance(board, FlatBoard) else None
+
+        for start, piece_type in XiangqiRules.pieces(board, color):
+            start_row, start_col = start
+            # Only moves that leave or enter the general's lines, free a horse leg next to
+            # it, or move the general itself can expose it; everything else is safe unless
+            # the general is already in check
+            start_safe = (not in_check and piece_type != "general" and start_row != general_row
+                          and start_col != general_col and start not in legs)
+            for end in list(XiangqiRules.generate_moves(board, piece_type, color, start)):
+                if captures_only and not (cells[end[0] * BOARD_COLS + end[1]] if cells is not None
+                                          else board[end[0]][end[1]]):
+                    continue
+                if start_safe and end[0] != general_row and end[1] != general_col:
+                    yield (start, end)
+                elif not XiangqiRules._exposes_general(board, enemy, general, piece_type, start, end):
+                    yield (start, end)
+
+    @staticmethod
+    def _exposes_general(board, enemy, general, piece_type, start, end):
+        # Play the move, look outward from the general for attackers, and take it back
+        if isinstance(board, FlatBoard):
+            # On the cells alone: the attack scan never reads the piece lists
+            cells = board.cells
+            start_square = start[0] * BOARD_COLS + start[1]
+            end_square = end[0] * BOARD_COLS + end[1]
+            moved = cells[start_square]
+            captured = cells[end_square]
+            cells[end_square] = moved
+            cells[start_square] = EMPTY
+            target = end_square if piece_type == "general" else general[0] * BOARD_COLS + general[1]
+            attacked = False
+            for _ in XiangqiRules._iter_flat_attackers(cells, target, enemy):
+                attacked = True
+                break
+            cells[start_square] = moved
+            cells[end_square] = captured
+            return attacked
+        start_row, start_col = start
+        end_row, end_col = end
+        moved = board[start_row][start_col]
+        captured = board[end_row][end_col]
+        board[end_row][end_col] = moved
+        board[start_row][start_col] = None
+        attacked = XiangqiRules.is_square_attacked(board, end if piece_type == "general" else general, enemy)
+        board[start_row][start_col] = moved
+        board[end_row][end_col] = captured
+        return attacked
+
+    @staticmethod
+    def legal_moves(board, color, captures_only=False):
+        return list(XiangqiRules.generate_legal_moves(board, color, captures_only))
+
+    @staticmethod
+    def is_legal_move(board, color, start, end):
+        if isinstance(board, FlatBoard):
+            piece = board.piece_at(start[0] * BOARD_COLS + start[1])
+        else:
+            piece = board[start[0]][start[1]]
+        if not piece or piece[1] != color or not XiangqiRules.is_valid_move(board, piece[0], color, start, end):
+            return False
+        general = XiangqiRules.find_general(board, color)
+        if general is None:
+            return True
+        return not XiangqiRules._exposes_general(board, opponent(color), general, piece[0], start, end)
+
+    @staticmethod
+    def has_legal_move(board, color):
+        for _ in XiangqiRules.generate_legal_moves(board, color):
+            return True
+        return False
+
+    @staticmethod
+    def is_checkmate(board, color):
+        return XiangqiRules.is_in_check(board, color) and not XiangqiRules.has_legal_move(board, color)
+
+    @staticmethod
+    def is_stalemate(board, color):
+        # In Xiangqi a side with no legal move loses even when not in check
+        return not XiangqiRules.is_in_check(board, color) and not XiangqiRules.has_legal_move(board, color)
+
+    @staticmethod
+    def _generate_flat_moves(cells, piece_type, color, start):
+        # Same walk as generate_moves, on FlatBoard piece codes
+        square = start[0] * BOARD_COLS + start[1]
+        own = color_flag(color)
+
+        if piece_type == "rook":
+            for ray in FLAT_RAYS[square]:
+                for end in ray:
+                    target = cells[end]
+                    if target:
+                        if target & BLACK_FLAG != own:
+                            yield SQUARE_COORDS[end]
+                        break
+                    yield SQUARE_COORDS[end]
+        elif piece_type == "cannon":
+            for ray in FLAT_RAYS[square]:
+                screen_found = False
+                for end in ray:
+                    target = cells[end]
+                    if not screen_found:
+                        if target:
+                            screen_found = True
+                        else:
+                            yield SQUARE_COORDS[end]
+                    elif target:
+                        if target & BLACK_FLAG != own:
+                            yield SQUARE_COORDS[end]
+                        break
+        elif piece_type == "horse":
+            for end, leg in FLAT_HORSE_MOVES[square]:
+                if not cells[leg]:
+                    target = cells[end]
+                    if not target or target & BLACK_FLAG != own:
+                        yield SQUARE_COORDS[end]
+        elif piece_type == "elephant":
+            for end, eye in FLAT_ELEPHANT_MOVES[color][square]:
+                if not cells[eye]:
+                    target = cells[end]
+                    if not target or target & BLACK_FLAG != own:
+                        yield SQUARE_COORDS[end]
+        elif piece_type in ("advisor", "general", "soldier"):
+            if piece_type == "advisor":
+                steps = FLAT_ADVISOR_MOVES[color][square]
+            elif piece_type == "general":
+                steps = FLAT_GENERAL_MOVES[color][square]
+            else:
+                steps = FLAT_SOLDIER_MOVES[color][square]
+            for end in steps:
+                target = cells[end]
+                if not target or target & BLACK_FLAG != own:
+                    yield SQUARE_COORDS[end]
+
+            if piece_type == "general":
+                for ray in FLAT_RAYS[square][:2]:
+                    for end in ray:
+                        target = cells[end]
+                        if target:
+                            if (target & TYPE_MASK == GENERAL and target & BLACK_FLAG != own
+                                    and end not in steps):
+                                yield SQUARE_COORDS[end]
+                            break
+
+    @staticmethod
+    def _is_valid_flat_move(cells, piece_type, color, start, end):
+        # Same rules as is_valid_move, on FlatBoard piece codes and flat square indices
+        own = color_flag(color)
+        target = cells[end]
+        if target and target & BLACK_FLAG == own:
+            return False
+        start_row, start_col = divmod(start, BOARD_COLS)
+        end_row, end_col = divmod(end, BOARD_COLS)
+        row_diff = end_row - start_row
+        col_diff = end_col - start_col
+
+        if piece_type in ("rook", "cannon") or (piece_type == "general" and not col_diff and target
+                                                 and target & TYPE_MASK == GENERAL):
+            if row_diff and col_diff:
+                return False
+            if row_diff:
+                step = BOARD_COLS if row_diff > 0 else -BOARD_COLS
+            else:
+                step = 1 if col_diff > 0 else -1
+            between = 0
+            for square in range(start + step, end, step):
+                if cells[square]:
+                    between += 1
+            if piece_type == "cannon":
+                return between == (1 if target else 0)
+            # Rooks, and generals facing each other on an open file
+            if between == 0:
+                return True
+        if piece_type == "horse":
+            for move_end, leg in FLAT_HORSE_MOVES[start]:
+                if move_end == end:
+                    return not cells[leg]
+            return False
+        if piece_type == "elephant":
+            for move_end, eye in FLAT_ELEPHANT_MOVES[color][start]:
+                if move_end == end:
+                    return not cells[eye]
+            return False
+        if piece_type == "advisor":
+            return end in FLAT_ADVISOR_MOVES[color][start]
+        if piece_type == "general":
+            return end in FLAT_GENERAL_MOVES[color][start]
+        if piece_type == "soldier":
+            return end in FLAT_SOLDIER_MOVES[color][start]
+        return False
+
+    @staticmethod
+    def _iter_flat_attackers(cells, square, by_color):
+        # Same scan as iter_attackers, on FlatBoard piece codes
+        flag = color_flag(by_color)
+        rook = ROOK | flag
+        cannon = CANNON | flag
+        target = cells[square]
+        target_is_general = target & TYPE_MASK == GENERAL
+        general = GENERAL | flag
+
+        for direction, ray in enumerate(FLAT_RAYS[square]):
+            screen_found = False
+            for ray_square in ray:
+                piece = cells[ray_square]
+                if not piece:
+                    continue
+                if screen_found:
+                    if piece == cannon:
+                        yield SQUARE_COORDS[ray_square]
+                    break
+                if piece == rook or (piece == general and target_is_general and direction < 2):
+                    yield SQUARE_COORDS[ray_square]
+                screen_found = True
+
+        horse = HORSE | flag
+        for origin, leg in FLAT_HORSE_ATTACKS[square]:
+            if not cells[leg] and cells[origin] == horse:
+                yield SQUARE_COORDS[origin]
+        soldier = SOLDIER | flag
+        for origin in FLAT_SOLDIER_ATTACKS[by_color][square]:
+            if cells[origin] == soldier:
+                yield SQUARE_COORDS[origin]
+        advisor = ADVISOR | flag
+        for origin in FLAT_ADVISOR_ATTACKS[by_color][square]:
+            if cells[origin] == advisor:
+                yield SQUARE_COORDS[origin]
+        elephant = ELEPHANT | flag
+        for origin, eye in FLAT_ELEPHANT_ATTACKS[by_color][square]:
+            if not cells[eye] and cells[origin] == elephant:
+                yield SQUARE_COORDS[origin]
+        for origin in FLAT_GENERAL_ATTACKS[by_color][square]:
+            if cells[origin] == general:
+                yield SQUARE_COORDS[origin]
+
     @staticmethod
     def get_valid_moves(board, piece_type, color, start):
-        valid_moves = []
-        for row in range(10):
-            for col in range(9):
-                if XiangqiRules.is_valid_move(board, piece_type, color, start, (row, col)):
-                    valid_moves.append((row, col))
-        return valid_moves
\ No newline at end of file
+        # Sorted to keep the row-major order of the original square scan
+        return sorted(XiangqiRules.generate_moves(board, piece_type, color, start))
\ No newline at end of file
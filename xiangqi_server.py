@@ -0,0 +1,462 @@
+# Asyncio game server hosting many concurrent games over newline-delimited JSON on TCP
+#
+# Every request is one JSON object per line; an "id" field is echoed back in the reply:
+#
+#     {"op": "create", "fen": <optional FEN>}                      -> created: game id, fen, turn
+#     {"op": "join", "game": <id>, "role": "red"|"black"|"observer"} -> joined: fen, turn, moves, status
+#     {"op": "move", "game": <id>, "move": "h2e2"}                  -> moved: move, ply, turn, status
+#     {"op": "state", "game": <id>}                                 -> state: fen, turn, start_fen, moves, status
+#     {"op": "stats"}                                               -> stats: server counters
+#
+# A move must come from the connection seated as the side to move. Accepted moves are sent to
+# the mover as the reply and to every other player and observer of the game as a "moved" event.
+# Errors are returned as {"op": "error", "error": <message>}. A game is dropped once every connection
+# that created, joined or watched it has closed.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import resource
+import signal
+import statistics
+import sys
+import time
+import tracemalloc
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from xiangqi_board import BOARD_COLS, FlatBoard
+from xiangqi_game import XiangqiGame
+from xiangqi_hash import pack_move, unpack_move
+from xiangqi_notation import START_FEN, parse_fen, parse_iccs, to_fen, to_iccs
+from xiangqi_rules import XiangqiRules, opponent
+
+DEFAULT_PORT = 9090
+
+# Stop reading from a connection while this much output is queued for it
+WRITE_HIGH_WATER = 256 * 1024
+# Observers that fall this far behind are dropped rather than buffered without limit
+OBSERVER_MAX_BUFFER = 4 * 1024 * 1024
+
+
+def validate_move(cells, current_turn, move):
+    """Play move on a copy of the board given as 90 piece codes.
+
+    Returns (legal, game_over): game_over when the side to move next has no legal reply.
+    Runs in a validation worker process, or in the event loop when there are none.
+    """
+    board = FlatBoard(cells)
+    start, end = move
+    if not XiangqiRules.is_legal_move(board, current_turn, start, end):
+        return False, False
+    board.move(start[0] * BOARD_COLS + start[1], end[0] * BOARD_COLS + end[1])
+    return True, not XiangqiRules.has_legal_move(board, opponent(current_turn))
+
+
+class Session:
+    """One game: a FlatBoard, the side to move, the moves played and who is connected"""
+    __slots__ = ("game_id", "board", "turn", "start_fen", "moves", "status", "red", "black", "observers",
+                 "pending", "holders")
+
+    def __init__(self, game_id, fen):
+        board, turn = parse_fen(fen)
+        self.game_id = game_id
+        self.board = FlatBoard.from_nested(board)
+        self.turn = turn
+        self.start_fen = fen
+        self.moves = array("H")
+        self.status = "ongoing"
+        self.red = None
+        self.black = None
+        self.observers = set()
+        # A move waiting on a validation worker; others are refused until it is applied
+        self.pending = False
+        # Connections that created, joined or watched the game; it is dropped when this reaches zero
+        self.holders = 0
+
+    def fen(self):
+        return to_fen(self.board, self.turn)
+
+    def connections(self):
+        return {connection for connection in (self.red, self.black) if connection} | self.observers
+
+    def apply(self, move, game_over):
+        start, end = move
+        self.board.move(start[0] * BOARD_COLS + start[1], end[0] * BOARD_COLS + end[1])
+        self.moves.append(pack_move(move))
+        mover = self.turn
+        self.turn = opponent(mover)
+        if game_over:
+            # No legal reply: checkmate or stalemate, both a loss in Xiangqi
+            self.status = f"{mover} wins"
+
+    def state(self):
+        return {"game": self.game_id, "fen": self.fen(), "turn": self.turn, "status": self.status,
+                "start_fen": self.start_fen, "moves": [to_iccs(unpack_move(packed)) for packed in self.moves]}
+
+
+class Connection:
+    __slots__ = ("writer", "games")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = set()
+
+    def send(self, message):
+        self.writer.write((json.dumps(message) + "\n").encode())
+
+    def send_raw(self, data):
+        self.writer.write(data)
+
+
+class XiangqiServer:
+    def __init__(self, validation_workers=None):
+        self.sessions = {}
+        self.next_game_id = 1
+        self.connections = 0
+        self.moves = 0
+        self.requests = 0
+        self.started_at = time.perf_counter()
+        # Validation runs in a process pool (one worker per core by default) so the event loop only
+        # relays messages; 0 validates in the loop, which saves the round trip on a single core.
+        # Workers are spawned, not forked, so they never hold copies of client sockets open.
+        self.executor = None
+        if validation_workers != 0:
+            self.executor = ProcessPoolExecutor(validation_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=64 * 1024)
+        if ready:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self.executor:
+                self.executor.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(writer)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # The line overran the reader's limit; the stream can't be resynchronised
+                    connection.send({"op": "error", "error": "request line too long"})
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                self.requests += 1
+                request = {}
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        request = {}
+                        raise ValueError("request must be a JSON object")
+                    reply = await self.dispatch(connection, request)
+                except (ValueError, KeyError, TypeError) as error:
+                    reply = {"op": "error", "error": str(error) or type(error).__name__}
+                if "id" in request:
+                    reply["id"] = request["id"]
+                connection.send(reply)
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            self._disconnect(connection)
+            writer.close()
+
+    def _disconnect(self, connection):
+        for game_id in connection.games:
+            session = self.sessions.get(game_id)
+            if not session:
+                continue
+            session.observers.discard(connection)
+            if session.red is connection:
+                session.red = None
+            if session.black is connection:
+                session.black = None
+            # Nobody left to play or watch: forget the game
+            session.holders -= 1
+            if not session.holders:
+                del self.sessions[game_id]
+
+    def _hold(self, connection, session):
+        if session.game_id not in connection.games:
+            connection.games.add(session.game_id)
+            session.holders += 1
+
+    def _session(self, request):
+        session = self.sessions.get(request.get("game"))
+        if session is None:
+            raise ValueError(f"no game {request.get('game')}")
+        return session
+
+    async def dispatch(self, connection, request):
+        op = request.get("op")
+        if op == "move":
+            return await self._move(connection, request)
+        if op == "create":
+            session = Session(self.next_game_id, request.get("fen") or START_FEN)
+            self.sessions[session.game_id] = session
+            self.next_game_id += 1
+            # The creator holds the game until it disconnects, even if nobody joins
+            self._hold(connection, session)
+            return {"op": "created", "game": session.game_id, "fen": session.fen(), "turn": session.turn}
+        if op == "join":
+            session = self._session(request)
+            role = request.get("role", "observer")
+            if role in ("red", "black"):
+                seated = getattr(session, role)
+                if seated and seated is not connection:
+                    raise ValueError(f"{role} is already taken")
+                setattr(session, role, connection)
+            elif role == "observer":
+                session.observers.add(connection)
+            else:
+                raise ValueError(f"unknown role {role}")
+            self._hold(connection, session)
+            return dict(session.state(), op="joined", role=role)
+        if op == "state":
+            return dict(self._session(request).state(), op="state")
+        if op == "stats":
+            return {"op": "stats", "sessions": len(self.sessions), "connections": self.connections,
+                    "moves": self.moves, "requests": self.requests,
+                    "uptime": time.perf_counter() - self.started_at,
+                    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+        raise ValueError(f"unknown op {op}")
+
+    async def _move(self, connection, request):
+        session = self._session(request)
+        if session.status != "ongoing":
+            raise ValueError(f"game is over: {session.status}")
+        if getattr(session, session.turn) is not connection:
+            raise ValueError(f"not seated as {session.turn}")
+        if session.pending:
+            raise ValueError("a move is already being validated")
+        if not isinstance(request.get("move"), str):
+            raise ValueError("move must be an ICCS string")
+        move = parse_iccs(request["move"])
+
+        if self.executor:
+            session.pending = True
+            try:
+                loop = asyncio.get_running_loop()
+                legal, game_over = await loop.run_in_executor(self.executor, validate_move,
+                                                              bytes(session.board), session.turn, move)
+            finally:
+                session.pending = False
+        else:
+            legal, game_over = validate_move(session.board.cells, session.turn, move)
+        if not legal:
+            raise ValueError(f"illegal move {request['move']}")
+
+        session.apply(move, game_over)
+        self.moves += 1
+        event = {"op": "moved", "game": session.game_id, "move": to_iccs(move), "ply": len(session.moves),
+                 "turn": session.turn, "status": session.status}
+        self._broadcast(session, event, connection)
+        return event
+
+    def _broadcast(self, session, event, exclude):
+        data = (json.dumps(event) + "\n").encode()
+        for other in session.connections():
+            if other is exclude:
+                continue
+            if other.writer.transport.get_write_buffer_size() > OBSERVER_MAX_BUFFER:
+                # Too slow to keep up; it can reconnect and ask for the state
+                other.writer.transport.abort()
+                continue
+            other.send_raw(data)
+
+
+def session_memory(count=10000, plies=40, seed=0):
+    """Average bytes allocated per session holding plies moves"""
+    rng = random.Random(seed)
+    game = XiangqiGame()
+    moves = []
+    for _ in range(plies):
+        move = rng.choice(game.legal_moves())
+        moves.append(move)
+        game.push(move)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = []
+    for game_id in range(count):
+        session = Session(game_id, START_FEN)
+        for move in moves:
+            session.apply(move, False)
+        sessions.append(session)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+class _Client:
+    # Load-generator connection: one request in flight at a time, events from other games ignored
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.events = 0
+
+    async def request(self, message):
+        self.next_id += 1
+        message["id"] = self.next_id
+        self.writer.write((json.dumps(message) + "\n").encode())
+        while True:
+            reply = json.loads(await self.reader.readline())
+            if reply.get("id") == self.next_id:
+                return reply
+            self.events += 1
+
+
+async def _drain_events(client):
+    while await client.reader.readline():
+        client.events += 1
+
+
+async def _play(host, port, games, plies, observers, latencies, counts, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    client = _Client(reader, writer)
+    watchers = []
+    for _ in range(observers):
+        watcher_reader, watcher_writer = await asyncio.open_connection(host, port)
+        watchers.append((_Client(watcher_reader, watcher_writer), watcher_writer))
+
+    for _ in range(games):
+        created = await client.request({"op": "create"})
+        game_id = created["game"]
+        await client.request({"op": "join", "game": game_id, "role": "red"})
+        await client.request({"op": "join", "game": game_id, "role": "black"})
+        for watcher, _ in watchers:
+            await watcher.request({"op": "join", "game": game_id, "role": "observer"})
+        counts["sessions"] += 1
+
+        # The client keeps its own copy of the game to pick random legal moves
+        game = XiangqiGame()
+        for _ in range(plies):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            start_time = time.perf_counter()
+            reply = await client.request({"op": "move", "game": game_id, "move": to_iccs(move)})
+            latencies.append(time.perf_counter() - start_time)
+            if reply["op"] != "moved":
+                raise RuntimeError(f"server refused a legal move: {reply}")
+            game.push(move)
+            counts["moves"] += 1
+
+    # Give the last broadcasts time to arrive, then count what every observer received
+    drains = [asyncio.ensure_future(_drain_events(watcher)) for watcher, _ in watchers]
+    await asyncio.sleep(0.05)
+    for drain in drains:
+        drain.cancel()
+    counts["events"] += sum(watcher.events for watcher, _ in watchers)
+    writer.close()
+    for _, watcher_writer in watchers:
+        watcher_writer.close()
+
+
+async def run_load(host, port, clients=50, games=10, plies=40, observers=1, seed=0):
+    """Drive the server with clients concurrent connections, each playing games random games of
+    up to plies moves with observers watching connections; returns a results dict"""
+    rng = random.Random(seed)
+    latencies = []
+    counts = {"sessions": 0, "moves": 0, "events": 0}
+    start_time = time.perf_counter()
+    await asyncio.gather(*(_play(host, port, games, plies, observers, latencies, counts, random.Random(rng.random()))
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start_time
+
+    reader, writer = await asyncio.open_connection(host, port)
+    stats = await _Client(reader, writer).request({"op": "stats"})
+    writer.close()
+    latencies.sort()
+    return {
+        "clients": clients,
+        "seconds": elapsed,
+        "sessions": counts["sessions"],
+        "sessions_per_second": counts["sessions"] / elapsed,
+        "moves": counts["moves"],
+        "moves_per_second": counts["moves"] / elapsed,
+        "observer_events": counts["events"],
+        "latency_ms_p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "latency_ms_p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        "server_max_rss_kb": stats["max_rss_kb"],
+    }
+
+
+async def _serve_until_terminated(server, host, port, ready=None):
+    # SIGTERM stops the server cleanly so validation workers are shut down rather than orphaned
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await server.serve(host, port, ready)
+    except asyncio.CancelledError:
+        pass
+
+
+def _serve_process(port, validation_workers, ready):
+    asyncio.run(_serve_until_terminated(XiangqiServer(validation_workers), "127.0.0.1", port,
+                                        lambda bound_port: ready.put(bound_port)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asyncio Xiangqi game server and load generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the server")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve.add_argument("--validation-workers", type=int,
+                       help="processes for move validation (default: one per core, 0 validates in the event loop)")
+    for name, help_text in (("load", "drive a running server"), ("bench", "start a server and drive it")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--clients", type=int, default=50, help="concurrent connections (default: 50)")
+        command.add_argument("--games", type=int, default=10, help="games per client (default: 10)")
+        command.add_argument("--plies", type=int, default=40, help="moves per game (default: 40)")
+        command.add_argument("--observers", type=int, default=1, help="observer connections per client")
+        if name == "load":
+            command.add_argument("--host", default="127.0.0.1")
+            command.add_argument("--port", type=int, default=DEFAULT_PORT)
+        else:
+            command.add_argument("--validation-workers", type=int)
+    memory = commands.add_parser("memory", help="measure memory per session")
+    memory.add_argument("--sessions", type=int, default=10000)
+    memory.add_argument("--plies", type=int, default=40)
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        print(f"serving on {args.host}:{args.port}", file=sys.stderr)
+        asyncio.run(_serve_until_terminated(XiangqiServer(args.validation_workers), args.host, args.port))
+    elif args.command == "memory":
+        print(f"{session_memory(args.sessions, args.plies):,.0f} bytes per session with {args.plies} moves")
+    else:
+        process = None
+        host, port = "127.0.0.1", getattr(args, "port", None)
+        if args.command == "bench":
+            ready = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_serve_process, args=(0, args.validation_workers, ready))
+            process.start()
+            port = ready.get(timeout=30)
+        else:
+            host = args.host
+        try:
+            results = asyncio.run(run_load(host, port, args.clients, args.games, args.plies, args.observers))
+        finally:
+            if process:
+                process.terminate()
+                process.join()
+        for key, value in results.items():
+            print(f"{key:<22} {value:,.2f}" if isinstance(value, float) else f"{key:<22} {value:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# Import-time and startup benchmark for headless worker processes
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# What a worker does on start-up in each scenario
+SCENARIOS = [
+    ("interpreter only", "pass"),
+    ("game model", "from xiangqi_game import XiangqiGame; XiangqiGame()"),
+    ("xiangqi module", "from xiangqi import XiangqiGame; XiangqiGame()"),
+    ("engine", "from xiangqi_engine import Engine; from xiangqi_game import XiangqiGame; Engine(1); XiangqiGame()"),
+    ("UCCI engine", "from xiangqi_ucci import UCCIEngine; UCCIEngine()"),
+    # What importing xiangqi used to cost: pygame loaded and initialized up front
+    ("pygame at import", "import pygame; pygame.init(); from xiangqi_game import XiangqiGame; XiangqiGame()"),
+]
+
+
+def time_startup(code, runs):
+    """Median wall time of fresh interpreters running code, and whether pygame got loaded"""
+    script = code + "; import sys; print('pygame' in sys.modules)"
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+    timings = []
+    pygame_loaded = None
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        timings.append(time.perf_counter() - start_time)
+        if completed.returncode != 0:
+            return None, None
+        pygame_loaded = completed.stdout.strip().endswith("True")
+    return statistics.median(timings), pygame_loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure worker start-up time with and without pygame")
+    parser.add_argument("--runs", type=int, default=10, help="interpreter launches per scenario (default: 10)")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    print(f"{'scenario':20} {'median ms':>10} {'vs bare':>9}  pygame loaded")
+    for name, code in SCENARIOS:
+        seconds, pygame_loaded = time_startup(code, args.runs)
+        if seconds is None:
+            print(f"{name:20} {'failed':>10}")
+            continue
+        if baseline is None:
+            baseline = seconds
+        print(f"{name:20} {seconds * 1000:>10.1f} {(seconds - baseline) * 1000:>+8.1f}  {pygame_loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+# Endgame tablebases for small material sets, generated by retrograde analysis
+#
+# A table covers one material set such as KRKAA (red general and rook against black general and two
+# advisors). The stronger side is always stored as red; positions with the colours reversed are
+# probed through the vertically mirrored board. Each piece is indexed over the squares it can stand
+# on (9 palace squares for a general, 5 for an advisor, 7 for an elephant, 55 for a soldier, 90
+# otherwise) and identical pieces by their combination, so a table is one byte per position:
+#
+#     0        draw
+#     1..254   distance to mate + 1 in plies: odd distances win for the side to move, even ones lose
+#     255      not a legal position
+#
+# Generation runs a forward pass over XiangqiRules move generation in worker processes, saving
+# each chunk so an interrupted run resumes where it stopped, then solves the position graph level by
+# level with NumPy. Captures into smaller material sets are looked up in their own tables, which are
+# generated first. Repetition rules are not modelled: positions that only cycle are draws.
+import argparse
+import glob
+import itertools
+import mmap
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+import time
+
+from xiangqi_board import BOARD_COLS, BOARD_ROWS, BOARD_SQUARES, PIECE_CODES, FlatBoard
+from xiangqi_eval import PIECE_VALUES
+from xiangqi_rules import PALACE_COLS, PALACE_ROWS, XiangqiRules, opponent
+
+MAGIC = b"XQTB\x00\x01\x00\x00"
+HEADER = struct.Struct("<8s16sQ")
+TABLE_SUFFIX = ".xtb"
+
+DRAW = 0
+INVALID = 255
+MAX_DTM = 253
+
+PIECE_LETTERS = {"rook": "R", "horse": "N", "cannon": "C", "soldier": "P", "advisor": "A", "elephant": "B"}
+LETTER_PIECES = {letter: piece for piece, letter in PIECE_LETTERS.items()}
+# Pieces able to attack the enemy general; without any on either side the game is a draw
+ATTACKERS = frozenset(("rook", "horse", "cannon", "soldier"))
+
+# Positions per forward-pass chunk; each chunk is saved as soon as it is done
+CHUNK_SIZE = 20000
+
+
+def _red_domain(piece_type):
+    # Squares a red piece of this type can ever stand on
+    if piece_type == "general":
+        return [row * BOARD_COLS + col for row in PALACE_ROWS["red"] for col in PALACE_COLS]
+    if piece_type == "advisor":
+        return [row * BOARD_COLS + col for row, col in ((7, 3), (7, 5), (8, 4), (9, 3), (9, 5))]
+    if piece_type == "elephant":
+        return [row * BOARD_COLS + col for row, col in ((5, 2), (5, 6), (7, 0), (7, 4), (7, 8), (9, 2), (9, 6))]
+    if piece_type == "soldier":
+        # Anywhere across the river, or on the two home rows it starts from and advances through
+        return [row * BOARD_COLS + col for row in range(7) for col in range(BOARD_COLS) if row <= 4 or col % 2 == 0]
+    return list(range(BOARD_SQUARES))
+
+
+def mirror_square(square):
+    row, col = divmod(square, BOARD_COLS)
+    return (BOARD_ROWS - 1 - row) * BOARD_COLS + col
+
+
+def domain(piece_type, color):
+    squares = _red_domain(piece_type)
+    return squares if color == "red" else sorted(mirror_square(square) for square in squares)
+
+
+def material_name(red_types, black_types):
+    """Name of a material set from the non-general piece types of each side, e.g. KRKAA"""
+    order = "RNCPAB"
+    red = sorted((PIECE_LETTERS[piece_type] for piece_type in red_types), key=order.index)
+    black = sorted((PIECE_LETTERS[piece_type] for piece_type in black_types), key=order.index)
+    return "K" + "".join(red) + "K" + "".join(black)
+
+
+def parse_material(name):
+    """KRKAA -> (["rook"], ["advisor", "advisor"])"""
+    name = name.upper()
+    if not name.startswith("K") or name.count("K") != 2:
+        raise ValueError(f"Material {name} must look like KRKAA: a general and pieces for each side")
+    red, black = name[1:].split("K")
+    try:
+        return [LETTER_PIECES[letter] for letter in red], [LETTER_PIECES[letter] for letter in black]
+    except KeyError as error:
+        raise ValueError(f"Unknown piece letter {error.args[0]} in {name}") from None
+
+
+def _strength(piece_types):
+    return sorted((PIECE_VALUES[piece_type] for piece_type in piece_types), reverse=True)
+
+
+def canonical_material(red_types, black_types):
+    """(name, mirrored): the stronger side is stored as red, so mirrored is set when black is stronger"""
+    red_key = (_strength(red_types), material_name(red_types, []))
+    black_key = (_strength(black_types), material_name(black_types, []))
+    if black_key > red_key:
+        return material_name(black_types, red_types), True
+    return material_name(red_types, black_types), False
+
+
+def has_attackers(red_types, black_types):
+    return any(piece_type in ATTACKERS for piece_type in itertools.chain(red_types, black_types))
+
+
+def dependencies(name):
+    """Canonical names of every smaller table that captures from this material set lead to"""
+    red_types, black_types = parse_material(name)
+    found = set()
+    for side in (0, 1):
+        types = (red_types, black_types)[side]
+        for index in range(len(types)):
+            remaining = types[:index] + types[index + 1:]
+            sub_red, sub_black = (remaining, black_types) if side == 0 else (red_types, remaining)
+            if has_attackers(sub_red, sub_black):
+                sub_name, _ = canonical_material(sub_red, sub_black)
+                if sub_name not in found:
+                    found.add(sub_name)
+                    found |= dependencies(sub_name)
+    return found
+
+
+class TableLayout:
+    """Maps the positions of one canonical material set to table indices and back"""
+
+    def __init__(self, name):
+        self.name = name
+        red_types, black_types = parse_material(name)
+        # (piece_type, color, count, combinations of squares, combination -> rank)
+        self.groups = []
+        for color, types in (("red", ["general"] + red_types), ("black", ["general"] + black_types)):
+            for piece_type in dict.fromkeys(types):
+                count = types.count(piece_type)
+                combos = list(itertools.combinations(domain(piece_type, color), count))
+                ranks = {combo: rank for rank, combo in enumerate(combos)}
+                self.groups.append((piece_type, color, count, combos, ranks))
+        self.size = 2
+        for group in self.groups:
+            self.size *= len(group[3])
+        self.pieces = sum(group[2] for group in self.groups)
+
+    def encode(self, pieces, current_turn):
+        """Index of the position given as (piece_type, color, square) tuples, or None if it is outside the table"""
+        squares = {}
+        for piece_type, color, square in pieces:
+            squares.setdefault((piece_type, color), []).append(square)
+        index = 0
+        for piece_type, color, _, combos, ranks in self.groups:
+            rank = ranks.get(tuple(sorted(squares.get((piece_type, color), ()))))
+            if rank is None:
+                return None
+            index = index * len(combos) + rank
+        return index * 2 + (current_turn == "black")
+
+    def decode(self, index):
+        """(pieces, current_turn) for a table index"""
+        current_turn = "black" if index & 1 else "red"
+        index >>= 1
+        pieces = []
+        for piece_type, color, _, combos, _ in reversed(self.groups):
+            index, rank = divmod(index, len(combos))
+            pieces.extend((piece_type, color, square) for square in combos[rank])
+        return pieces, current_turn
+
+
+class Tablebase:
+    """Probes every table found in a directory; tables are memory-mapped when first used"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = {}
+        for path in glob.glob(os.path.join(directory, "*" + TABLE_SUFFIX)):
+            self.paths[os.path.basename(path)[:-len(TABLE_SUFFIX)]] = path
+        # name -> (TableLayout, mmap)
+        self.tables = {}
+        # (red types, black types) -> (table, mirrored), or None when the material is a dead draw
+        self.materials = {}
+        self.max_pieces = max((len(name) for name in self.paths), default=0)
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            path = self.paths.get(name)
+            if path is None:
+                return None
+            layout = TableLayout(name)
+            with open(path, "rb") as f:
+                magic, stored_name, size = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or stored_name.rstrip(b"\x00").decode() != name or size != layout.size:
+                    raise ValueError(f"{path} is not a tablebase for {name}")
+                if os.path.getsize(path) != HEADER.size + size:
+                    raise ValueError(f"{path} is truncated")
+                table = self.tables[name] = (layout, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return table
+
+    def probe_pieces(self, pieces, current_turn):
+        """(result, dtm) for the side to move, result 1, 0 or -1, or None when no table covers the position.
+
+        pieces are (piece_type, color, square) tuples with square = row * 9 + col.
+        """
+        red_types = tuple(sorted(piece_type for piece_type, color, _ in pieces
+                                 if color == "red" and piece_type != "general"))
+        black_types = tuple(sorted(piece_type for piece_type, color, _ in pieces
+                                   if color == "black" and piece_type != "general"))
+        material = self.materials.get((red_types, black_types), False)
+        if material is False:
+            material = None
+            if has_attackers(red_types, black_types):
+                name, mirrored = canonical_material(red_types, black_types)
+                material = (self._table(name), mirrored)
+            self.materials[(red_types, black_types)] = material
+        if material is None:
+            return 0, 0
+        table, mirrored = material
+        if table is None:
+            return None
+        if mirrored:
+            pieces = [(piece_type, opponent(color), mirror_square(square)) for piece_type, color, square in pieces]
+            current_turn = opponent(current_turn)
+        layout, data = table
+        index = layout.encode(pieces, current_turn)
+        if index is None:
+            return None
+        value = data[HEADER.size + index]
+        if value == INVALID:
+            return None
+        if value == DRAW:
+            return 0, 0
+        dtm = value - 1
+        return (1 if dtm & 1 else -1), dtm
+
+    def probe(self, board, current_turn):
+        """(result, dtm) for a nested board or FlatBoard, or None"""
+        pieces = [(piece_type, color, row * BOARD_COLS + col) for color in ("red", "black")
+                  for (row, col), piece_type in XiangqiRules.pieces(board, color)]
+        if len(pieces) > self.max_pieces:
+            return None
+        return self.probe_pieces(pieces, current_turn)
+
+
+_worker_tablebase = None
+
+
+def _forward_chunk(task):
+    # Successors of positions start..stop-1: in-table moves as edges, captures resolved through smaller tables
+    import numpy as np
+
+    global _worker_tablebase
+    directory, name, start, stop, part_path = task
+    if _worker_tablebase is None or _worker_tablebase.directory != directory:
+        _worker_tablebase = Tablebase(directory)
+    tablebase = _worker_tablebase
+    layout = TableLayout(name)
+    count = stop - start
+    kinds = np.zeros(count, dtype=np.uint8)
+    edge_counts = np.zeros(count, dtype=np.uint16)
+    cap_win = np.full(count, -1, dtype=np.int16)
+    cap_loss = np.full(count, -1, dtype=np.int16)
+    cap_draw = np.zeros(count, dtype=bool)
+    edges = []
+
+    board = FlatBoard()
+    occupied = []
+    for offset in range(count):
+        pieces, current_turn = layout.decode(start + offset)
+        for square in occupied:
+            board.place(square, 0)
+        occupied = [square for _, _, square in pieces]
+        if len(set(occupied)) < len(occupied):
+            kinds[offset] = 1
+            occupied = []
+            continue
+        for piece_type, color, square in pieces:
+            board.place(square, PIECE_CODES[(piece_type, color)])
+        enemy = opponent(current_turn)
+        # The side that just moved can't have left its general attacked
+        if XiangqiRules.is_in_check(board, enemy):
+            kinds[offset] = 1
+            continue
+        moves = XiangqiRules.legal_moves(board, current_turn)
+        if not moves:
+            kinds[offset] = 2
+            continue
+
+        position_edges = 0
+        for (start_row, start_col), (end_row, end_col) in moves:
+            start_square = start_row * BOARD_COLS + start_col
+            end_square = end_row * BOARD_COLS + end_col
+            child = []
+            captured = False
+            for piece in pieces:
+                if piece[2] == start_square:
+                    child.append((piece[0], piece[1], end_square))
+                elif piece[2] == end_square:
+                    captured = True
+                else:
+                    child.append(piece)
+            if not captured:
+                edges.append(layout.encode(child, enemy))
+                position_edges += 1
+                continue
+            probed = tablebase.probe_pieces(child, enemy)
+            if probed is None:
+                raise ValueError(f"{name} needs a table for a capture; generate its dependencies first")
+            result, dtm = probed
+            if result < 0:
+                if cap_win[offset] < 0 or dtm + 1 < cap_win[offset]:
+                    cap_win[offset] = dtm + 1
+            elif result > 0:
+                cap_loss[offset] = max(cap_loss[offset], dtm + 1)
+            else:
+                cap_draw[offset] = True
+        edge_counts[offset] = position_edges
+
+    temporary = part_path + ".tmp"
+    with open(temporary, "wb") as f:
+        np.savez(f, kinds=kinds, edge_counts=edge_counts, edges=np.array(edges, dtype=np.int32),
+                 cap_win=cap_win, cap_loss=cap_loss, cap_draw=cap_draw)
+    os.replace(temporary, part_path)
+    return count
+
+
+def _predecessors(pred_start, pred_parents, children):
+    # Concatenated predecessor lists of children, duplicates kept
+    import numpy as np
+
+    starts = pred_start[children]
+    lengths = pred_start[children + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return pred_parents[offsets + np.arange(total)]
+
+
+def _solve(kinds, edge_counts, edges, cap_win, cap_loss, cap_draw):
+    """Retrograde analysis over the position graph; returns the table bytes as a uint8 array"""
+    import numpy as np
+
+    size = len(kinds)
+    unscheduled = np.int32(1 << 30)
+    parents = np.repeat(np.arange(size, dtype=np.int32), edge_counts)
+    pred_parents = parents[np.argsort(edges, kind="stable")]
+    pred_start = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges, minlength=size), out=pred_start[1:])
+
+    valid = kinds != 1
+    dtm = np.full(size, -1, dtype=np.int32)
+    dtm[~valid] = unscheduled
+    # In-table successors not yet known to win for the opponent
+    remaining = edge_counts.astype(np.int32)
+    # Ply at which a position is found to win or lose, once known
+    win_at = np.where(cap_win >= 0, cap_win, unscheduled).astype(np.int32)
+    loss_at = np.full(size, unscheduled, dtype=np.int32)
+    loss_at[kinds == 2] = 0
+    # Every move captures, and every capture loses
+    only_losing_captures = (kinds == 0) & (edge_counts == 0) & (cap_win < 0) & ~cap_draw
+    loss_at[only_losing_captures] = cap_loss[only_losing_captures]
+
+    level = 0
+    while True:
+        unresolved = dtm < 0
+        losses = np.flatnonzero(unresolved & (loss_at == level))
+        wins = np.flatnonzero(unresolved & (win_at == level))
+        dtm[losses] = level
+        dtm[wins] = level
+        if len(losses):
+            # A move into a lost position wins one ply later
+            preds = _predecessors(pred_start, pred_parents, losses)
+            preds = preds[dtm[preds] < 0]
+            win_at[preds] = np.minimum(win_at[preds], level + 1)
+        if len(wins):
+            # A position whose moves all lead to wins for the opponent is lost
+            preds, counts = np.unique(_predecessors(pred_start, pred_parents, wins), return_counts=True)
+            remaining[preds] -= counts
+            lost = preds[(remaining[preds] == 0) & (dtm[preds] < 0) & (win_at[preds] == unscheduled)
+                         & ~cap_draw[preds]]
+            loss_at[lost] = np.maximum(level + 1, cap_loss[lost])
+        unresolved = dtm < 0
+        if not unresolved.any():
+            break
+        level = int(min(win_at[unresolved].min(), loss_at[unresolved].min()))
+        if level >= unscheduled:
+            break
+        if level > MAX_DTM:
+            raise ValueError(f"Distance to mate {level} does not fit the table format")
+
+    values = np.zeros(size, dtype=np.uint8)
+    resolved = (dtm >= 0) & valid
+    values[resolved] = dtm[resolved] + 1
+    values[~valid] = INVALID
+    return values
+
+
+def generate(name, directory, workers=None, chunk_size=CHUNK_SIZE, log=None):
+    """Generate the table for a material set and every table it depends on; existing tables are kept"""
+    import numpy as np
+
+    red_types, black_types = parse_material(name)
+    if not has_attackers(red_types, black_types):
+        raise ValueError(f"{name} is always a draw and needs no table")
+    name, _ = canonical_material(red_types, black_types)
+    log = log or (lambda message: None)
+    os.makedirs(directory, exist_ok=True)
+    for dependency in sorted(dependencies(name), key=len):
+        generate(dependency, directory, workers, chunk_size, log)
+
+    path = os.path.join(directory, name + TABLE_SUFFIX)
+    if os.path.exists(path):
+        return path
+    layout = TableLayout(name)
+    parts_directory = os.path.join(directory, name + ".parts")
+    os.makedirs(parts_directory, exist_ok=True)
+    tasks = []
+    for start in range(0, layout.size, chunk_size):
+        part_path = os.path.join(parts_directory, f"{start // chunk_size:05d}.npz")
+        if not os.path.exists(part_path):
+            tasks.append((directory, name, start, min(start + chunk_size, layout.size), part_path))
+    done_before = (layout.size + chunk_size - 1) // chunk_size - len(tasks)
+
+    start_time = time.perf_counter()
+    log(f"{name}: {layout.size:,} positions, {len(tasks)} chunks to generate ({done_before} already done)")
+    positions = 0
+    if tasks:
+        with multiprocessing.Pool(workers or os.cpu_count()) as pool:
+            for count in pool.imap_unordered(_forward_chunk, tasks):
+                positions += count
+                log(f"{name}: forward pass {positions:,}/{sum(task[3] - task[2] for task in tasks):,} positions")
+    forward_time = time.perf_counter() - start_time
+
+    arrays = {key: [] for key in ("kinds", "edge_counts", "edges", "cap_win", "cap_loss", "cap_draw")}
+    for part in sorted(os.listdir(parts_directory)):
+        if part.endswith(".npz"):
+            with np.load(os.path.join(parts_directory, part)) as loaded:
+                for key in arrays:
+                    arrays[key].append(loaded[key])
+    values = _solve(*(np.concatenate(arrays[key]) for key in arrays))
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, name.encode(), layout.size))
+        values.tofile(f)
+    os.replace(temporary, path)
+    shutil.rmtree(parts_directory)
+    log(f"{name}: {_summary(values)}, forward pass {forward_time:.1f}s, "
+        f"total {time.perf_counter() - start_time:.1f}s")
+    return path
+
+
+def _summary(values):
+    valid = values != INVALID
+    decided = valid & (values != DRAW)
+    wins = decided & (values % 2 == 0)
+    longest = int(values[decided].max(initial=1)) - 1
+    return (f"{int(valid.sum()):,} legal positions, {int(wins.sum()):,} wins, {int((decided & ~wins).sum()):,} "
+            f"losses, {int((valid & ~decided).sum()):,} draws, longest mate {longest} plies")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and probe endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_command = commands.add_parser("generate", help="generate tables (and the tables they depend on)")
+    generate_command.add_argument("materials", nargs="+", help="material sets such as KRKAA or KNPK")
+    generate_command.add_argument("--dir", default="tablebases", help="table directory (default: tablebases)")
+    generate_command.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    probe = commands.add_parser("probe", help="probe a position and time probes")
+    probe.add_argument("fen")
+    probe.add_argument("--dir", default="tablebases")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for material in args.materials:
+            generate(material, args.dir, args.workers, log=lambda message: print(message, file=sys.stderr))
+        return 0
+
+    from xiangqi_notation import parse_fen
+
+    tablebase = Tablebase(args.dir)
+    board, current_turn = parse_fen(args.fen)
+    probed = tablebase.probe(board, current_turn)
+    if probed is None:
+        print("not in the tablebases")
+        return 1
+    result, dtm = probed
+    print({1: f"win in {dtm} plies", -1: f"loss in {dtm} plies", 0: "draw"}[result])
+    probes = 20000
+    start_time = time.perf_counter()
+    for _ in range(probes):
+        tablebase.probe(board, current_turn)
+    print(f"{1e6 * (time.perf_counter() - start_time) / probes:.1f} us per probe")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
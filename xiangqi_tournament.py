@@ -0,0 +1,371 @@
+# Self-play tournaments between two engine configurations across a process pool
+#
+# Engines are given as "name:key=value,..." with keys depth, nodes, movetime (seconds per move),
+# tc (base+increment seconds per game), tt (hash MB) and lazy (0/1). Each opening is played twice
+# with colours swapped. Games are adjudicated with XiangqiRules (no legal move loses), the
+# repetition rules and a ply limit, and flag falls lose on time.
+#
+# Openings are varied with a few random plies per game pair by default: engines limited by depth or
+# nodes are deterministic, so a repeated opening replays the same game and adds no information.
+#
+# Results are appended to a JSON-lines file, one game per line after a header line holding the
+# settings, so an interrupted run resumes where it stopped, or is extended with a larger game count.
+# Elo comes with a 95% interval from the trinomial score variance, and an optional SPRT stops the
+# run once it accepts H0 or H1.
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from xiangqi_engine import Engine
+from xiangqi_notation import START_FEN, game_from_fen, to_fen, to_iccs
+from xiangqi_repetition import adjudicate
+from xiangqi_rules import XiangqiRules
+
+# Games end in a draw after this many plies
+DEFAULT_MAX_PLIES = 300
+# Random moves played from each opening, different for every game pair
+DEFAULT_RANDOM_PLIES = 4
+# Share of the remaining clock spent on a move, as in the UCCI front-end
+MOVES_TO_GO = 30
+# Elo interval and SPRT defaults
+CONFIDENCE_Z = 1.96
+DEFAULT_SPRT = (0.0, 5.0, 0.05, 0.05)
+
+_ENGINE_KEYS = {"depth": int, "nodes": int, "movetime": float, "tc": str, "tt": int, "lazy": int}
+
+# Engines owned by each worker process, one per configuration
+_worker_engines = {}
+
+
+def parse_engine(text):
+    """An engine configuration dict from "name:key=value,...\""""
+    name, _, options = text.partition(":")
+    if not name:
+        raise ValueError(f"Engine {text!r} has no name")
+    config = {"name": name}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.partition("=")
+        if key not in _ENGINE_KEYS:
+            raise ValueError(f"Unknown engine option {key!r}; expected one of {', '.join(_ENGINE_KEYS)}")
+        config[key] = _ENGINE_KEYS[key](value)
+    if "tc" in config:
+        base, _, increment = config["tc"].partition("+")
+        config["tc"] = [float(base), float(increment or 0)]
+    if not any(key in config for key in ("depth", "nodes", "movetime", "tc")):
+        raise ValueError(f"Engine {name!r} needs a depth, nodes, movetime or tc limit")
+    return config
+
+
+def _engine(config):
+    key = json.dumps(config, sort_keys=True)
+    engine = _worker_engines.get(key)
+    if engine is None:
+        engine = _worker_engines[key] = Engine(config.get("tt", 16), lazy_eval=bool(config.get("lazy")))
+    return engine
+
+
+def random_opening(fen, plies, seed):
+    """The position after plies random legal moves from fen, reproducible from seed"""
+    rng = random.Random(seed)
+    game = game_from_fen(fen)
+    for _ in range(plies):
+        moves = XiangqiRules.legal_moves(game.board, game.current_turn)
+        if not moves:
+            break
+        game.push(rng.choice(moves))
+    return to_fen(game.board, game.current_turn)
+
+
+def play_game(index, fen, red, black, max_plies=DEFAULT_MAX_PLIES):
+    """Play one game between two engine configurations and return its result record"""
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    game = game_from_fen(fen)
+    configs = {"red": red, "black": black}
+    clocks = {color: config["tc"][0] for color, config in configs.items() if "tc" in config}
+    for config in configs.values():
+        # Games are independent, so nothing learned in the previous one is kept
+        _engine(config).clear()
+
+    moves = []
+    result = reason = None
+    while result is None:
+        color = game.current_turn
+        winner = "0-1" if color == "red" else "1-0"
+        if not XiangqiRules.has_legal_move(game.board, color):
+            result, reason = winner, "checkmate" if game.is_in_check() else "stalemate"
+            break
+        repetition = adjudicate(game)
+        if repetition:
+            result, reason = repetition, "repetition"
+            break
+        if len(moves) >= max_plies:
+            result, reason = "1/2-1/2", "ply limit"
+            break
+
+        config = configs[color]
+        time_limit = config.get("movetime")
+        if color in clocks:
+            budget = clocks[color] / MOVES_TO_GO + config["tc"][1]
+            time_limit = min(time_limit, budget) if time_limit is not None else budget
+        move_start = time.perf_counter()
+        searched = _engine(config).search(game, depth=config.get("depth"), time_limit=time_limit,
+                                          node_limit=config.get("nodes"))
+        if color in clocks:
+            clocks[color] -= time.perf_counter() - move_start
+            if clocks[color] < 0:
+                result, reason = winner, "time forfeit"
+                break
+            clocks[color] += config["tc"][1]
+        game.push(searched.best_move)
+        moves.append(to_iccs(searched.best_move))
+
+    return {
+        "game": index,
+        "fen": fen,
+        "red": red["name"],
+        "black": black["name"],
+        "result": result,
+        "reason": reason,
+        "plies": len(moves),
+        "moves": " ".join(moves),
+        "seconds": time.perf_counter() - start_time,
+        "cpu": time.process_time() - start_cpu,
+    }
+
+
+class TournamentStats:
+    """Wins, draws and losses of the first engine, with Elo and SPRT estimates"""
+
+    def __init__(self, first):
+        self.first = first
+        self.wins = self.draws = self.losses = 0
+        self.reasons = {}
+        self.plies = 0
+        self.cpu = 0.0
+
+    def add(self, record):
+        first_red = record["red"] == self.first
+        if record["result"] == "1/2-1/2":
+            self.draws += 1
+        elif (record["result"] == "1-0") == first_red:
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.reasons[record["reason"]] = self.reasons.get(record["reason"], 0) + 1
+        self.plies += record["plies"]
+        self.cpu += record["cpu"]
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.5
+
+    def variance(self):
+        """Per-game variance of the first engine's score"""
+        if not self.games:
+            return 0.0
+        score = self.score()
+        return (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2
+                + self.losses * score ** 2) / self.games
+
+    def elo(self):
+        """(Elo difference, lower bound, upper bound) of the first engine at 95% confidence"""
+        score = self.score()
+        margin = CONFIDENCE_Z * math.sqrt(self.variance() / self.games) if self.games else 0.0
+        return _elo(score), _elo(score - margin), _elo(score + margin)
+
+    def llr(self, elo0, elo1):
+        """Log-likelihood ratio of H1 (elo1) against H0 (elo0), by the normal approximation"""
+        variance = self.variance()
+        if not variance:
+            return 0.0
+        score0, score1 = _expected_score(elo0), _expected_score(elo1)
+        return self.games * (score1 - score0) * (2 * self.score() - score0 - score1) / (2 * variance)
+
+
+def _elo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def _expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_bounds(alpha, beta):
+    """LLR bounds below which H0 and above which H1 is accepted"""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def load_results(path, settings):
+    """(has_settings, records) of a results file written with the same settings; a torn last line is cut off"""
+    if not os.path.exists(path):
+        return False, []
+    records = []
+    with open(path, "rb") as f:
+        data = f.read()
+    good = data.rfind(b"\n") + 1
+    if good < len(data):
+        # Interrupted mid-write: drop the partial line so appends start on a fresh one
+        with open(path, "r+b") as f:
+            f.truncate(good)
+    lines = data[:good].decode("utf-8").splitlines()
+    if not lines:
+        return False, []
+    if json.loads(lines[0]).get("settings") != settings:
+        raise ValueError(f"{path} was written with different settings; use a new results file")
+    for line in lines[1:]:
+        record = json.loads(line)
+        # Older runners repeated the settings line when resuming a run that had no games yet
+        if "settings" in record:
+            if record["settings"] != settings:
+                raise ValueError(f"{path} was written with different settings; use a new results file")
+            continue
+        records.append(record)
+    return True, records
+
+
+def run_tournament(path, engines, games, openings=(START_FEN,), workers=None, max_plies=DEFAULT_MAX_PLIES,
+                   random_plies=DEFAULT_RANDOM_PLIES, seed=0, sprt=None, progress=None):
+    """Play games between two engines, appending results to path; returns (stats, run summary)"""
+    if len(engines) != 2:
+        raise ValueError("A tournament needs exactly two engines")
+    if engines[0]["name"] == engines[1]["name"]:
+        raise ValueError("Engines need different names")
+    deterministic = all("movetime" not in engine and "tc" not in engine for engine in engines)
+    if deterministic and not random_plies and len(openings) < (games + 1) // 2:
+        raise ValueError(f"{games} games from {len(openings)} openings would repeat the same games between "
+                         "depth- or node-limited engines; add openings or random plies")
+    # The game count is left out so a finished run can be extended
+    settings = {"engines": engines, "openings": list(openings), "max_plies": max_plies,
+                "random_plies": random_plies, "seed": seed}
+    has_settings, done = load_results(path, settings)
+    stats = TournamentStats(engines[0]["name"])
+    for record in done:
+        stats.add(record)
+    bounds = sprt_bounds(sprt[2], sprt[3]) if sprt else None
+
+    def decided():
+        return bounds is not None and not bounds[0] < stats.llr(sprt[0], sprt[1]) < bounds[1]
+
+    finished = {record["game"] for record in done}
+    pending = [index for index in range(games) if index not in finished]
+    workers = workers or os.cpu_count()
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    played = worker_cpu = 0
+    with open(path, "a", encoding="utf-8") as results:
+        if not has_settings:
+            results.write(json.dumps({"settings": settings}) + "\n")
+            results.flush()
+        with ProcessPoolExecutor(workers) as executor:
+            running = set()
+            while (pending or running) and not (decided() and not running):
+                # Keep every worker busy but queue no further, so an SPRT decision wastes nothing
+                while pending and len(running) < workers and not decided():
+                    index = pending.pop(0)
+                    pair = index // 2
+                    fen = openings[pair % len(openings)]
+                    if random_plies:
+                        fen = random_opening(fen, random_plies, seed * 1000003 + pair)
+                    red, black = (engines[0], engines[1]) if index % 2 == 0 else (engines[1], engines[0])
+                    running.add(executor.submit(play_game, index, fen, red, black, max_plies))
+                completed, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    record = future.result()
+                    results.write(json.dumps(record) + "\n")
+                    results.flush()
+                    stats.add(record)
+                    played += 1
+                    worker_cpu += record["cpu"]
+                    if progress:
+                        progress(stats, record)
+
+    elapsed = time.perf_counter() - start_time
+    summary = {
+        "played": played,
+        "seconds": elapsed,
+        "games_per_hour": 3600 * played / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+        # Time the workers spent playing against what they had, and what the harness itself used
+        "worker_utilisation": worker_cpu / (elapsed * workers) if elapsed > 0 else 0.0,
+        "harness_cpu": (time.process_time() - start_cpu) / elapsed if elapsed > 0 else 0.0,
+        "sprt": stats.llr(sprt[0], sprt[1]) if sprt else None,
+    }
+    return stats, summary
+
+
+def format_stats(stats, sprt=None):
+    elo, low, high = stats.elo()
+    line = (f"{stats.games} games  +{stats.wins} ={stats.draws} -{stats.losses}  "
+            f"elo {elo:+.1f} [{low:+.1f}, {high:+.1f}]")
+    if sprt:
+        lower, upper = sprt_bounds(sprt[2], sprt[3])
+        line += f"  llr {stats.llr(sprt[0], sprt[1]):+.2f} ({lower:+.2f}, {upper:+.2f})"
+    return line
+
+
+def _read_openings(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a self-play tournament between two engine configurations")
+    parser.add_argument("results", help="JSON-lines results file, resumed if it exists")
+    parser.add_argument("--engine", action="append", required=True, type=parse_engine,
+                        help='"name:key=value,..." with depth, nodes, movetime, tc (base+inc), tt, lazy; give two')
+    parser.add_argument("--games", type=int, default=100, help="games to play (default: 100)")
+    parser.add_argument("--openings", help="file of opening FENs, one per line (default: the start position)")
+    parser.add_argument("--random-plies", type=int, default=DEFAULT_RANDOM_PLIES,
+                        help="random moves played from each opening, different for every game pair "
+                             f"(default: {DEFAULT_RANDOM_PLIES})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                        help=f"plies before a game is drawn (default: {DEFAULT_MAX_PLIES})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--sprt", type=float, nargs="*", metavar="X",
+                        help="stop early by SPRT: elo0 elo1 [alpha beta] (defaults: %s)"
+                        % " ".join(map(str, DEFAULT_SPRT)))
+    args = parser.parse_args(argv)
+
+    sprt = None
+    if args.sprt is not None:
+        sprt = tuple(args.sprt) + DEFAULT_SPRT[len(args.sprt):]
+        if len(sprt) != 4:
+            parser.error("--sprt takes at most four values")
+    openings = _read_openings(args.openings) if args.openings else [START_FEN]
+
+    def progress(stats, record):
+        print(f"game {record['game']}: {record['red']} - {record['black']} {record['result']} "
+              f"({record['reason']}, {record['plies']} plies)  {format_stats(stats, sprt)}", flush=True)
+
+    try:
+        stats, summary = run_tournament(args.results, args.engine, args.games, openings, args.workers,
+                                        args.max_plies, args.random_plies, args.seed, sprt, progress)
+    except ValueError as error:
+        parser.error(str(error))
+    print(format_stats(stats, sprt))
+    print(f"reasons: {', '.join(f'{reason} {count}' for reason, count in sorted(stats.reasons.items()))}")
+    if summary["played"]:
+        print(f"{summary['played']} games in {summary['seconds']:.1f}s, {summary['games_per_hour']:.0f} games/hour, "
+              f"{stats.plies / stats.games:.0f} plies/game")
+        print(f"cpu: workers busy {100 * summary['worker_utilisation']:.0f}% of {summary['workers']}, "
+              f"harness {100 * summary['harness_cpu']:.1f}% of a core, {os.cpu_count()} cores")
+    if sprt:
+        llr = stats.llr(sprt[0], sprt[1])
+        lower, upper = sprt_bounds(sprt[2], sprt[3])
+        print("sprt: " + ("H1 accepted" if llr >= upper else "H0 accepted" if llr <= lower else "undecided"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
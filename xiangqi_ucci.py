@@ -0,0 +1,238 @@
+# UCCI (Universal Chinese Chess Interface) front-end: drives Engine over stdin/stdout so the
+# project can be used from standard Xiangqi GUIs and match managers
+#
+# Supported commands: ucci, isready, setoption, position {fen <fen> | startpos} [moves ...],
+# banmoves, go [ponder] [depth <n> | depth infinite | infinite | nodes <n> | time <t> [movestogo <n>]
+# [increment <t>]], ponderhit, stop and quit. Searches run on a background thread so stop is
+# answered while the engine is thinking.
+import sys
+import threading
+import time
+
+from xiangqi_book import OpeningBook
+from xiangqi_engine import Engine
+from xiangqi_notation import START_FEN, game_from_fen, parse_iccs, to_iccs
+from xiangqi_rules import XiangqiRules
+
+ENGINE_NAME = "Basic Xiangqi"
+DEFAULT_HASH_MB = 16
+
+# Share of the remaining clock spent on a move when the GUI gives no movestogo
+DEFAULT_MOVES_TO_GO = 30
+# Never plan to use more than this share of the remaining clock, keeping some for overhead
+MAX_TIME_SHARE = 0.8
+
+
+class UCCIEngine:
+    def __init__(self, output=None):
+        self.output = output or sys.stdout
+        self.output_lock = threading.Lock()
+        self.hash_mb = DEFAULT_HASH_MB
+        self.use_millisec = False
+        self.engine = Engine(self.hash_mb)
+        self.game = game_from_fen(START_FEN)
+        self.ban_moves = set()
+        self.book = None
+        self.search_thread = None
+        # Set by stop or ponderhit: an infinite or pondering search only reports its move after it
+        self.released = threading.Event()
+        self.ponder_budget = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, lines=None):
+        """Answer commands until quit or end of input"""
+        for line in lines if lines is not None else sys.stdin:
+            if not self.handle(line):
+                break
+        self.stop()
+
+    def handle(self, line):
+        """Handle one command line; returns False after quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "quit":
+            self.stop()
+            self.send("bye")
+            return False
+        handler = getattr(self, "_command_" + command, None)
+        if handler is None:
+            self.send(f"info string unknown command {command}")
+        else:
+            try:
+                handler(args)
+            except (ValueError, OSError) as error:
+                # Bad input or an unreadable file is reported, never fatal
+                self.send(f"info string {error}")
+        return True
+
+    def _command_ucci(self, args):
+        self.send(f"id name {ENGINE_NAME}")
+        self.send(f"option hashsize type spin min 1 max 4096 default {DEFAULT_HASH_MB}")
+        self.send("option usemillisec type check default false")
+        self.send("option lazyeval type check default false")
+        self.send("option bookfiles type string default <empty>")
+        self.send("option egtbpaths type string default <empty>")
+        self.send("ucciok")
+
+    def _command_isready(self, args):
+        self.send("readyok")
+
+    def _command_setoption(self, args):
+        # UCCI sends "setoption <name> <value>"; "setoption name <name> value <value>" is accepted too
+        args = [arg for arg in args if arg not in ("name", "value")]
+        if len(args) < 2:
+            raise ValueError("setoption needs a name and a value")
+        name, value = args[0].lower(), args[1].lower()
+        if name == "hashsize":
+            self.stop()
+            self.hash_mb = max(1, int(value))
+            self.engine = Engine(self.hash_mb, self.engine.lazy_eval, self.engine.tablebase)
+        elif name == "usemillisec":
+            self.use_millisec = value == "true"
+        elif name == "lazyeval":
+            self.engine.lazy_eval = value == "true"
+        elif name == "bookfiles":
+            # Paths keep their case and may contain spaces; only the first book is used
+            path = " ".join(args[1:]).split(";")[0]
+            if self.book:
+                self.book.close()
+            # Cleared first so a book that fails to open leaves the engine without one
+            self.book = None
+            self.book = OpeningBook(path) if path and path != "<empty>" else None
+        elif name == "egtbpaths":
+            # Imported here so start-up doesn't pay for the generator's imports
+            from xiangqi_tablebase import Tablebase
+
+            self.stop()
+            path = " ".join(args[1:]).split(";")[0]
+            self.engine.tablebase = None
+            self.engine.tablebase = Tablebase(path) if path and path != "<empty>" else None
+        else:
+            self.send(f"info string unknown option {name}")
+
+    def _command_position(self, args):
+        self.stop()
+        if "moves" in args:
+            split = args.index("moves")
+            position, moves = args[:split], args[split + 1:]
+        else:
+            position, moves = args, []
+        if position and position[0] == "fen":
+            game = game_from_fen(" ".join(position[1:]))
+        elif position and position[0] == "startpos":
+            game = game_from_fen(START_FEN)
+        else:
+            raise ValueError("position needs fen or startpos")
+        for text in moves:
+            start, end = parse_iccs(text)
+            if not XiangqiRules.is_legal_move(game.board, game.current_turn, start, end):
+                raise ValueError(f"illegal move {text}")
+            game.push((start, end))
+        self.game = game
+        self.ban_moves = set()
+
+    def _command_banmoves(self, args):
+        self.ban_moves = {parse_iccs(text) for text in args}
+
+    def _command_go(self, args):
+        self.stop()
+        ponder = "ponder" in args
+        infinite = "infinite" in args
+        depth = node_limit = clock = None
+        moves_to_go = increment = 0
+        for index, token in enumerate(args[:-1]):
+            value = args[index + 1]
+            if token == "depth":
+                if value == "infinite":
+                    infinite = True
+                else:
+                    depth = int(value)
+            elif token == "nodes":
+                node_limit = int(value)
+            elif token == "time":
+                clock = self._seconds(value)
+            elif token == "movestogo":
+                moves_to_go = int(value)
+            elif token == "increment":
+                increment = self._seconds(value)
+
+        budget = None
+        if clock is not None:
+            budget = min(clock / (moves_to_go or DEFAULT_MOVES_TO_GO) + increment, clock * MAX_TIME_SHARE)
+        # Pondering runs without a clock until ponderhit starts it
+        self.ponder_budget = budget if ponder else None
+        time_limit = None if ponder or infinite else budget
+
+        if self.book and not ponder and not infinite:
+            move = self.book.choose(self.game, exclude=self.ban_moves)
+            if move:
+                self.send(f"bestmove {to_iccs(move)}")
+                return
+
+        root_moves = None
+        if self.ban_moves:
+            root_moves = [move for move in XiangqiRules.legal_moves(self.game.board, self.game.current_turn)
+                          if move not in self.ban_moves]
+            if not root_moves:
+                self.send("nobestmove")
+                return
+        self.released.clear()
+        # Cleared here rather than by the search, so a stop or ponderhit arriving before the thread runs still counts
+        self.engine.stop_requested = False
+        self.engine.pending_deadline = None
+        self.search_thread = threading.Thread(
+            target=self._search, args=(self.game, depth, time_limit, node_limit, root_moves, ponder or infinite),
+            daemon=True)
+        self.search_thread.start()
+
+    def _command_ponderhit(self, args):
+        # The predicted move was played: keep searching, now against the clock
+        if self.ponder_budget is not None:
+            self.engine.set_deadline(time.perf_counter() + self.ponder_budget)
+        self.released.set()
+
+    def _command_stop(self, args):
+        self.stop()
+
+    def stop(self):
+        """Stop a running search and wait for it to report its move"""
+        self.released.set()
+        if self.search_thread:
+            self.engine.stop()
+            self.search_thread.join()
+        self.search_thread = None
+
+    def _seconds(self, value):
+        return float(value) / 1000 if self.use_millisec else float(value)
+
+    def _search(self, game, depth, time_limit, node_limit, root_moves, wait):
+        result = self.engine.search(game, depth=depth, time_limit=time_limit, node_limit=node_limit,
+                                    info=self._info, root_moves=root_moves)
+        if wait:
+            # Infinite and ponder searches report their move only once told to
+            self.released.wait()
+        if result.best_move is None:
+            self.send("nobestmove")
+        elif len(result.pv) > 1:
+            self.send(f"bestmove {to_iccs(result.best_move)} ponder {to_iccs(result.pv[1])}")
+        else:
+            self.send(f"bestmove {to_iccs(result.best_move)}")
+
+    def _info(self, iteration):
+        pv = " ".join(to_iccs(move) for move in iteration["pv"])
+        self.send(f"info depth {iteration['depth']} score {iteration['score']} time {int(iteration['time'] * 1000)} "
+                  f"nodes {iteration['nodes']} nps {iteration['nps']} pv {pv}")
+
+
+def main():
+    UCCIEngine().run()
+
+
+if __name__ == "__main__":
+    main()